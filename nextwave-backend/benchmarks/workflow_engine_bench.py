@@ -0,0 +1,288 @@
+"""Benchmark and load simulation for the workflow engine.
+
+Builds synthetic workflows of a given shape, pushes a burst of executions
+through a WorkflowEngine whose PROCESSING steps are zero-latency stubs,
+and reports throughput, per-step scheduling overhead, latency percentiles
+and peak memory. Because the handlers do no work, the numbers measure the
+engine itself: queueing, dispatch, context handling and checkpointing.
+Peak RSS is for the whole process, so with several shapes it is the
+highest seen so far; use --tracemalloc for per-shape allocation peaks.
+
+Run from nextwave-backend:
+
+    python benchmarks/workflow_engine_bench.py --shape all --executions 2000
+    python benchmarks/workflow_engine_bench.py --shape fanout --size 32 --json results.json
+    python benchmarks/workflow_engine_bench.py --baseline results.json
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.workflow_engine import WorkflowEngine, WorkflowStep, StepType, StepStatus  # noqa: E402
+from src.utils.workflow_store import MemoryStateStore  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+SHAPES = ('chain', 'fanout', 'conditions', 'loop')
+DEFAULT_SIZES = {'chain': 20, 'fanout': 16, 'conditions': 10, 'loop': 100}
+
+
+def noop(step, context_data, execution):
+    return {f'{step.id}_done': True}
+
+
+def _processing(step_id, **config):
+    return WorkflowStep(step_id, step_id, StepType.PROCESSING, {'operation': 'noop', **config})
+
+
+def build_chain(engine, size):
+    """start -> s1 -> ... -> s<size-1>"""
+    workflow = engine.create_workflow(f'bench chain {size}')
+    previous = None
+    for index in range(size):
+        workflow.add_step(_processing(f's{index}'))
+        if previous:
+            workflow.connect_steps(previous, f's{index}')
+        previous = f's{index}'
+    workflow.set_start_step('s0')
+    return workflow, lambda index: {}
+
+
+def build_fanout(engine, size):
+    """start fans out to size parallel branches that join again"""
+    workflow = engine.create_workflow(f'bench fanout {size}')
+    workflow.add_step(_processing('start'))
+    workflow.add_step(_processing('join', merge='namespace'))
+    for index in range(size):
+        workflow.add_step(_processing(f'b{index}'))
+        workflow.connect_steps('start', f'b{index}')
+        workflow.connect_steps(f'b{index}', 'join')
+    workflow.set_start_step('start')
+    return workflow, lambda index: {}
+
+
+def build_conditions(engine, size):
+    """Ladder of size conditions on x; each either exits to a leaf or goes one level deeper"""
+    workflow = engine.create_workflow(f'bench conditions {size}')
+    workflow.add_step(_processing('end'))
+    for level in range(size):
+        deeper = f'c{level + 1}' if level + 1 < size else 'end'
+        workflow.add_step(WorkflowStep(f'c{level}', f'c{level}', StepType.CONDITION, {
+            'condition': {'field': 'x', 'operator': 'greater_than', 'value': level},
+            'true_step': deeper,
+            'false_step': f'leaf{level}'
+        }))
+        workflow.add_step(_processing(f'leaf{level}'))
+        workflow.connect_steps(f'c{level}', deeper)
+        workflow.connect_steps(f'c{level}', f'leaf{level}')
+    workflow.set_start_step('c0')
+    # Spread runs over every depth so all branches are taken
+    return workflow, lambda index: {'x': index % (size + 1)}
+
+
+def build_loop(engine, size, parallelism=4):
+    """One LOOP step over size items with a single stub step as its body"""
+    workflow = engine.create_workflow(f'bench loop {size}')
+    workflow.add_step(WorkflowStep('loop', 'loop', StepType.LOOP, {
+        'items': 'items',
+        'parallelism': parallelism,
+        'collect': 'body_done',
+        'body': [{'id': 'body', 'name': 'body', 'type': 'processing', 'config': {'operation': 'noop'}}]
+    }))
+    workflow.add_step(_processing('after'))
+    workflow.connect_steps('loop', 'after')
+    workflow.set_start_step('loop')
+    items = list(range(size))
+    return workflow, lambda index: {'items': items}
+
+
+BUILDERS = {'chain': build_chain, 'fanout': build_fanout, 'conditions': build_conditions, 'loop': build_loop}
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(values)) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1)
+
+
+def run_shape(shape, size, args):
+    engine = WorkflowEngine(
+        step_workers=args.step_workers,
+        execution_workers=args.execution_workers,
+        max_queued_executions=args.executions,
+        store=MemoryStateStore(),
+        max_cached_executions=args.executions,
+        history_retention=None,
+        step_cache_bytes=0,
+        checkpoint_interval=args.checkpoint_interval,
+        trace_max_spans=args.trace_spans
+    )
+    engine.register_operation('noop', noop)
+    workflow, make_input = BUILDERS[shape](engine, size)
+    engine.save_workflow(workflow)
+    engine.start(recover=False)
+
+    gc.collect()
+    if args.tracemalloc:
+        tracemalloc.start()
+    submitted = []
+    started = time.perf_counter()
+    for index in range(args.executions):
+        execution = engine.execute_workflow(workflow.id, make_input(index), user_id=f'user{index % args.users}')
+        submitted.append((datetime.now(), execution))
+    submit_seconds = time.perf_counter() - started
+
+    pending = [execution for _, execution in submitted]
+    while pending:
+        time.sleep(0.005)
+        pending = [execution for execution in pending if execution.finished_at is None]
+    elapsed = time.perf_counter() - started
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    engine.shutdown()
+
+    latencies, queue_waits, run_times = [], [], []
+    steps = failed = 0
+    for submitted_at, execution in submitted:
+        if execution.status != StepStatus.COMPLETED:
+            failed += 1
+        for state in execution.steps_executed:
+            # A loop step runs its body once per item
+            steps += 1 + (state.output_data or {}).get('loop_items', 0)
+        latencies.append((execution.end_time - submitted_at).total_seconds())
+        queue_waits.append((execution.start_time - submitted_at).total_seconds())
+        run_times.append(execution.duration or 0.0)
+    latencies.sort()
+    queue_waits.sort()
+    run_times.sort()
+
+    def ms(value):
+        return round(value * 1000, 3)
+
+    return {
+        'shape': shape,
+        'size': size,
+        'executions': args.executions,
+        'failed': failed,
+        'steps': steps,
+        'elapsed_s': round(elapsed, 3),
+        'submit_s': round(submit_seconds, 3),
+        'executions_per_s': round(args.executions / elapsed, 1),
+        'steps_per_s': round(steps / elapsed, 1),
+        # Handlers return immediately, so wall time per step at saturation is the engine's own cost
+        'overhead_per_step_us': round(elapsed / steps * 1e6, 1) if steps else 0.0,
+        'latency_ms': {pct: ms(percentile(latencies, int(pct[1:]))) for pct in ('p50', 'p95', 'p99')},
+        'queue_wait_ms': {pct: ms(percentile(queue_waits, int(pct[1:]))) for pct in ('p50', 'p95', 'p99')},
+        'run_ms': {pct: ms(percentile(run_times, int(pct[1:]))) for pct in ('p50', 'p95', 'p99')},
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_traced_mb': round(traced_peak / (1024 * 1024), 1) if traced_peak is not None else None
+    }
+
+
+def print_result(result):
+    latency, queue_wait, run = result['latency_ms'], result['queue_wait_ms'], result['run_ms']
+    print(
+        f"{result['shape']:<11} size={result['size']:<4} runs={result['executions']} failed={result['failed']} "
+        f"steps={result['steps']} in {result['elapsed_s']}s"
+    )
+    print(
+        f"  throughput   {result['executions_per_s']} executions/s, {result['steps_per_s']} steps/s "
+        f"(submitting took {result['submit_s']}s)"
+    )
+    print(f"  overhead     {result['overhead_per_step_us']} us per step")
+    print(f"  latency ms   p50={latency['p50']} p95={latency['p95']} p99={latency['p99']}")
+    print(f"  queue ms     p50={queue_wait['p50']} p95={queue_wait['p95']} p99={queue_wait['p99']}")
+    print(f"  run ms       p50={run['p50']} p95={run['p95']} p99={run['p99']}")
+    memory = f"  peak memory  rss={result['peak_rss_mb']}MB"
+    if result['peak_traced_mb'] is not None:
+        memory += f" traced={result['peak_traced_mb']}MB"
+    print(memory)
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of throughput or p95 latency beyond tolerance against a saved run of the same load"""
+    def load(result):
+        return result['shape'], result['size'], result['executions']
+
+    previous = {load(result): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get(load(result))
+        if before is None:
+            continue
+        if result['executions_per_s'] < before['executions_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{result['shape']}: throughput {result['executions_per_s']}/s vs {before['executions_per_s']}/s"
+            )
+        if result['latency_ms']['p95'] > before['latency_ms']['p95'] * (1 + tolerance):
+            regressions.append(
+                f"{result['shape']}: p95 latency {result['latency_ms']['p95']}ms vs {before['latency_ms']['p95']}ms"
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--shape', choices=SHAPES + ('all',), default='all')
+    parser.add_argument('--size', type=int, help='steps in a chain, branches in a fan-out, conditions deep, loop items')
+    parser.add_argument('--executions', type=int, default=1000, help='executions submitted per shape')
+    parser.add_argument('--users', type=int, default=10, help='users the executions are spread over (fair-share queue)')
+    parser.add_argument('--execution-workers', type=int, default=4)
+    parser.add_argument('--step-workers', type=int, default=4)
+    parser.add_argument('--checkpoint-interval', type=float, default=0.2)
+    parser.add_argument('--trace-spans', type=int, default=0, help='record execution traces (0 = off)')
+    parser.add_argument('--tracemalloc', action='store_true', help='also report peak Python allocations (slower)')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='results file to compare against; exits 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative regression (default 0.15)')
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    shapes = SHAPES if args.shape == 'all' else (args.shape,)
+    results = []
+    for shape in shapes:
+        result = run_shape(shape, args.size or DEFAULT_SIZES[shape], args)
+        print_result(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -6,6 +6,7 @@ from werkzeug.utils import secure_filename
 import os
 import json
 from datetime import datetime, timedelta
+import time
 import uuid
 import logging
 from functools import wraps
@@ -14,15 +15,25 @@ from functools import wraps
 from .models.user import User, db
 from .models.document import Document
 from .models.image import ImageAnalysis
-from .models.workflow import WorkflowModel
+from .models.workflow import WorkflowModel, WorkflowRunState, WorkflowRunLog, WorkflowRunStep
 from .models.processing import ProcessingTask, Report
 from .models.contact import ContactSubmission
+from .models.schema import upgrade_schema
 from .utils.pdf_processor import PDFProcessor
-from .utils.image_analyzer import ImageAnalyzer
-from .utils.workflow_engine_simple import WorkflowEngine
+from .utils.image_analyzer import ImageAnalyzer, COLOR_PRESETS
+from .utils.workflow_engine import WorkflowEngine, ExecutionRejected
+from .utils.workflow_handlers import register_processing_handlers
+from .utils.workflow_store import SQLStateStore, create_workflow_store
+from .utils.task_queue import task_queue
+from .utils.event_bus import event_bus, stream_events
+from .utils.result_cache import create_result_cache, sha256_file
+from .utils.upload_ingest import IngestRequest, UploadPolicy, receive_upload, save_upload
+from .routes.advanced_processing import advanced_bp
+from werkzeug.exceptions import HTTPException
 
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = IngestRequest
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'nextwave-secret-key-2024')
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'nextwave-jwt-secret-2024')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
@@ -30,16 +41,82 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:/
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
+app.config['UPLOAD_MAX_DOCUMENT_BYTES'] = int(os.environ.get('UPLOAD_MAX_DOCUMENT_BYTES', 100 * 1024 * 1024))
+app.config['UPLOAD_MAX_IMAGE_BYTES'] = int(os.environ.get('UPLOAD_MAX_IMAGE_BYTES', 50 * 1024 * 1024))
+app.config['CELERY_BROKER_URL'] = os.environ.get('CELERY_BROKER_URL')
+app.config['TASK_QUEUE_WORKERS'] = int(os.environ.get('TASK_QUEUE_WORKERS', 2))
+app.config['TASK_QUEUE_EAGER'] = os.environ.get('TASK_QUEUE_EAGER', '').lower() in ('1', 'true')  # run tasks inline
+app.config['PDF_EXTRACT_WORKERS'] = int(os.environ.get('PDF_EXTRACT_WORKERS', os.cpu_count() or 1))
+app.config['PDF_EXTRACT_PAGES_PER_CHUNK'] = int(os.environ.get('PDF_EXTRACT_PAGES_PER_CHUNK', 32))
+app.config['IMAGE_BATCH_WORKERS'] = int(os.environ.get('IMAGE_BATCH_WORKERS', os.cpu_count() or 1))
+app.config['IMAGE_BATCH_TIMEOUT'] = int(os.environ.get('IMAGE_BATCH_TIMEOUT', 60))
+app.config['IMAGE_COLOR_PRESET'] = os.environ.get('IMAGE_COLOR_PRESET', 'fast')  # fast, balanced or accurate
+app.config['IMAGE_REPORT_COLOR_PRESET'] = os.environ.get('IMAGE_REPORT_COLOR_PRESET', 'accurate')
+app.config['IMAGE_ANALYSIS_MAX_EDGE'] = int(os.environ.get('IMAGE_ANALYSIS_MAX_EDGE', 1024)) or None  # 0 = full resolution
+app.config['WORKFLOW_STEP_WORKERS'] = int(os.environ.get('WORKFLOW_STEP_WORKERS', 4))
+app.config['WORKFLOW_EXECUTION_WORKERS'] = int(os.environ.get('WORKFLOW_EXECUTION_WORKERS', 4))
+app.config['WORKFLOW_MAX_QUEUED'] = int(os.environ.get('WORKFLOW_MAX_QUEUED', 100))
+app.config['WORKFLOW_LOOP_WORKERS'] = int(os.environ.get('WORKFLOW_LOOP_WORKERS', 4))
+app.config['WORKFLOW_STATE_BACKEND'] = os.environ.get('WORKFLOW_STATE_BACKEND', 'sql')  # sql, redis, redis-local or memory
+app.config['WORKFLOW_STATE_REDIS_URL'] = os.environ.get('WORKFLOW_STATE_REDIS_URL', os.environ.get('REDIS_URL'))
+app.config['WORKFLOW_EXECUTION_CACHE_SIZE'] = int(os.environ.get('WORKFLOW_EXECUTION_CACHE_SIZE', 500))
+app.config['WORKFLOW_EXECUTION_CACHE_TTL'] = int(os.environ.get('WORKFLOW_EXECUTION_CACHE_TTL', 3600))
+app.config['WORKFLOW_HISTORY_RETENTION_DAYS'] = int(os.environ.get('WORKFLOW_HISTORY_RETENTION_DAYS', 30))  # 0 keeps all history
+app.config['WORKFLOW_MAX_LOG_ENTRIES'] = int(os.environ.get('WORKFLOW_MAX_LOG_ENTRIES', 1000))
+app.config['WORKFLOW_STEP_CACHE_BYTES'] = int(os.environ.get('WORKFLOW_STEP_CACHE_BYTES', 32 * 1024 * 1024))
+app.config['WORKFLOW_CHECKPOINT_INTERVAL'] = float(os.environ.get('WORKFLOW_CHECKPOINT_INTERVAL', 0.2))
+app.config['WORKFLOW_EXECUTION_LEASE'] = int(os.environ.get('WORKFLOW_EXECUTION_LEASE', 60))
+app.config['WORKFLOW_TRACE_MAX_SPANS'] = int(os.environ.get('WORKFLOW_TRACE_MAX_SPANS', 5000))  # 0 disables tracing
+app.config['EVENT_STREAM_HEARTBEAT'] = int(os.environ.get('EVENT_STREAM_HEARTBEAT', 15))
+app.config['LONG_POLL_MAX_WAIT'] = int(os.environ.get('LONG_POLL_MAX_WAIT', 30))
+app.config['RESULT_CACHE_BACKEND'] = os.environ.get('RESULT_CACHE_BACKEND', 'memory')  # memory, disk or redis
+app.config['RESULT_CACHE_MAX_BYTES'] = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['RESULT_CACHE_DIR'] = os.environ.get('RESULT_CACHE_DIR', os.path.join(app.config['UPLOAD_FOLDER'], 'cache'))
+app.config['RESULT_CACHE_REDIS_URL'] = os.environ.get('RESULT_CACHE_REDIS_URL', os.environ.get('REDIS_URL'))
 
 # Initialize extensions
-CORS(app, origins="*")
+CORS(app, origins="*", expose_headers=["ETag", "Retry-After"])
 jwt = JWTManager(app)
 db.init_app(app)
 
 # Initialize utilities
-pdf_processor = PDFProcessor()
-image_analyzer = ImageAnalyzer()
-workflow_engine = WorkflowEngine()
+pdf_processor = PDFProcessor(
+    extraction_workers=app.config['PDF_EXTRACT_WORKERS'],
+    pages_per_chunk=app.config['PDF_EXTRACT_PAGES_PER_CHUNK']
+)
+image_analyzer = ImageAnalyzer(
+    batch_workers=app.config['IMAGE_BATCH_WORKERS'],
+    batch_timeout=app.config['IMAGE_BATCH_TIMEOUT'],
+    color_preset=app.config['IMAGE_COLOR_PRESET'],
+    analysis_max_edge=app.config['IMAGE_ANALYSIS_MAX_EDGE']
+)
+app.extensions['pdf_processor'] = pdf_processor
+app.extensions['image_analyzer'] = image_analyzer
+if app.config['IMAGE_REPORT_COLOR_PRESET'] not in COLOR_PRESETS:
+    raise ValueError(f"Unknown color preset: {app.config['IMAGE_REPORT_COLOR_PRESET']}")
+workflow_engine = WorkflowEngine(
+    step_workers=app.config['WORKFLOW_STEP_WORKERS'],
+    execution_workers=app.config['WORKFLOW_EXECUTION_WORKERS'],
+    max_queued_executions=app.config['WORKFLOW_MAX_QUEUED'],
+    loop_workers=app.config['WORKFLOW_LOOP_WORKERS'],
+    store=create_workflow_store(app.config, app, db, (WorkflowModel, WorkflowRunState, WorkflowRunLog, WorkflowRunStep)),
+    max_cached_executions=app.config['WORKFLOW_EXECUTION_CACHE_SIZE'],
+    execution_cache_ttl=app.config['WORKFLOW_EXECUTION_CACHE_TTL'],
+    history_retention=app.config['WORKFLOW_HISTORY_RETENTION_DAYS'] * 86400 or None,
+    max_log_entries=app.config['WORKFLOW_MAX_LOG_ENTRIES'],
+    events=event_bus,
+    step_cache_bytes=app.config['WORKFLOW_STEP_CACHE_BYTES'],
+    checkpoint_interval=app.config['WORKFLOW_CHECKPOINT_INTERVAL'],
+    lease_timeout=app.config['WORKFLOW_EXECUTION_LEASE'],
+    trace_max_spans=app.config['WORKFLOW_TRACE_MAX_SPANS']
+)
+register_processing_handlers(workflow_engine, app, pdf_processor, image_analyzer, Document, ImageAnalysis)
+result_cache = create_result_cache(app.config)
+task_queue.init_app(app, db, ProcessingTask, events=event_bus)
+celery_app = task_queue.celery
+
+# PDF merge/split/watermark and batch image endpoints; their handlers run on task_queue
+app.register_blueprint(advanced_bp, url_prefix='/api')
 
 # Create upload directories
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -47,6 +124,16 @@ os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'documents'), exist_ok=Tru
 os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'images'), exist_ok=True)
 os.makedirs(os.path.join(app.config['UPLOAD_FOLDER'], 'reports'), exist_ok=True)
 
+# Upload policies enforced while request bodies are streamed to disk
+document_upload_policy = UploadPolicy(
+    max_bytes=app.config['UPLOAD_MAX_DOCUMENT_BYTES'],
+    allowed_types=['application/pdf', 'application/zip', 'application/x-ole-storage', 'text/plain']
+)
+image_upload_policy = UploadPolicy(
+    max_bytes=app.config['UPLOAD_MAX_IMAGE_BYTES'],
+    allowed_types=['image/png', 'image/jpeg', 'image/gif', 'image/bmp', 'image/tiff', 'image/webp']
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -200,27 +287,29 @@ def upload_document():
     try:
         current_user_id = get_jwt_identity()
         
-        if 'file' not in request.files:
+        # Body is streamed to disk in chunks, hashed and type-checked as it arrives
+        file = receive_upload(request, 'file', document_upload_policy)
+        if file is None:
             return jsonify({'error': 'No file provided'}), 400
         
-        file = request.files['file']
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Secure filename and save
+        # Secure filename and move into place
         filename = secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'documents', filename)
-        file.save(file_path)
+        file_size, content_hash, mime_type = save_upload(file, file_path)
         
         # Create document record
         document = Document(
             filename=filename,
             original_filename=file.filename,
             file_path=file_path,
-            file_size=os.path.getsize(file_path),
-            mime_type=file.content_type,
+            file_size=file_size,
+            mime_type=mime_type or file.content_type,
             user_id=current_user_id
         )
+        document.set_metadata({'sha256': content_hash})
         
         db.session.add(document)
         db.session.commit()
@@ -229,9 +318,9 @@ def upload_document():
         task = ProcessingTask(
             task_type='document_upload',
             status='completed',
-            input_data={'document_id': document.id},
             user_id=current_user_id
         )
+        task.set_input_data({'document_id': document.id})
         
         db.session.add(task)
         db.session.commit()
@@ -242,10 +331,13 @@ def upload_document():
                 'id': document.id,
                 'filename': document.filename,
                 'file_size': document.file_size,
+                'sha256': content_hash,
                 'uploaded_at': document.uploaded_at.isoformat()
             }
         }), 201
         
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
     except Exception as e:
         logger.error(f"Document upload error: {str(e)}")
         return jsonify({'error': 'Document upload failed'}), 500
@@ -262,44 +354,156 @@ def process_document(document_id):
         if not document:
             return jsonify({'error': 'Document not found'}), 404
         
-        # Create processing task
+        if operation not in ('extract_text', 'convert_to_images'):
+            return jsonify({'error': 'Unknown operation'}), 400
+        
+        # Create processing task and hand it to the background workers
         task = ProcessingTask(
             task_type='document_processing',
-            status='processing',
-            input_data={'document_id': document_id, 'operation': operation},
+            status='pending',
+            source_file_id=document_id,
             user_id=current_user_id
         )
+        task.set_input_data({'document_id': document_id, 'operation': operation})
         
         db.session.add(task)
         db.session.commit()
-        
-        # Process document based on operation
-        if operation == 'extract_text':
-            result = pdf_processor.extract_text_from_pdf(document.file_path)
-        elif operation == 'convert_to_images':
-            output_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'images', str(document_id))
-            os.makedirs(output_dir, exist_ok=True)
-            result = pdf_processor.pdf_to_images(document.file_path, output_dir)
-        else:
-            result = {'success': False, 'error': 'Unknown operation'}
-        
-        # Update task status
-        task.status = 'completed' if result.get('success') else 'failed'
-        task.output_data = result
-        task.completed_at = datetime.now()
-        
-        db.session.commit()
+        task_queue.enqueue(task)
         
         return jsonify({
-            'message': 'Document processing completed',
+            'message': 'Document processing queued',
             'task_id': task.id,
-            'result': result
-        })
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
         
     except Exception as e:
         logger.error(f"Document processing error: {str(e)}")
         return jsonify({'error': 'Document processing failed'}), 500
 
+@app.route('/api/documents/<int:document_id>/text/stream', methods=['GET'])
+@jwt_required()
+def stream_document_text(document_id):
+    try:
+        current_user_id = get_jwt_identity()
+        document = Document.query.filter_by(id=document_id, user_id=current_user_id).first()
+        if not document:
+            return jsonify({'error': 'Document not found'}), 404
+        
+        start_page = request.args.get('start_page', 1, type=int)
+        end_page = request.args.get('end_page', type=int)
+        file_path = document.file_path
+        
+        def generate():
+            # One NDJSON record per page, followed by a summary record
+            pages_sent = 0
+            try:
+                for page in pdf_processor.iter_text_from_pdf(file_path, start_page, end_page):
+                    pages_sent += 1
+                    yield json.dumps(page) + '\n'
+                yield json.dumps({'success': True, 'pages_sent': pages_sent}) + '\n'
+            except Exception as e:
+                logger.error(f"Document text stream error: {str(e)}")
+                yield json.dumps({'success': False, 'error': str(e), 'pages_sent': pages_sent}) + '\n'
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Document text stream error: {str(e)}")
+        return jsonify({'error': 'Document text streaming failed'}), 500
+
+@task_queue.handler('document_processing')
+def run_document_processing(task, report_progress):
+    input_data = task.get_input_data()
+    document = db.session.get(Document, input_data['document_id'])
+    if not document:
+        return {'success': False, 'error': 'Document not found'}
+    
+    operation = input_data.get('operation', 'extract_text')
+    if operation == 'extract_text':
+        content_hash = document.get_metadata().get('sha256') or sha256_file(document.file_path)
+        cache_key = result_cache.make_key(content_hash, 'extract_text', pdf_processor.version)
+        result, _ = result_cache.get_or_compute(
+            cache_key,
+            lambda: pdf_processor.extract_text_from_pdf(document.file_path, progress_callback=report_progress)
+        )
+        return result
+    elif operation == 'convert_to_images':
+        output_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'images', str(document.id))
+        os.makedirs(output_dir, exist_ok=True)
+        return pdf_processor.pdf_to_images(document.file_path, output_dir, progress_callback=report_progress)
+    return {'success': False, 'error': 'Unknown operation'}
+
+# Processing Task Routes
+@app.route('/api/tasks/<int:task_id>', methods=['GET'])
+@jwt_required()
+def get_task_status(task_id):
+    try:
+        current_user_id = get_jwt_identity()
+        task = ProcessingTask.query.filter_by(id=task_id, user_id=current_user_id).first()
+        if not task:
+            return jsonify({'error': 'Task not found'}), 404
+        
+        wait = min(max(request.args.get('wait', 0, type=float), 0), app.config['LONG_POLL_MAX_WAIT'])
+        if wait and request.if_none_match.contains_weak(f'{task.status}-{task.progress}') \
+                and task.status not in ('completed', 'failed'):
+            # Long-poll: hold the request until the task reports a change or wait expires
+            deadline = time.monotonic() + wait
+            with event_bus.subscribe(f'task:{task_id}') as subscription:
+                db.session.refresh(task)
+                while request.if_none_match.contains_weak(f'{task.status}-{task.progress}') and deadline > time.monotonic():
+                    subscription.next_batch(deadline - time.monotonic())
+                    db.session.refresh(task)
+        
+        etag = f'{task.status}-{task.progress}'
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify({'task': task.to_dict()})
+        response.set_etag(etag, weak=True)
+        return response
+        
+    except Exception as e:
+        logger.error(f"Get task status error: {str(e)}")
+        return jsonify({'error': 'Failed to get task status'}), 500
+
+@app.route('/api/tasks/<int:task_id>/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_task_events(task_id):
+    try:
+        current_user_id = get_jwt_identity()
+        # Subscribe before reading the task so no update falls in between
+        subscription = event_bus.subscribe(f'task:{task_id}')
+        task = ProcessingTask.query.filter_by(id=task_id, user_id=current_user_id).first()
+        if not task:
+            subscription.close()
+            return jsonify({'error': 'Task not found'}), 404
+        
+        snapshot = {'event': 'task', 'data': task.to_dict(), 'final': task.status in ('completed', 'failed')}
+        seen = {'state': (task.status, task.progress)}
+        
+        def refresh():
+            # Celery workers publish in their own process; read the row instead
+            with app.app_context():
+                current = db.session.get(ProcessingTask, task_id)
+                if current is None or (current.status, current.progress) == seen['state']:
+                    return None
+                seen['state'] = (current.status, current.progress)
+                return {'event': 'task', 'data': current.to_dict(), 'final': current.status in ('completed', 'failed')}
+        
+        return Response(
+            stream_events(subscription, snapshot, app.config['EVENT_STREAM_HEARTBEAT'], refresh),
+            mimetype='text/event-stream',
+            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Task event stream error: {str(e)}")
+        return jsonify({'error': 'Failed to stream task events'}), 500
+
 # Image Analysis Routes
 @app.route('/api/images/upload', methods=['POST'])
 @jwt_required()
@@ -307,30 +511,41 @@ def upload_image():
     try:
         current_user_id = get_jwt_identity()
         
-        if 'file' not in request.files:
+        # Body is streamed to disk in chunks, hashed and type-checked as it arrives
+        file = receive_upload(request, 'file', image_upload_policy)
+        if file is None:
             return jsonify({'error': 'No file provided'}), 400
         
-        file = request.files['file']
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        # Secure filename and save
+        # Secure filename and move into place
         filename = secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], 'images', filename)
-        file.save(file_path)
+        file_size, content_hash, _ = save_upload(file, file_path)
         
-        # Analyze image
-        analysis_result = image_analyzer.analyze_image(file_path)
+        # Analyze image, reusing the result of any earlier upload of the same bytes
+        cache_key = result_cache.make_key(
+            content_hash, 'analyze_image', image_analyzer.version,
+            {'color_preset': image_analyzer.color_preset, 'max_edge': image_analyzer.analysis_max_edge}
+        )
+        analysis_result, cache_hit = result_cache.get_or_compute(
+            cache_key, lambda: image_analyzer.analyze_image(file_path)
+        )
+        if cache_hit and 'file_info' in analysis_result:
+            analysis_result['file_info']['filename'] = filename
         
         # Create image analysis record
         image_analysis = ImageAnalysis(
             filename=filename,
             original_filename=file.filename,
             file_path=file_path,
-            file_size=os.path.getsize(file_path),
+            file_size=file_size,
             analysis_data=analysis_result,
+            analyzed_at=datetime.utcnow(),
             user_id=current_user_id
         )
+        image_analysis.set_metadata({'sha256': content_hash})
         
         db.session.add(image_analysis)
         db.session.commit()
@@ -340,14 +555,38 @@ def upload_image():
             'image': {
                 'id': image_analysis.id,
                 'filename': image_analysis.filename,
+                'sha256': content_hash,
+                'cached': cache_hit,
                 'analysis': analysis_result
             }
         }), 201
         
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
     except Exception as e:
         logger.error(f"Image upload error: {str(e)}")
         return jsonify({'error': 'Image upload failed'}), 500
 
+def report_color_analysis(image_analysis):
+    """Color analysis at the report preset; uploads are analyzed at the cheaper IMAGE_COLOR_PRESET"""
+    color_data = image_analysis.analysis_data['color_analysis']
+    preset = app.config['IMAGE_REPORT_COLOR_PRESET']
+    if color_data.get('preset') == preset:
+        return color_data
+    
+    compute = lambda: image_analyzer.analyze_colors(image_analysis.file_path, color_preset=preset)
+    content_hash = image_analysis.get_metadata().get('sha256')
+    if not content_hash:
+        result = compute()
+    else:
+        cache_key = result_cache.make_key(
+            content_hash, 'analyze_colors', image_analyzer.version,
+            {'color_preset': preset, 'max_edge': image_analyzer.analysis_max_edge}
+        )
+        result, _ = result_cache.get_or_compute(cache_key, compute)
+    # Fall back to the upload's colors if the file can no longer be read
+    return color_data if 'error' in result else result
+
 @app.route('/api/images/<int:image_id>/report', methods=['POST'])
 @jwt_required()
 def generate_image_report(image_id):
@@ -365,16 +604,19 @@ def generate_image_report(image_id):
         # Create report content
         report_content = [
             {'type': 'heading', 'text': f'Image Analysis Report: {image_analysis.filename}'},
-            {'type': 'paragraph', 'text': f'Analysis Date: {image_analysis.analyzed_at.strftime("%Y-%m-%d %H:%M:%S")}'},
+            {'type': 'paragraph', 'text': f'Analysis Date: {(image_analysis.analyzed_at or image_analysis.created_at).strftime("%Y-%m-%d %H:%M:%S")}'},
             {'type': 'heading', 'text': 'Analysis Results'},
             {'type': 'paragraph', 'text': image_analysis.analysis_data.get('description', 'No description available')}
         ]
         
         # Add characteristics if available
         if 'color_analysis' in image_analysis.analysis_data:
-            color_data = image_analysis.analysis_data['color_analysis']
+            color_data = report_color_analysis(image_analysis)
             report_content.append({'type': 'heading', 'text': 'Color Analysis'})
             report_content.append({'type': 'paragraph', 'text': f"Dominant colors detected with color variance of {color_data.get('color_variance', 'N/A')}"})
+            if color_data.get('dominant_colors'):
+                colors = ', '.join(f"{color['hex']} ({color['percentage']}%)" for color in color_data['dominant_colors'])
+                report_content.append({'type': 'paragraph', 'text': f"Dominant colors: {colors}"})
         
         result = pdf_processor.create_report_pdf(
             title=f"Image Analysis Report",
@@ -386,9 +628,12 @@ def generate_image_report(image_id):
             # Create report record
             report = Report(
                 title=f"Image Analysis Report - {image_analysis.filename}",
+                name=report_filename,
                 report_type='image_analysis',
                 file_path=report_path,
                 generated_for_id=image_id,
+                status='completed',
+                completed_at=datetime.utcnow(),
                 user_id=current_user_id
             )
             
@@ -431,20 +676,19 @@ def create_workflow():
         if not name:
             return jsonify({'error': 'Workflow name is required'}), 400
         
-        # Create workflow in engine
-        workflow = workflow_engine.create_workflow(name, description)
+        # Create workflow in engine; the SQL state store records it in WorkflowModel itself
+        workflow = workflow_engine.create_workflow(name, description, user_id=current_user_id)
         
-        # Create database record
-        workflow_model = WorkflowModel(
-            workflow_id=workflow.id,
-            name=name,
-            description=description,
-            definition=workflow.to_dict(),
-            user_id=current_user_id
-        )
-        
-        db.session.add(workflow_model)
-        db.session.commit()
+        if not isinstance(workflow_engine.store, SQLStateStore):
+            workflow_model = WorkflowModel(
+                workflow_id=workflow.id,
+                name=name,
+                description=description,
+                user_id=current_user_id
+            )
+            workflow_model.set_definition(workflow.to_dict())
+            db.session.add(workflow_model)
+            db.session.commit()
         
         return jsonify({
             'message': 'Workflow created successfully',
@@ -462,16 +706,25 @@ def execute_workflow(workflow_id):
         current_user_id = get_jwt_identity()
         data = request.get_json()
         input_data = data.get('input_data', {})
+        # Optional pause between steps for animated views, capped at 2 seconds
+        animation_delay = min(max(float(data.get('animation_delay', 0)), 0), 2)
         
-        # Execute workflow
-        execution = workflow_engine.execute_workflow(workflow_id, input_data)
+        # Queue workflow execution; runs start as soon as an execution worker is free
+        execution = workflow_engine.execute_workflow(
+            workflow_id, input_data, user_id=current_user_id, animation_delay=animation_delay
+        )
         
         return jsonify({
             'message': 'Workflow execution started',
             'execution_id': execution.execution_id,
-            'status': execution.status.value
-        })
-        
+            'status': execution.status.value,
+            'queued_executions': workflow_engine.execution_queue.qsize()
+        }), 202
+        
+    except ExecutionRejected as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '5'
+        return response, 429
     except Exception as e:
         logger.error(f"Execute workflow error: {str(e)}")
         return jsonify({'error': 'Failed to execute workflow'}), 500
@@ -480,16 +733,120 @@ def execute_workflow(workflow_id):
 @jwt_required()
 def get_execution_status(execution_id):
     try:
-        execution = workflow_engine.get_execution(execution_id)
-        if not execution:
+        since_version = request.args.get('since_version', type=int)
+        log_cursor = request.args.get('log_cursor', type=int)
+        wait = min(max(request.args.get('wait', 0, type=float), 0), app.config['LONG_POLL_MAX_WAIT'])
+        
+        def unchanged(version):
+            return request.if_none_match.contains_weak(f'{version[0]}-{version[1]}') or version == (since_version, log_cursor)
+        
+        # Cheap version check first so unchanged polls are answered without serializing anything
+        version = workflow_engine.get_execution_version(execution_id)
+        if version is None:
             return jsonify({'error': 'Execution not found'}), 404
+        if wait and unchanged(version):
+            # Long-poll: hold the request until the execution publishes a change or wait expires
+            deadline = time.monotonic() + wait
+            with event_bus.subscribe(f'execution:{execution_id}') as subscription:
+                version = workflow_engine.get_execution_version(execution_id)
+                # An event may announce a version already seen, so keep waiting until it really changes
+                while unchanged(version) and deadline > time.monotonic():
+                    subscription.next_batch(deadline - time.monotonic())
+                    version = workflow_engine.get_execution_version(execution_id)
+        if request.if_none_match.contains_weak(f'{version[0]}-{version[1]}'):
+            response = app.response_class(status=304)
+            response.set_etag(f'{version[0]}-{version[1]}', weak=True)
+            return response
+        
+        if since_version is None and log_cursor is None:
+            execution = workflow_engine.get_execution(execution_id)
+            if not execution:
+                return jsonify({'error': 'Execution not found'}), 404
+            response = jsonify({'execution': execution.to_dict()})
+            etag = f"{execution.version}-{execution.log_count}"
+        else:
+            # Incremental mode: only steps changed after since_version and log lines from log_cursor on
+            changes = workflow_engine.get_execution_changes(execution_id, since_version or 0, log_cursor or 0)
+            if not changes:
+                return jsonify({'error': 'Execution not found'}), 404
+            response = jsonify({'changes': changes})
+            etag = f"{changes['version']}-{changes['log_cursor']}"
         
-        return jsonify({'execution': execution.to_dict()})
+        response.set_etag(etag, weak=True)
+        return response
         
     except Exception as e:
         logger.error(f"Get execution error: {str(e)}")
         return jsonify({'error': 'Failed to get execution status'}), 500
 
+@app.route('/api/workflows/executions/<execution_id>/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_execution_events(execution_id):
+    try:
+        # Subscribe before taking the snapshot so no update falls in between
+        subscription = event_bus.subscribe(f'execution:{execution_id}')
+        snapshot = workflow_engine.get_execution_changes(execution_id)
+        if snapshot is None:
+            subscription.close()
+            return jsonify({'error': 'Execution not found'}), 404
+        
+        finished = ('completed', 'failed')
+        seen = {'version': snapshot['version'], 'log_cursor': snapshot['log_cursor']}
+        
+        def refresh():
+            # Runs executing in another worker publish nothing here; compare the shared version instead
+            if workflow_engine.executions.get(execution_id) is not None:
+                return None
+            version = workflow_engine.get_execution_version(execution_id)
+            if version is None or version[0] <= seen['version']:
+                return None
+            changes = workflow_engine.get_execution_changes(execution_id, seen['version'], seen['log_cursor'])
+            seen.update(version=changes['version'], log_cursor=changes['log_cursor'])
+            return {'event': 'changes', 'data': changes, 'final': changes['status'] in finished}
+        
+        return Response(
+            stream_events(
+                subscription,
+                {'event': 'snapshot', 'data': snapshot, 'final': snapshot['status'] in finished},
+                app.config['EVENT_STREAM_HEARTBEAT'],
+                refresh
+            ),
+            mimetype='text/event-stream',
+            headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'}
+        )
+        
+    except Exception as e:
+        logger.error(f"Execution event stream error: {str(e)}")
+        return jsonify({'error': 'Failed to stream execution events'}), 500
+
+@app.route('/api/workflows/executions/<execution_id>/trace', methods=['GET'])
+@jwt_required()
+def get_execution_trace(execution_id):
+    try:
+        current_user_id = get_jwt_identity()
+        execution = workflow_engine.get_execution(execution_id)
+        # Traces carry step names and arguments; only the run's owner and admins may read them
+        if execution is None:
+            return jsonify({'error': 'Execution not found'}), 404
+        if str(execution.user_id) != str(current_user_id):
+            user = User.query.get(current_user_id)
+            if not user or user.role != 'admin':
+                return jsonify({'error': 'Execution not found'}), 404
+
+        # Chrome trace-event JSON; open it in Perfetto (ui.perfetto.dev) or chrome://tracing
+        trace = workflow_engine.get_execution_trace(execution_id)
+        if trace is None:
+            return jsonify({'error': 'Execution not found'}), 404
+        
+        response = jsonify(trace)
+        if request.args.get('download'):
+            response.headers['Content-Disposition'] = f'attachment; filename=execution-{execution_id}.trace.json'
+        return response
+        
+    except Exception as e:
+        logger.error(f"Execution trace error: {str(e)}")
+        return jsonify({'error': 'Failed to export execution trace'}), 500
+
 # Admin Routes
 @app.route('/api/admin/stats', methods=['GET'])
 @admin_required
@@ -516,6 +873,19 @@ def get_admin_stats():
         logger.error(f"Admin stats error: {str(e)}")
         return jsonify({'error': 'Failed to get admin stats'}), 500
 
+@app.route('/api/admin/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    try:
+        return jsonify({
+            'cache': result_cache.stats(),
+            'workflow_steps': workflow_engine.step_memo.stats() if workflow_engine.step_memo else None
+        })
+        
+    except Exception as e:
+        logger.error(f"Cache stats error: {str(e)}")
+        return jsonify({'error': 'Failed to get cache stats'}), 500
+
 @app.route('/api/admin/users', methods=['GET'])
 @admin_required
 def list_users():
@@ -727,6 +1097,8 @@ def delete_contact_submission(contact_id):
 def create_tables():
     if not hasattr(create_tables, 'already_run'):
         db.create_all()
+        for column in upgrade_schema(db):
+            logger.info(f"Added column {column} to the existing database")
         
         # Create admin user if not exists
         admin_user = User.query.filter_by(username='admin').first()
@@ -756,8 +1128,11 @@ def create_tables():
         
         db.session.commit()
         
-        # Create sample workflows
-        workflow_engine.create_sample_workflows()
+        # Create sample workflows (once per shared store)
+        workflow_engine.create_sample_workflows(owner_id=admin_user.id)
+        
+        # Resume executions left unfinished by a crashed or recycled worker
+        workflow_engine.start(recover=True)
         
         create_tables.already_run = True
 
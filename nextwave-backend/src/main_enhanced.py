@@ -19,6 +19,7 @@ from models.processing import ProcessingTask, Report
 from utils.pdf_processor import PDFProcessor
 from utils.image_analyzer import ImageAnalyzer
 from utils.workflow_engine import WorkflowEngine
+from utils.workflow_handlers import register_processing_handlers
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -39,6 +40,7 @@ db.init_app(app)
 pdf_processor = PDFProcessor()
 image_analyzer = ImageAnalyzer()
 workflow_engine = WorkflowEngine()
+register_processing_handlers(workflow_engine, app, pdf_processor, image_analyzer, Document, ImageAnalysis)
 
 # Create upload directories
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
@@ -18,6 +18,7 @@ class ImageAnalysis(db.Model):
     analyzed_at = db.Column(db.DateTime)
     meta_data = db.Column(db.Text)  # JSON string
     tags = db.Column(db.Text)
+    analysis_data = db.Column(db.JSON)
 
     # Relationships
     analysis_results = db.relationship('ImageAnalysisResult', backref='image', lazy=True, cascade='all, delete-orphan')
@@ -51,7 +52,8 @@ class ImageAnalysis(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'analyzed_at': self.analyzed_at.isoformat() if self.analyzed_at else None,
             'metadata': self.get_metadata(),
-            'tags': self.tags
+            'tags': self.tags,
+            'analysis_data': self.analysis_data
         }
 
 class ImageAnalysisResult(db.Model):
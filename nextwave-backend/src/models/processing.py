@@ -5,7 +5,7 @@ import json
 class ProcessingTask(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    task_type = db.Column(db.Enum('pdf_edit', 'pdf_to_visio', 'visio_to_pdf', 'visio_edit', 'pdf_to_word', 'image_analysis', 'document_upload', 'document_processing', name='task_types'), nullable=False)
+    task_type = db.Column(db.Enum('pdf_edit', 'pdf_to_visio', 'visio_to_pdf', 'visio_edit', 'pdf_to_word', 'image_analysis', 'document_upload', 'document_processing', 'pdf_merge', 'pdf_split', 'pdf_watermark', 'batch_image_analysis', 'image_comparison', name='task_types'), nullable=False)
     source_file_id = db.Column(db.Integer)
     target_file_id = db.Column(db.Integer)
     input_data = db.Column(db.Text)  # JSON string
@@ -70,6 +70,8 @@ class ProcessingTask(db.Model):
             'source_file_id': self.source_file_id,
             'target_file_id': self.target_file_id,
             'parameters': self.get_parameters(),
+            'input_data': self.get_input_data(),
+            'output_data': self.get_output_data(),
             'status': self.status,
             'progress': self.progress,
             'created_at': self.created_at.isoformat() if self.created_at else None,
@@ -0,0 +1,36 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import DBAPIError
+
+# Columns added to tables that existing databases already have. db.create_all()
+# only creates missing tables, so these are added in place at startup.
+ADDED_COLUMNS = {
+    'image_analysis': ('analysis_data',),
+    'workflow_model': ('revision',),
+}
+
+
+def upgrade_schema(db):
+    """Add any ADDED_COLUMNS the database is missing; safe to run on every start"""
+    engine = db.engine
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    for table_name, column_names in ADDED_COLUMNS.items():
+        inspector = inspect(engine)
+        if not inspector.has_table(table_name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table_name)}
+        for name in column_names:
+            if name in existing:
+                continue
+            column_type = db.metadata.tables[table_name].c[name].type.compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as connection:
+                    connection.execute(text(
+                        f'ALTER TABLE {quote(table_name)} ADD COLUMN {quote(name)} {column_type}'
+                    ))
+            except DBAPIError:
+                # Another worker starting at the same time may have added it first
+                if name not in {column['name'] for column in inspect(engine).get_columns(table_name)}:
+                    raise
+            added.append(f'{table_name}.{name}')
+    return added
@@ -10,6 +10,7 @@ class WorkflowModel(db.Model):
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     definition = db.Column(db.Text, nullable=False)  # JSON string
+    revision = db.Column(db.String(64))  # changes with every saved definition; lets workers revalidate cached copies
     status = db.Column(db.Enum('draft', 'active', 'paused', 'completed', name='workflow_model_status'), default='draft')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -131,3 +132,48 @@ class WorkflowExecution(db.Model):
             'result_data': self.get_result_data()
         }
 
+
+class WorkflowRunState(db.Model):
+    """Shared state of a workflow engine execution, readable from any worker"""
+    __tablename__ = 'workflow_run_state'
+    id = db.Column(db.Integer, primary_key=True)
+    execution_id = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    workflow_id = db.Column(db.String(255), nullable=False, index=True)
+    user_id = db.Column(db.String(64))
+    status = db.Column(db.String(20), nullable=False)
+    current_step_id = db.Column(db.String(255))
+    error_message = db.Column(db.Text)
+    start_time = db.Column(db.DateTime)
+    end_time = db.Column(db.DateTime)
+    duration = db.Column(db.Float)
+    input_data = db.Column(db.Text)  # JSON string
+    output_data = db.Column(db.Text)  # JSON string
+    steps_executed = db.Column(db.Text)  # JSON string, completed step ids in order
+    version = db.Column(db.Integer, default=0)  # Bumped on every update, for incremental polling
+    log_count = db.Column(db.Integer, default=0)
+    owner = db.Column(db.String(128))  # Worker running the execution
+    heartbeat = db.Column(db.Float, index=True)  # Unix epoch seconds; stale while queued/running means interrupted
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<WorkflowRunState {self.execution_id}>'
+
+class WorkflowRunStep(db.Model):
+    """State of one step of an execution, so a checkpoint rewrites only the steps that changed"""
+    __tablename__ = 'workflow_run_step'
+    __table_args__ = (db.UniqueConstraint('execution_id', 'step_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    execution_id = db.Column(db.String(64), nullable=False, index=True)
+    step_id = db.Column(db.String(255), nullable=False)
+    state = db.Column(db.Text, nullable=False)  # JSON string
+
+class WorkflowRunLog(db.Model):
+    """Execution log lines, appended without rewriting the run state"""
+    __tablename__ = 'workflow_run_log'
+    id = db.Column(db.Integer, primary_key=True)
+    execution_id = db.Column(db.String(64), nullable=False, index=True)
+    seq = db.Column(db.Integer)
+    timestamp = db.Column(db.Float)  # Unix epoch seconds
+    level = db.Column(db.String(10))
+    message = db.Column(db.Text)
+    step_id = db.Column(db.String(255))
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import os
@@ -6,16 +6,14 @@ import json
 from datetime import datetime
 import uuid
 
-from models.user import User
-from models.document import Document
-from models.image import ImageAnalysis
-from models.processing import ProcessingTask, Report
-from utils.pdf_processor import PDFProcessor
-from utils.image_analyzer import ImageAnalyzer
+from ..models.user import User, db
+from ..models.document import Document
+from ..models.image import ImageAnalysis
+from ..models.processing import ProcessingTask, Report
+from ..utils.task_queue import task_queue
 
+# Handlers use the app's configured processors, registered in current_app.extensions by main.py
 advanced_bp = Blueprint('advanced', __name__)
-pdf_processor = PDFProcessor()
-image_analyzer = ImageAnalyzer()
 
 @advanced_bp.route('/pdf/merge', methods=['POST'])
 @jwt_required()
@@ -38,63 +36,51 @@ def merge_pdfs():
         if len(documents) != len(document_ids):
             return jsonify({'error': 'Some documents not found'}), 404
         
-        # Create processing task
-        task = ProcessingTask(
-            task_type='pdf_merge',
-            status='processing',
-            input_data={'document_ids': document_ids},
-            user_id=current_user_id
-        )
-        
-        from models.user import db
-        db.session.add(task)
-        db.session.commit()
-        
-        # Merge PDFs
-        pdf_paths = [doc.file_path for doc in documents]
-        output_filename = f"merged_{int(datetime.now().timestamp())}.pdf"
-        output_path = os.path.join('uploads', 'documents', output_filename)
-        
-        result = pdf_processor.merge_pdfs(pdf_paths, output_path)
+        task = queue_task('pdf_merge', current_user_id, {'document_ids': document_ids})
         
-        if result.get('success'):
-            # Create new document record
-            merged_doc = Document(
-                filename=output_filename,
-                original_filename=f"merged_{len(documents)}_files.pdf",
-                file_path=output_path,
-                file_size=os.path.getsize(output_path),
-                mime_type='application/pdf',
-                user_id=current_user_id
-            )
-            
-            db.session.add(merged_doc)
-            
-            # Update task
-            task.status = 'completed'
-            task.output_data = {
-                'merged_document_id': merged_doc.id,
-                'original_count': len(documents)
-            }
-            task.completed_at = datetime.now()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'PDFs merged successfully',
-                'task_id': task.id,
-                'document_id': merged_doc.id,
-                'download_url': f'/api/documents/{merged_doc.id}/download'
-            })
-        else:
-            task.status = 'failed'
-            task.output_data = result
-            db.session.commit()
-            return jsonify({'error': 'PDF merge failed'}), 500
+        return jsonify({
+            'message': 'PDF merge queued',
+            'task_id': task.id,
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@task_queue.handler('pdf_merge')
+def run_pdf_merge(task, report_progress):
+    document_ids = task.get_input_data()['document_ids']
+    documents = Document.query.filter(Document.id.in_(document_ids)).all()
+    documents.sort(key=lambda doc: document_ids.index(doc.id))
+    
+    # Merge PDFs
+    pdf_paths = [doc.file_path for doc in documents]
+    output_filename = f"merged_{int(datetime.now().timestamp())}.pdf"
+    output_path = os.path.join('uploads', 'documents', output_filename)
+    
+    result = current_app.extensions['pdf_processor'].merge_pdfs(pdf_paths, output_path, progress_callback=report_progress)
+    if not result.get('success'):
+        return result
+    
+    # Create new document record
+    merged_doc = Document(
+        filename=output_filename,
+        original_filename=f"merged_{len(documents)}_files.pdf",
+        file_path=output_path,
+        file_size=os.path.getsize(output_path),
+        mime_type='application/pdf',
+        user_id=task.user_id
+    )
+    db.session.add(merged_doc)
+    db.session.flush()
+    
+    return {
+        'success': True,
+        'merged_document_id': merged_doc.id,
+        'original_count': len(documents),
+        'download_url': f'/api/documents/{merged_doc.id}/download'
+    }
+
 @advanced_bp.route('/pdf/split', methods=['POST'])
 @jwt_required()
 def split_pdf():
@@ -109,67 +95,65 @@ def split_pdf():
         if not document:
             return jsonify({'error': 'Document not found'}), 404
         
-        # Create processing task
-        task = ProcessingTask(
-            task_type='pdf_split',
-            status='processing',
-            input_data={'document_id': document_id, 'pages_per_split': pages_per_split},
-            user_id=current_user_id
-        )
-        
-        from models.user import db
-        db.session.add(task)
-        db.session.commit()
-        
-        # Split PDF
-        output_dir = os.path.join('uploads', 'documents', f'split_{document_id}')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        result = pdf_processor.split_pdf(document.file_path, output_dir, pages_per_split)
+        task = queue_task('pdf_split', current_user_id, {
+            'document_id': document_id,
+            'pages_per_split': pages_per_split
+        })
         
-        if result.get('success'):
-            # Create document records for split files
-            split_documents = []
-            for split_file in result['split_files']:
-                split_doc = Document(
-                    filename=split_file['filename'],
-                    original_filename=f"split_{split_file['filename']}",
-                    file_path=split_file['path'],
-                    file_size=os.path.getsize(split_file['path']),
-                    mime_type='application/pdf',
-                    user_id=current_user_id
-                )
-                db.session.add(split_doc)
-                split_documents.append({
-                    'filename': split_file['filename'],
-                    'pages': split_file['pages'],
-                    'document_id': split_doc.id
-                })
-            
-            # Update task
-            task.status = 'completed'
-            task.output_data = {
-                'split_files': split_documents,
-                'total_splits': len(split_documents)
-            }
-            task.completed_at = datetime.now()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'PDF split successfully',
-                'task_id': task.id,
-                'split_files': split_documents
-            })
-        else:
-            task.status = 'failed'
-            task.output_data = result
-            db.session.commit()
-            return jsonify({'error': 'PDF split failed'}), 500
+        return jsonify({
+            'message': 'PDF split queued',
+            'task_id': task.id,
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@task_queue.handler('pdf_split')
+def run_pdf_split(task, report_progress):
+    input_data = task.get_input_data()
+    document = db.session.get(Document, input_data['document_id'])
+    if not document:
+        return {'success': False, 'error': 'Document not found'}
+    
+    # Split PDF
+    output_dir = os.path.join('uploads', 'documents', f'split_{document.id}')
+    os.makedirs(output_dir, exist_ok=True)
+    
+    result = current_app.extensions['pdf_processor'].split_pdf(
+        document.file_path, output_dir, input_data.get('pages_per_split', 1),
+        progress_callback=report_progress
+    )
+    if not result.get('success'):
+        return result
+    
+    # Create document records for split files
+    split_records = []
+    for split_file in result['split_files']:
+        split_doc = Document(
+            filename=split_file['filename'],
+            original_filename=f"split_{split_file['filename']}",
+            file_path=split_file['path'],
+            file_size=os.path.getsize(split_file['path']),
+            mime_type='application/pdf',
+            user_id=task.user_id
+        )
+        db.session.add(split_doc)
+        split_records.append((split_file, split_doc))
+    db.session.flush()
+    
+    split_documents = [{
+        'filename': split_file['filename'],
+        'pages': split_file['pages'],
+        'document_id': split_doc.id
+    } for split_file, split_doc in split_records]
+    
+    return {
+        'success': True,
+        'split_files': split_documents,
+        'total_splits': len(split_documents)
+    }
+
 @advanced_bp.route('/pdf/watermark', methods=['POST'])
 @jwt_required()
 def add_watermark():
@@ -185,62 +169,59 @@ def add_watermark():
         if not document:
             return jsonify({'error': 'Document not found'}), 404
         
-        # Create processing task
-        task = ProcessingTask(
-            task_type='pdf_watermark',
-            status='processing',
-            input_data={'document_id': document_id, 'watermark_text': watermark_text},
-            user_id=current_user_id
-        )
-        
-        from models.user import db
-        db.session.add(task)
-        db.session.commit()
-        
-        # Add watermark
-        output_filename = f"watermarked_{int(datetime.now().timestamp())}.pdf"
-        output_path = os.path.join('uploads', 'documents', output_filename)
-        
-        result = pdf_processor.add_watermark(document.file_path, watermark_text, output_path, opacity)
-        
-        if result.get('success'):
-            # Create new document record
-            watermarked_doc = Document(
-                filename=output_filename,
-                original_filename=f"watermarked_{document.original_filename}",
-                file_path=output_path,
-                file_size=os.path.getsize(output_path),
-                mime_type='application/pdf',
-                user_id=current_user_id
-            )
-            
-            db.session.add(watermarked_doc)
-            
-            # Update task
-            task.status = 'completed'
-            task.output_data = {
-                'watermarked_document_id': watermarked_doc.id,
-                'watermark_text': watermark_text
-            }
-            task.completed_at = datetime.now()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Watermark added successfully',
-                'task_id': task.id,
-                'document_id': watermarked_doc.id,
-                'download_url': f'/api/documents/{watermarked_doc.id}/download'
-            })
-        else:
-            task.status = 'failed'
-            task.output_data = result
-            db.session.commit()
-            return jsonify({'error': 'Watermark addition failed'}), 500
+        task = queue_task('pdf_watermark', current_user_id, {
+            'document_id': document_id,
+            'watermark_text': watermark_text,
+            'opacity': opacity
+        })
+        
+        return jsonify({
+            'message': 'Watermark queued',
+            'task_id': task.id,
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@task_queue.handler('pdf_watermark')
+def run_pdf_watermark(task, report_progress):
+    input_data = task.get_input_data()
+    document = db.session.get(Document, input_data['document_id'])
+    if not document:
+        return {'success': False, 'error': 'Document not found'}
+    
+    # Add watermark
+    watermark_text = input_data.get('watermark_text', 'CONFIDENTIAL')
+    output_filename = f"watermarked_{int(datetime.now().timestamp())}.pdf"
+    output_path = os.path.join('uploads', 'documents', output_filename)
+    
+    result = current_app.extensions['pdf_processor'].add_watermark(
+        document.file_path, watermark_text, output_path, input_data.get('opacity', 0.3),
+        progress_callback=report_progress
+    )
+    if not result.get('success'):
+        return result
+    
+    # Create new document record
+    watermarked_doc = Document(
+        filename=output_filename,
+        original_filename=f"watermarked_{document.original_filename}",
+        file_path=output_path,
+        file_size=os.path.getsize(output_path),
+        mime_type='application/pdf',
+        user_id=task.user_id
+    )
+    db.session.add(watermarked_doc)
+    db.session.flush()
+    
+    return {
+        'success': True,
+        'watermarked_document_id': watermarked_doc.id,
+        'watermark_text': watermark_text,
+        'download_url': f'/api/documents/{watermarked_doc.id}/download'
+    }
+
 @advanced_bp.route('/image/batch-analyze', methods=['POST'])
 @jwt_required()
 def batch_analyze_images():
@@ -262,44 +243,27 @@ def batch_analyze_images():
         if len(images) != len(image_ids):
             return jsonify({'error': 'Some images not found'}), 404
         
-        # Create processing task
-        task = ProcessingTask(
-            task_type='batch_image_analysis',
-            status='processing',
-            input_data={'image_ids': image_ids},
-            user_id=current_user_id
-        )
+        task = queue_task('batch_image_analysis', current_user_id, {'image_ids': image_ids})
         
-        from models.user import db
-        db.session.add(task)
-        db.session.commit()
-        
-        # Batch analyze
-        image_paths = [img.file_path for img in images]
-        result = image_analyzer.batch_analyze(image_paths)
-        
-        if result.get('success'):
-            # Update task
-            task.status = 'completed'
-            task.output_data = result
-            task.completed_at = datetime.now()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Batch analysis completed',
-                'task_id': task.id,
-                'results': result
-            })
-        else:
-            task.status = 'failed'
-            task.output_data = result
-            db.session.commit()
-            return jsonify({'error': 'Batch analysis failed'}), 500
+        return jsonify({
+            'message': 'Batch analysis queued',
+            'task_id': task.id,
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@task_queue.handler('batch_image_analysis')
+def run_batch_image_analysis(task, report_progress):
+    image_ids = task.get_input_data()['image_ids']
+    images = ImageAnalysis.query.filter(ImageAnalysis.id.in_(image_ids)).all()
+    images.sort(key=lambda img: image_ids.index(img.id))
+    
+    # Batch analyze
+    image_paths = [img.file_path for img in images]
+    return current_app.extensions['image_analyzer'].batch_analyze(image_paths, progress_callback=report_progress)
+
 @advanced_bp.route('/image/compare', methods=['POST'])
 @jwt_required()
 def compare_images():
@@ -317,92 +281,106 @@ def compare_images():
         if not image1 or not image2:
             return jsonify({'error': 'One or both images not found'}), 404
         
-        # Create processing task
-        task = ProcessingTask(
-            task_type='image_comparison',
-            status='processing',
-            input_data={'image1_id': image1_id, 'image2_id': image2_id},
-            user_id=current_user_id
-        )
+        task = queue_task('image_comparison', current_user_id, {
+            'image1_id': image1_id,
+            'image2_id': image2_id
+        })
         
-        from models.user import db
-        db.session.add(task)
-        db.session.commit()
-        
-        # Compare images
-        analysis1 = image1.analysis_data
-        analysis2 = image2.analysis_data
-        
-        comparison_result = {
-            'image1': {
-                'filename': image1.filename,
-                'analysis': analysis1
-            },
-            'image2': {
-                'filename': image2.filename,
-                'analysis': analysis2
-            },
-            'comparison': {
-                'color_similarity': calculate_color_similarity(analysis1, analysis2),
-                'size_comparison': compare_sizes(analysis1, analysis2),
-                'brightness_difference': compare_brightness(analysis1, analysis2)
-            }
-        }
-        
-        # Generate comparison report
-        report_filename = f"comparison_report_{int(datetime.now().timestamp())}.pdf"
-        report_path = os.path.join('uploads', 'reports', report_filename)
-        
-        report_content = [
-            {'type': 'heading', 'text': 'Image Comparison Report'},
-            {'type': 'paragraph', 'text': f'Comparison between {image1.filename} and {image2.filename}'},
-            {'type': 'heading', 'text': 'Analysis Results'},
-            {'type': 'paragraph', 'text': f"Color similarity: {comparison_result['comparison']['color_similarity']:.2f}%"},
-            {'type': 'paragraph', 'text': f"Size comparison: {comparison_result['comparison']['size_comparison']}"},
-            {'type': 'paragraph', 'text': f"Brightness difference: {comparison_result['comparison']['brightness_difference']:.2f}"}
-        ]
-        
-        pdf_result = pdf_processor.create_report_pdf(
-            title="Image Comparison Report",
-            content=report_content,
-            output_path=report_path
-        )
-        
-        if pdf_result.get('success'):
-            # Create report record
-            report = Report(
-                title=f"Image Comparison: {image1.filename} vs {image2.filename}",
-                report_type='image_comparison',
-                file_path=report_path,
-                generated_for_id=f"{image1_id},{image2_id}",
-                user_id=current_user_id
-            )
-            
-            db.session.add(report)
-            
-            # Update task
-            task.status = 'completed'
-            task.output_data = comparison_result
-            task.completed_at = datetime.now()
-            
-            db.session.commit()
-            
-            return jsonify({
-                'message': 'Image comparison completed',
-                'task_id': task.id,
-                'comparison': comparison_result,
-                'report_id': report.id,
-                'download_url': f'/api/reports/{report.id}/download'
-            })
-        else:
-            task.status = 'failed'
-            task.output_data = {'error': 'Report generation failed'}
-            db.session.commit()
-            return jsonify({'error': 'Comparison report generation failed'}), 500
+        return jsonify({
+            'message': 'Image comparison queued',
+            'task_id': task.id,
+            'status_url': f'/api/tasks/{task.id}'
+        }), 202
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@task_queue.handler('image_comparison')
+def run_image_comparison(task, report_progress):
+    input_data = task.get_input_data()
+    image1 = db.session.get(ImageAnalysis, input_data['image1_id'])
+    image2 = db.session.get(ImageAnalysis, input_data['image2_id'])
+    if not image1 or not image2:
+        return {'success': False, 'error': 'One or both images not found'}
+    
+    # Compare images
+    analysis1 = image1.analysis_data
+    analysis2 = image2.analysis_data
+    
+    comparison_result = {
+        'image1': {
+            'filename': image1.filename,
+            'analysis': analysis1
+        },
+        'image2': {
+            'filename': image2.filename,
+            'analysis': analysis2
+        },
+        'comparison': {
+            'color_similarity': calculate_color_similarity(analysis1, analysis2),
+            'size_comparison': compare_sizes(analysis1, analysis2),
+            'brightness_difference': compare_brightness(analysis1, analysis2)
+        }
+    }
+    report_progress(50)
+    
+    # Generate comparison report
+    report_filename = f"comparison_report_{int(datetime.now().timestamp())}.pdf"
+    report_path = os.path.join('uploads', 'reports', report_filename)
+    
+    report_content = [
+        {'type': 'heading', 'text': 'Image Comparison Report'},
+        {'type': 'paragraph', 'text': f'Comparison between {image1.filename} and {image2.filename}'},
+        {'type': 'heading', 'text': 'Analysis Results'},
+        {'type': 'paragraph', 'text': f"Color similarity: {comparison_result['comparison']['color_similarity']:.2f}%"},
+        {'type': 'paragraph', 'text': f"Size comparison: {comparison_result['comparison']['size_comparison']}"},
+        {'type': 'paragraph', 'text': f"Brightness difference: {comparison_result['comparison']['brightness_difference']:.2f}"}
+    ]
+    
+    pdf_result = current_app.extensions['pdf_processor'].create_report_pdf(
+        title="Image Comparison Report",
+        content=report_content,
+        output_path=report_path
+    )
+    if not pdf_result.get('success'):
+        return {'success': False, 'error': 'Report generation failed'}
+    
+    # Create report record
+    report = Report(
+        title=f"Image Comparison: {image1.filename} vs {image2.filename}",
+        name=report_filename,
+        report_type='image_comparison',
+        file_path=report_path,
+        generated_for_id=image1.id,
+        status='completed',
+        completed_at=datetime.utcnow(),
+        user_id=task.user_id
+    )
+    report.set_source_data({'image_ids': [image1.id, image2.id]})
+    db.session.add(report)
+    db.session.flush()
+    
+    comparison_result.update({
+        'success': True,
+        'report_id': report.id,
+        'download_url': f'/api/reports/{report.id}/download'
+    })
+    return comparison_result
+
+def queue_task(task_type, user_id, input_data):
+    """Create a pending ProcessingTask and enqueue it for the background workers"""
+    task = ProcessingTask(
+        task_type=task_type,
+        status='pending',
+        user_id=user_id
+    )
+    task.set_input_data(input_data)
+    
+    db.session.add(task)
+    db.session.commit()
+    task_queue.enqueue(task)
+    return task
+
 def calculate_color_similarity(analysis1, analysis2):
     """Calculate color similarity between two image analyses"""
     try:
@@ -4,6 +4,7 @@ from werkzeug.utils import secure_filename
 from src.models.user import db, User
 from src.models.image import ImageAnalysis, ImageAnalysisResult
 from src.models.processing import ProcessingTask
+from src.utils.image_analyzer import gray_histogram, histogram_stats
 import os
 import uuid
 from datetime import datetime
@@ -47,10 +48,13 @@ def analyze_image_basic(image_path):
                 'red': int(mean_color[2])
             }
             
-            # Brightness analysis
+            # Brightness analysis from the grayscale histogram
             gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            brightness = gray.mean()
+            gray_stats = histogram_stats(gray_histogram(gray))
+            brightness = gray_stats['mean']
             characteristics['brightness'] = round(brightness, 2)
+            characteristics['contrast'] = round(gray_stats['std'], 2)
+            characteristics['dynamic_range'] = gray_stats['dynamic_range']
             
             # Edge detection for complexity
             edges = cv2.Canny(gray, 50, 150)
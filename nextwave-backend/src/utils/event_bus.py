@@ -0,0 +1,137 @@
+import json
+import time
+import threading
+from collections import OrderedDict, defaultdict
+
+
+class Subscription:
+    """Mailbox of one subscriber.
+
+    Pending events are keyed, and a newer event replaces an undelivered
+    one with the same key, so a slow reader only ever sees the latest
+    state of each step or task instead of a backlog.
+    """
+
+    def __init__(self, bus, topics):
+        self.bus = bus
+        self.topics = topics
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.coalesced = 0
+
+    def deliver(self, key, event):
+        with self.condition:
+            if self.pending.pop(key, None) is not None:
+                self.coalesced += 1
+            self.pending[key] = event
+            self.condition.notify_all()
+
+    def next_batch(self, timeout=None):
+        """Wait up to timeout seconds for events; returns them oldest first (empty on timeout)"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending or self.closed, timeout)
+            events = list(self.pending.values())
+            self.pending.clear()
+            return events
+
+    def close(self):
+        self.bus.unsubscribe(self)
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventBus:
+    """In-process publish/subscribe for progress updates.
+
+    Publishers call ``publish`` on topics such as ``execution:<id>`` or
+    ``task:<id>``; publishing to a topic without subscribers is a dict
+    lookup, so producers can publish on every transition.
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+        self.published = 0
+
+    def subscribe(self, *topics):
+        subscription = Subscription(self, topics)
+        with self.lock:
+            for topic in topics:
+                self.subscribers[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for topic in subscription.topics:
+                subscribers = self.subscribers.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[topic]
+
+    def publish(self, topic, event_type, data, key=None, final=False):
+        """Send an event to the topic's subscribers; events sharing a key are coalesced per subscriber"""
+        subscribers = self.subscribers.get(topic)
+        if not subscribers:
+            return 0
+        event = {'topic': topic, 'event': event_type, 'data': data, 'final': final, 'timestamp': time.time()}
+        with self.lock:
+            subscribers = list(self.subscribers.get(topic, ()))
+            self.published += 1
+        for subscription in subscribers:
+            subscription.deliver((topic, key or event_type), event)
+        return len(subscribers)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'topics': len(self.subscribers),
+                'subscribers': sum(len(subscribers) for subscribers in self.subscribers.values()),
+                'published': self.published
+            }
+
+
+def format_sse(event):
+    """Encode an event for a text/event-stream response"""
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+def stream_events(subscription, snapshot=None, heartbeat=15, refresh=None):
+    """Yield server-sent events for a subscription until a final event arrives.
+
+    ``snapshot`` is an initial event sent before waiting. ``refresh`` is
+    called whenever no event arrived within ``heartbeat`` seconds and may
+    return an event to send (e.g. state changed by another worker);
+    otherwise an SSE comment is sent to keep proxies from closing the
+    connection.
+    """
+    try:
+        if snapshot is not None:
+            yield format_sse(snapshot)
+            if snapshot.get('final'):
+                return
+        while not subscription.closed:
+            events = subscription.next_batch(heartbeat)
+            if not events and refresh is not None:
+                event = refresh()
+                events = [event] if event else []
+            if not events:
+                yield ': heartbeat\n\n'
+                continue
+            for event in events:
+                yield format_sse(event)
+            if any(event.get('final') for event in events):
+                return
+    finally:
+        subscription.close()
+
+
+event_bus = EventBus()
@@ -1,48 +1,246 @@
 import cv2
 import numpy as np
-from PIL import Image, ImageStat, ImageFilter
+from PIL import Image, ImageOps, ImageStat, ImageFilter
 import os
 import json
 from datetime import datetime
 import base64
 import io
+import time
+import queue
+import atexit
+import threading
+import multiprocessing
+from functools import cached_property
+
+# Dominant-color extraction cost/accuracy presets:
+#   method 'histogram' - k-means over a quantized 3D color histogram of sampled pixels
+#   method 'sample'    - k-means over a strided sample of at most pixel_budget pixels
+#   method 'full'      - k-means over every pixel (original behaviour)
+COLOR_PRESETS = {
+    'fast': {'method': 'histogram', 'pixel_budget': 250000, 'bins_per_channel': 16, 'attempts': 3, 'max_iter': 20},
+    'balanced': {'method': 'sample', 'pixel_budget': 100000, 'attempts': 5, 'max_iter': 20},
+    'accurate': {'method': 'full', 'pixel_budget': None, 'attempts': 10, 'max_iter': 20}
+}
+
+def gray_histogram(gray):
+    """256-bin histogram of an 8-bit grayscale image, computed in a single pass"""
+    return cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+
+def histogram_stats(hist):
+    """Mean, std, min, max, dynamic range and local-peak count from a 256-bin histogram"""
+    hist = np.asarray(hist, dtype=np.float64).ravel()
+    total = hist.sum()
+    if total == 0:
+        return {'mean': 0.0, 'std': 0.0, 'min': 0, 'max': 0, 'dynamic_range': 0, 'peaks': 0}
+    
+    levels = np.arange(hist.size, dtype=np.float64)
+    mean = float(levels @ hist / total)
+    variance = max(float((levels ** 2) @ hist / total - mean ** 2), 0.0)
+    occupied = np.flatnonzero(hist)
+    
+    # A peak is a bin strictly higher than both neighbours
+    interior = hist[1:-1]
+    peaks = int(np.count_nonzero((interior > hist[:-2]) & (interior > hist[2:])))
+    
+    return {
+        'mean': mean,
+        'std': variance ** 0.5,
+        'min': int(occupied[0]),
+        'max': int(occupied[-1]),
+        'dynamic_range': int(occupied[-1] - occupied[0]),
+        'peaks': peaks
+    }
+
+class ImageFrame:
+    """A decoded image plus lazily computed, memoized derived planes.
+
+    Every analysis stage reads from the same frame, so each derivative
+    (grayscale, edges, gradients, histogram) is computed at most once per image.
+    """
+
+    def __init__(self, bgr, original_size=None):
+        self.bgr = bgr
+        # Size of the source image; differs from the working copy when downscaled
+        self.original_width, self.original_height = original_size or (bgr.shape[1], bgr.shape[0])
+        self.scale = bgr.shape[1] / self.original_width
+
+    @classmethod
+    def load(cls, image_path, max_edge=None):
+        """Decode an image, optionally as a working copy whose long edge is at most max_edge"""
+        if not max_edge:
+            bgr = cv2.imread(image_path)
+            return cls(bgr) if bgr is not None else None
+        
+        try:
+            with Image.open(image_path) as pil_image:
+                width, height = pil_image.size
+                if pil_image.getexif().get(0x0112) in (5, 6, 7, 8):
+                    # EXIF orientations that transpose the stored pixel grid
+                    width, height = height, width
+                original_size = (width, height)
+                scale = min(1.0, max_edge / max(original_size))
+                if scale < 1.0 and pil_image.format == 'JPEG':
+                    # Let the JPEG decoder skip detail via DCT scaling (1/2, 1/4, 1/8)
+                    pil_image.draft('RGB', (int(pil_image.size[0] * scale), int(pil_image.size[1] * scale)))
+                rgb = np.asarray(ImageOps.exif_transpose(pil_image).convert('RGB'))
+        except Exception:
+            return None
+        
+        bgr = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+        target = (max(1, round(original_size[0] * scale)), max(1, round(original_size[1] * scale)))
+        if (bgr.shape[1], bgr.shape[0]) != target:
+            bgr = cv2.resize(bgr, target, interpolation=cv2.INTER_AREA)
+        return cls(bgr, original_size)
+
+    def to_original(self, value, power=1):
+        """Map a working-resolution measurement (length, or area with power=2) to source pixels"""
+        return value / (self.scale ** power)
+
+    @property
+    def height(self):
+        return self.bgr.shape[0]
+
+    @property
+    def width(self):
+        return self.bgr.shape[1]
+
+    @property
+    def channels(self):
+        return self.bgr.shape[2] if self.bgr.ndim > 2 else 1
+
+    @property
+    def pixel_count(self):
+        return self.height * self.width
+
+    @cached_property
+    def gray(self):
+        return cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+
+    @cached_property
+    def edges(self):
+        return cv2.Canny(self.gray, 50, 150)
+
+    @cached_property
+    def gradients(self):
+        grad_x = cv2.Sobel(self.gray, cv2.CV_32F, 1, 0, ksize=3)
+        grad_y = cv2.Sobel(self.gray, cv2.CV_32F, 0, 1, ksize=3)
+        return grad_x, grad_y
+
+    @cached_property
+    def gradient_magnitude(self):
+        return cv2.magnitude(*self.gradients)
+
+    @cached_property
+    def gray_histogram(self):
+        return gray_histogram(self.gray)
+
+    @cached_property
+    def gray_stats(self):
+        return histogram_stats(self.gray_histogram)
+
+    @cached_property
+    def channel_mean_var(self):
+        """Per-channel mean and variance in RGB order"""
+        mean, std = cv2.meanStdDev(self.bgr)
+        return mean.ravel()[::-1], (std.ravel() ** 2)[::-1]
+
 
 class ImageAnalyzer:
-    def __init__(self):
+    # Bump when analysis output changes so cached results are invalidated
+    version = '1.3.0'
+
+    def __init__(self, batch_workers=None, batch_timeout=60, max_in_flight=None, color_preset='fast',
+                 analysis_max_edge=1024, start_method='spawn'):
         self.supported_formats = ['jpg', 'jpeg', 'png', 'bmp', 'tiff', 'webp']
+        if color_preset not in COLOR_PRESETS:
+            raise ValueError(f"Unknown color preset: {color_preset}")
+        self.color_preset = color_preset
+        # Stages run on a working copy whose long edge is at most analysis_max_edge
+        # pixels (None analyzes at full resolution); pixel-denominated outputs are
+        # mapped back to source coordinates.
+        self.analysis_max_edge = analysis_max_edge
+        # Batch analysis runs on a bounded process pool; at most max_in_flight
+        # images are submitted at once and each gets batch_timeout seconds.
+        self.batch_workers = batch_workers or os.cpu_count() or 1
+        self.batch_timeout = batch_timeout
+        self.max_in_flight = max_in_flight or self.batch_workers
+        # The pool is created on first use and shared by every batch; spawned
+        # workers do not inherit the threads and connections of a forked server
+        self.start_method = start_method
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+    
+    def __getstate__(self):
+        # The analyzer is pickled into every batch task; the pool stays behind
+        state = self.__dict__.copy()
+        state.update(_pool=None, _pool_pid=None, _pool_lock=None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+    
+    def _batch_pool(self):
+        with self._pool_lock:
+            # A pool inherited across fork belongs to the parent
+            if self._pool is None or self._pool_pid != os.getpid():
+                context = multiprocessing.get_context(self.start_method)
+                self._pool = context.Pool(self.batch_workers, initializer=_init_batch_worker)
+                if self._pool_pid is None:
+                    atexit.register(self.shutdown)
+                self._pool_pid = os.getpid()
+            return self._pool
     
-    def analyze_image(self, image_path):
+    def _recycle_pool(self, pool):
+        """Terminate a pool with stuck workers; the next _batch_pool() call starts a fresh one"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.terminate()
+        pool.join()
+    
+    def shutdown(self):
+        """Stop the batch pool; registered to run at interpreter exit"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            owned = self._pool_pid == os.getpid()
+        if pool is not None and owned:
+            pool.terminate()
+            pool.join()
+    
+    def analyze_image(self, image_path, color_preset=None):
         """Comprehensive image analysis"""
         try:
-            # Load image with PIL and OpenCV
-            pil_image = Image.open(image_path)
-            cv_image = cv2.imread(image_path)
+            # Decode once; all stages share the frame's derived planes
+            frame = ImageFrame.load(image_path, self.analysis_max_edge)
             
-            if cv_image is None:
+            if frame is None:
                 return {
                     'success': False,
                     'error': 'Could not load image'
                 }
             
             # Basic image properties
-            height, width = cv_image.shape[:2]
-            channels = cv_image.shape[2] if len(cv_image.shape) > 2 else 1
+            height, width = frame.original_height, frame.original_width
+            channels = frame.channels
             
             # File information
             file_size = os.path.getsize(image_path)
             file_name = os.path.basename(image_path)
             
             # Color analysis
-            color_analysis = self._analyze_colors(pil_image, cv_image)
+            color_analysis = self._analyze_colors(frame, color_preset or self.color_preset)
             
             # Texture and edge analysis
-            texture_analysis = self._analyze_texture(cv_image)
+            texture_analysis = self._analyze_texture(frame)
             
             # Brightness and contrast
-            brightness_contrast = self._analyze_brightness_contrast(cv_image)
+            brightness_contrast = self._analyze_brightness_contrast(frame)
             
             # Object detection (basic)
-            object_info = self._detect_basic_objects(cv_image)
+            object_info = self._detect_basic_objects(frame)
             
             # Generate description
             description = self._generate_description(
@@ -62,6 +260,11 @@ class ImageAnalyzer:
                     },
                     'aspect_ratio': round(width / height, 2)
                 },
+                'analysis_resolution': {
+                    'width': frame.width,
+                    'height': frame.height,
+                    'scale': round(frame.scale, 4)
+                },
                 'color_analysis': color_analysis,
                 'texture_analysis': texture_analysis,
                 'brightness_contrast': brightness_contrast,
@@ -78,24 +281,30 @@ class ImageAnalyzer:
                 'error': str(e)
             }
     
-    def _analyze_colors(self, pil_image, cv_image):
+    def analyze_colors(self, image_path, color_preset=None):
+        """Color analysis alone, e.g. to redo an upload's colors at a more accurate preset"""
+        color_preset = color_preset or self.color_preset
+        if color_preset not in COLOR_PRESETS:
+            raise ValueError(f"Unknown color preset: {color_preset}")
+        frame = ImageFrame.load(image_path, self.analysis_max_edge)
+        if frame is None:
+            return {'success': False, 'error': 'Could not load image'}
+        return self._analyze_colors(frame, color_preset)
+    
+    def _analyze_colors(self, frame, color_preset='fast'):
         """Analyze color properties of the image"""
         try:
-            # Convert to RGB for PIL analysis
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-            
             # Get dominant colors using k-means clustering
-            dominant_colors = self._get_dominant_colors(cv_image, k=5)
+            dominant_colors = self._get_dominant_colors(frame.bgr, k=5, preset=color_preset)
             
             # Color statistics
-            stat = ImageStat.Stat(pil_image)
+            channel_mean, channel_var = frame.channel_mean_var
             
             # Average color
-            avg_color = [int(c) for c in stat.mean]
+            avg_color = [int(c) for c in channel_mean]
             
             # Color variance (measure of color diversity)
-            color_variance = sum(stat.var) / len(stat.var)
+            color_variance = float(channel_var.mean())
             
             return {
                 'dominant_colors': dominant_colors,
@@ -104,33 +313,47 @@ class ImageAnalyzer:
                     'hex': '#{:02x}{:02x}{:02x}'.format(*avg_color)
                 },
                 'color_variance': round(color_variance, 2),
-                'color_diversity': 'high' if color_variance > 1000 else 'medium' if color_variance > 500 else 'low'
+                'color_diversity': 'high' if color_variance > 1000 else 'medium' if color_variance > 500 else 'low',
+                'preset': color_preset
             }
         except Exception as e:
             return {'error': str(e)}
     
-    def _get_dominant_colors(self, image, k=5):
-        """Extract dominant colors using k-means clustering"""
+    def _get_dominant_colors(self, image, k=5, preset='fast'):
+        """Extract dominant colors using k-means clustering within the preset's pixel budget"""
         try:
-            # Reshape image to be a list of pixels
-            data = image.reshape((-1, 3))
-            data = np.float32(data)
+            settings = COLOR_PRESETS[preset]
             
-            # Apply k-means clustering
-            criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
-            _, labels, centers = cv2.kmeans(data, k, None, criteria, 10, cv2.KMEANS_RANDOM_CENTERS)
+            # Reshape image to be a list of pixels, striding down to the pixel budget
+            data = image.reshape((-1, 3))
+            budget = settings['pixel_budget']
+            if budget and len(data) > budget:
+                data = data[::-(-len(data) // budget)]
+            
+            if settings['method'] == 'histogram':
+                points, weights = _color_histogram(data, settings['bins_per_channel'])
+                centers, cluster_weights = _weighted_kmeans(
+                    points, weights, k, settings['attempts'], settings['max_iter']
+                )
+            else:
+                data = np.float32(data)
+                k = min(k, len(data))
+                criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, settings['max_iter'], 1.0)
+                _, labels, centers = cv2.kmeans(data, k, None, criteria, settings['attempts'], cv2.KMEANS_RANDOM_CENTERS)
+                cluster_weights = np.bincount(labels.ravel(), minlength=k)
             
             # Convert centers to integers and create color list
-            centers = np.uint8(centers)
+            centers = np.uint8(np.clip(np.round(centers), 0, 255))
+            total = cluster_weights.sum()
             dominant_colors = []
             
-            for i, color in enumerate(centers):
+            for color, weight in zip(centers, cluster_weights):
                 # Convert BGR to RGB
                 rgb_color = [int(color[2]), int(color[1]), int(color[0])]
                 hex_color = '#{:02x}{:02x}{:02x}'.format(*rgb_color)
                 
                 # Calculate percentage of this color
-                percentage = round((np.sum(labels == i) / len(labels)) * 100, 1)
+                percentage = round(float(weight / total) * 100, 1)
                 
                 dominant_colors.append({
                     'rgb': rgb_color,
@@ -145,25 +368,18 @@ class ImageAnalyzer:
         except Exception as e:
             return []
     
-    def _analyze_texture(self, image):
+    def _analyze_texture(self, frame):
         """Analyze texture properties"""
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
             # Edge detection
-            edges = cv2.Canny(gray, 50, 150)
-            edge_density = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
+            edge_density = cv2.countNonZero(frame.edges) / frame.pixel_count
             
             # Texture analysis using Local Binary Pattern (simplified)
             # Calculate standard deviation as a measure of texture
-            texture_measure = np.std(gray)
+            texture_measure = frame.gray_stats['std']
             
             # Gradient magnitude
-            grad_x = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-            grad_y = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-            gradient_magnitude = np.sqrt(grad_x**2 + grad_y**2)
-            avg_gradient = np.mean(gradient_magnitude)
+            avg_gradient = float(cv2.mean(frame.gradient_magnitude)[0])
             
             return {
                 'edge_density': round(edge_density, 4),
@@ -183,34 +399,22 @@ class ImageAnalyzer:
         else:
             return 'smooth'
     
-    def _analyze_brightness_contrast(self, image):
+    def _analyze_brightness_contrast(self, frame):
         """Analyze brightness and contrast"""
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            # Brightness (average pixel value)
-            brightness = np.mean(gray)
-            
-            # Contrast (standard deviation)
-            contrast = np.std(gray)
-            
-            # Histogram analysis
-            hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-            
-            # Find peaks in histogram
-            hist_peaks = []
-            for i in range(1, 255):
-                if hist[i] > hist[i-1] and hist[i] > hist[i+1]:
-                    hist_peaks.append(i)
+            # Brightness (mean), contrast (std), range and peaks all come from
+            # the 256-bin histogram rather than further passes over the pixels
+            stats = frame.gray_stats
+            brightness = stats['mean']
+            contrast = stats['std']
             
             return {
                 'brightness': round(brightness, 2),
                 'brightness_level': self._classify_brightness(brightness),
                 'contrast': round(contrast, 2),
                 'contrast_level': self._classify_contrast(contrast),
-                'histogram_peaks': len(hist_peaks),
-                'dynamic_range': int(np.max(gray) - np.min(gray))
+                'histogram_peaks': stats['peaks'],
+                'dynamic_range': stats['dynamic_range']
             }
         except Exception as e:
             return {'error': str(e)}
@@ -233,28 +437,25 @@ class ImageAnalyzer:
         else:
             return 'high'
     
-    def _detect_basic_objects(self, image):
+    def _detect_basic_objects(self, frame):
         """Basic object detection using contours"""
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
             # Apply threshold
-            _, thresh = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY)
+            _, thresh = cv2.threshold(frame.gray, 127, 255, cv2.THRESH_BINARY)
             
             # Find contours
             contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
             
-            # Analyze contours
+            # Analyze contours, reporting areas and boxes in source-image pixels
             objects = []
             for i, contour in enumerate(contours):
-                area = cv2.contourArea(contour)
+                area = frame.to_original(cv2.contourArea(contour), power=2)
                 if area > 100:  # Filter small objects
-                    x, y, w, h = cv2.boundingRect(contour)
+                    x, y, w, h = (frame.to_original(v) for v in cv2.boundingRect(contour))
                     objects.append({
                         'id': i,
                         'area': int(area),
-                        'bounding_box': {'x': int(x), 'y': int(y), 'width': int(w), 'height': int(h)},
+                        'bounding_box': {'x': int(x), 'y': int(y), 'width': int(round(w)), 'height': int(round(h))},
                         'aspect_ratio': round(w/h, 2) if h > 0 else 0
                     })
             
@@ -330,7 +531,7 @@ class ImageAnalyzer:
             report_data = {
                 'report_metadata': {
                     'generated_at': datetime.now().isoformat(),
-                    'analyzer_version': '1.0.0',
+                    'analyzer_version': self.version,
                     'report_type': 'image_analysis'
                 },
                 'analysis_data': analysis_data
@@ -349,20 +550,13 @@ class ImageAnalyzer:
                 'error': str(e)
             }
     
-    def batch_analyze(self, image_paths):
+    def batch_analyze(self, image_paths, progress_callback=None, ordered=True):
         """Analyze multiple images in batch"""
         results = []
-        for image_path in image_paths:
-            if os.path.exists(image_path):
-                result = self.analyze_image(image_path)
-                result['image_path'] = image_path
-                results.append(result)
-            else:
-                results.append({
-                    'success': False,
-                    'error': f'Image not found: {image_path}',
-                    'image_path': image_path
-                })
+        for result in self.iter_batch_analyze(image_paths, ordered=ordered):
+            results.append(result)
+            if progress_callback:
+                progress_callback(len(results) * 100 // len(image_paths))
         
         return {
             'success': True,
@@ -370,4 +564,170 @@ class ImageAnalyzer:
             'successful_analyses': len([r for r in results if r.get('success')]),
             'results': results
         }
+    
+    def iter_batch_analyze(self, image_paths, ordered=True):
+        """Yield per-image results in input order, or as they complete when ordered=False"""
+        workers = min(self.batch_workers, len(image_paths))
+        # Daemonic processes (e.g. Celery prefork workers) cannot start a pool
+        if workers <= 1 or multiprocessing.current_process().daemon:
+            for index, image_path in enumerate(image_paths):
+                result = _analyze_image_task(self, image_path)
+                result['index'] = index
+                yield result
+            return
+        
+        next_to_yield = 0
+        buffered = {}
+        for result in self._run_batch_pool(image_paths):
+            if not ordered:
+                yield result
+                continue
+            buffered[result['index']] = result
+            while next_to_yield in buffered:
+                yield buffered.pop(next_to_yield)
+                next_to_yield += 1
+    
+    def _run_batch_pool(self, image_paths):
+        """Drive the shared process pool with bounded submissions and per-image deadlines"""
+        completed = queue.Queue()
+        pool = None
+        pending = {}  # index -> deadline
+        next_index = 0
+        
+        def submit(index):
+            pool.apply_async(
+                _analyze_image_task,
+                (self, image_paths[index]),
+                callback=lambda result, i=index: completed.put((i, result)),
+                error_callback=lambda error, i=index: completed.put((i, {
+                    'success': False,
+                    'error': str(error),
+                    'image_path': image_paths[i]
+                }))
+            )
+            pending[index] = time.monotonic() + self.batch_timeout
+        
+        pool = self._batch_pool()
+        while next_index < len(image_paths) or pending:
+            # Another batch recycled the shared pool, taking our in-flight images with it
+            current = self._batch_pool()
+            if current is not pool:
+                pool = current
+                for i in sorted(pending):
+                    submit(i)
+            
+            # Backpressure: only keep max_in_flight images submitted
+            while next_index < len(image_paths) and len(pending) < self.max_in_flight:
+                submit(next_index)
+                next_index += 1
+            
+            # Wake at least once a second to notice a pool replaced by another batch
+            wait = min(max(0, min(pending.values()) - time.monotonic()), 1.0)
+            try:
+                index, result = completed.get(timeout=wait)
+            except queue.Empty:
+                index, result = None, None
+            
+            if index is not None:
+                if pending.pop(index, None) is None:
+                    continue  # Late result for an image that already timed out or was resubmitted
+                result['index'] = index
+                yield result
+                continue
+            
+            now = time.monotonic()
+            expired = [i for i, deadline in pending.items() if deadline <= now]
+            if not expired:
+                continue
+            
+            # Deadline passed: recycle the pool to kill stuck workers,
+            # then resubmit the images that were still in flight
+            self._recycle_pool(pool)
+            for i in expired:
+                del pending[i]
+                yield {
+                    'success': False,
+                    'error': f'Analysis timed out after {self.batch_timeout}s',
+                    'image_path': image_paths[i],
+                    'index': i
+                }
+            pool = self._batch_pool()
+            for i in sorted(pending):
+                submit(i)
+
+def _color_histogram(pixels, bins_per_channel):
+    """Quantize BGR pixels into a 3D histogram; returns occupied bin centroids and pixel counts"""
+    shift = 8 - int(np.log2(bins_per_channel))
+    quantized = (pixels >> shift).astype(np.int32)
+    bin_index = (quantized[:, 0] * bins_per_channel + quantized[:, 1]) * bins_per_channel + quantized[:, 2]
+    
+    n_bins = bins_per_channel ** 3
+    counts = np.bincount(bin_index, minlength=n_bins)
+    occupied = np.nonzero(counts)[0]
+    
+    # Use the mean color of the pixels in each bin rather than the bin midpoint
+    centroids = np.stack([
+        np.bincount(bin_index, weights=pixels[:, channel], minlength=n_bins)[occupied]
+        for channel in range(3)
+    ], axis=1) / counts[occupied, None]
+    return centroids, counts[occupied].astype(np.float64)
 
+def _weighted_kmeans(points, weights, k, attempts=3, max_iter=20, seed=0):
+    """Lloyd's k-means over weighted points with k-means++ seeding; returns centers and cluster weights"""
+    if len(points) <= k:
+        return points, weights
+    
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(attempts):
+        # k-means++ initialisation, weighting candidates by pixel count
+        centers = [points[rng.choice(len(points), p=weights / weights.sum())]]
+        for _ in range(1, k):
+            distances = np.min(((points[:, None, :] - np.array(centers)[None]) ** 2).sum(axis=2), axis=1)
+            probabilities = distances * weights
+            if probabilities.sum() == 0:
+                break
+            centers.append(points[rng.choice(len(points), p=probabilities / probabilities.sum())])
+        centers = np.array(centers, dtype=np.float64)
+        
+        for _ in range(max_iter):
+            distances = ((points[:, None, :] - centers[None]) ** 2).sum(axis=2)
+            labels = np.argmin(distances, axis=1)
+            cluster_weights = np.bincount(labels, weights=weights, minlength=len(centers))
+            sums = np.stack([
+                np.bincount(labels, weights=weights * points[:, channel], minlength=len(centers))
+                for channel in range(3)
+            ], axis=1)
+            occupied = cluster_weights > 0
+            new_centers = centers.copy()
+            new_centers[occupied] = sums[occupied] / cluster_weights[occupied, None]
+            shift = np.abs(new_centers - centers).max()
+            centers = new_centers
+            if shift < 1.0:
+                break
+        
+        distances = ((points[:, None, :] - centers[None]) ** 2).sum(axis=2)
+        labels = np.argmin(distances, axis=1)
+        compactness = float((distances[np.arange(len(points)), labels] * weights).sum())
+        if best is None or compactness < best[0]:
+            best = (compactness, centers, np.bincount(labels, weights=weights, minlength=len(centers)))
+    
+    _, centers, cluster_weights = best
+    occupied = cluster_weights > 0
+    return centers[occupied], cluster_weights[occupied]
+
+def _init_batch_worker():
+    """Keep OpenCV single-threaded inside pool workers to avoid oversubscription"""
+    cv2.setNumThreads(1)
+
+def _analyze_image_task(analyzer, image_path):
+    """Analyze one image of a batch; runs inside pool workers"""
+    if not os.path.exists(image_path):
+        return {
+            'success': False,
+            'error': f'Image not found: {image_path}',
+            'image_path': image_path
+        }
+    result = analyzer.analyze_image(image_path)
+    result['image_path'] = image_path
+    return result
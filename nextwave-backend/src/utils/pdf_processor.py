@@ -1,6 +1,11 @@
 import os
 import io
 import time
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import PyPDF2
 from PIL import Image
 from reportlab.pdfgen import canvas
@@ -13,21 +18,90 @@ from reportlab.lib.colors import HexColor
 import fitz  # PyMuPDF for advanced PDF operations
 
 class PDFProcessor:
-    def __init__(self):
+    # Bump when extraction output changes so cached results are invalidated
+    version = '1.1.0'
+
+    def __init__(self, extraction_workers=None, pages_per_chunk=32, start_method='spawn'):
         self.supported_formats = ['pdf', 'docx', 'doc', 'txt']
+        # Text extraction fans page ranges out over one long-lived pool of this
+        # many processes, shared by all requests and started on first use;
+        # documents that fit in a single chunk are extracted in-process.
+        # Workers are spawned rather than forked from the threaded server.
+        self.extraction_workers = extraction_workers or os.cpu_count() or 1
+        self.pages_per_chunk = max(1, pages_per_chunk)
+        self.start_method = start_method
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+    
+    def _extraction_pool(self):
+        with self._pool_lock:
+            # A pool inherited across fork belongs to the parent
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.extraction_workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+                if self._pool_pid is None:
+                    atexit.register(self.shutdown)
+                self._pool_pid = os.getpid()
+            return self._pool
+    
+    def _discard_pool(self, pool):
+        """Drop a pool whose worker died so the next extraction starts a fresh one"""
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    def shutdown(self, wait=True):
+        """Stop the extraction pool; registered to run at interpreter exit"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            owned = self._pool_pid == os.getpid()
+        if pool is not None and owned:
+            pool.shutdown(wait=wait, cancel_futures=True)
     
-    def extract_text_from_pdf(self, pdf_path):
-        """Extract text content from PDF file"""
+    def extract_text_from_pdf(self, pdf_path, progress_callback=None):
+        """Extract text content from PDF file, sharding page ranges across processes"""
         try:
-            text_content = []
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text_content.append({
-                        'page': page_num + 1,
-                        'text': page.extract_text()
-                    })
+            with fitz.open(pdf_path) as doc:
+                total_pages = len(doc)
+            
+            chunks = [
+                (start, min(start + self.pages_per_chunk, total_pages))
+                for start in range(0, total_pages, self.pages_per_chunk)
+            ]
+            
+            # Daemonic processes (e.g. Celery prefork workers) cannot start a pool
+            if self.extraction_workers <= 1 or len(chunks) <= 1 or multiprocessing.current_process().daemon:
+                text_content = []
+                for start, end in chunks:
+                    text_content.extend(_extract_page_range(pdf_path, start, end))
+                    _report_progress(progress_callback, end, total_pages)
+            else:
+                results = {}
+                pages_done = 0
+                pool = self._extraction_pool()
+                try:
+                    futures = {
+                        pool.submit(_extract_page_range, pdf_path, start, end): start
+                        for start, end in chunks
+                    }
+                    for future in as_completed(futures):
+                        pages = future.result()
+                        results[futures[future]] = pages
+                        pages_done += len(pages)
+                        _report_progress(progress_callback, pages_done, total_pages)
+                except BrokenProcessPool:
+                    self._discard_pool(pool)
+                    raise
+                
+                # Merge chunk results back into page order
+                text_content = []
+                for start, _ in chunks:
+                    text_content.extend(results[start])
+            
             return {
                 'success': True,
                 'content': text_content,
@@ -39,13 +113,27 @@ class PDFProcessor:
                 'error': str(e)
             }
     
-    def pdf_to_images(self, pdf_path, output_dir, dpi=150):
+    def iter_text_from_pdf(self, pdf_path, start_page=1, end_page=None):
+        """Yield extracted text one page at a time, keeping only the current page in memory"""
+        with fitz.open(pdf_path) as doc:
+            total_pages = len(doc)
+            last_page = total_pages if end_page is None else min(end_page, total_pages)
+            for page_num in range(max(start_page, 1) - 1, last_page):
+                page = doc.load_page(page_num)
+                yield {
+                    'page': page_num + 1,
+                    'total_pages': total_pages,
+                    'text': page.get_text()
+                }
+    
+    def pdf_to_images(self, pdf_path, output_dir, dpi=150, progress_callback=None):
         """Convert PDF pages to images"""
         try:
             doc = fitz.open(pdf_path)
             images = []
+            total_pages = len(doc)
             
-            for page_num in range(len(doc)):
+            for page_num in range(total_pages):
                 page = doc.load_page(page_num)
                 mat = fitz.Matrix(dpi/72, dpi/72)
                 pix = page.get_pixmap(matrix=mat)
@@ -58,6 +146,7 @@ class PDFProcessor:
                     'width': pix.width,
                     'height': pix.height
                 })
+                _report_progress(progress_callback, page_num + 1, total_pages)
             
             doc.close()
             return {
@@ -71,17 +160,18 @@ class PDFProcessor:
                 'error': str(e)
             }
     
-    def merge_pdfs(self, pdf_paths, output_path):
+    def merge_pdfs(self, pdf_paths, output_path, progress_callback=None):
         """Merge multiple PDF files into one"""
         try:
             pdf_writer = PyPDF2.PdfWriter()
             
-            for pdf_path in pdf_paths:
+            for file_num, pdf_path in enumerate(pdf_paths):
                 with open(pdf_path, 'rb') as file:
                     pdf_reader = PyPDF2.PdfReader(file)
                     for page_num in range(len(pdf_reader.pages)):
                         page = pdf_reader.pages[page_num]
                         pdf_writer.add_page(page)
+                _report_progress(progress_callback, file_num + 1, len(pdf_paths))
             
             with open(output_path, 'wb') as output_file:
                 pdf_writer.write(output_file)
@@ -97,7 +187,7 @@ class PDFProcessor:
                 'error': str(e)
             }
     
-    def split_pdf(self, pdf_path, output_dir, pages_per_split=1):
+    def split_pdf(self, pdf_path, output_dir, pages_per_split=1, progress_callback=None):
         """Split PDF into multiple files"""
         try:
             with open(pdf_path, 'rb') as file:
@@ -124,6 +214,7 @@ class PDFProcessor:
                         'path': output_path,
                         'pages': f'{i+1}-{end_page}'
                     })
+                    _report_progress(progress_callback, end_page, total_pages)
             
             return {
                 'success': True,
@@ -136,12 +227,13 @@ class PDFProcessor:
                 'error': str(e)
             }
     
-    def add_watermark(self, pdf_path, watermark_text, output_path, opacity=0.3):
+    def add_watermark(self, pdf_path, watermark_text, output_path, opacity=0.3, progress_callback=None):
         """Add watermark to PDF"""
         try:
             doc = fitz.open(pdf_path)
+            total_pages = len(doc)
             
-            for page_num in range(len(doc)):
+            for page_num in range(total_pages):
                 page = doc.load_page(page_num)
                 
                 # Get page dimensions
@@ -156,6 +248,7 @@ class PDFProcessor:
                     color=(0.5, 0.5, 0.5),
                     overlay=True
                 )
+                _report_progress(progress_callback, page_num + 1, total_pages)
             
             doc.save(output_path)
             doc.close()
@@ -252,6 +345,19 @@ class PDFProcessor:
                 'error': str(e)
             }
 
+def _extract_page_range(pdf_path, start, end):
+    """Extract text for pages [start, end) of a PDF; runs inside pool workers"""
+    with fitz.open(pdf_path) as doc:
+        return [
+            {'page': page_num + 1, 'text': doc.load_page(page_num).get_text()}
+            for page_num in range(start, end)
+        ]
+
+def _report_progress(progress_callback, done, total):
+    """Forward completion percentage to an optional progress callback"""
+    if progress_callback and total:
+        progress_callback(done * 100 // total)
+
 # Utility functions for document conversion
 def convert_docx_to_pdf(docx_path, output_path):
     """Convert DOCX to PDF (placeholder - requires python-docx and additional libraries)"""
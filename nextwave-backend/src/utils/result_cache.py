@@ -0,0 +1,238 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def sha256_file(file_path, chunk_size=1024 * 1024):
+    """Compute the sha256 hex digest of a file without loading it into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU store bounded by the total size of stored payloads"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            payload = self.entries.get(key)
+            if payload is not None:
+                self.entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        size = len(payload)
+        if size > self.max_bytes:
+            return False
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.current_bytes -= len(previous)
+            self.entries[key] = payload
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= len(evicted)
+        return True
+
+    def delete(self, key):
+        with self.lock:
+            payload = self.entries.pop(key, None)
+            if payload is not None:
+                self.current_bytes -= len(payload)
+
+    def size(self):
+        return {'entries': len(self.entries), 'bytes': self.current_bytes}
+
+
+class DiskCacheBackend:
+    """File-per-entry store; least recently read entries are evicted first"""
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                payload = f.read()
+            os.utime(path)  # Touch so eviction follows access order
+            return payload
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, payload):
+        if len(payload) > self.max_bytes:
+            return False
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._evict()
+        return True
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _evict(self):
+        with self.lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total <= self.max_bytes:
+                return
+            for _, size, name in sorted(entries):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def size(self):
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries)}
+
+
+class RedisCacheBackend:
+    """Shared store for multiple workers; size is bounded by the server's maxmemory LRU policy"""
+
+    def __init__(self, url, prefix='nextwave:result:', ttl=7 * 24 * 3600, max_entry_bytes=16 * 1024 * 1024):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, payload):
+        if len(payload) > self.max_entry_bytes:
+            return False
+        self.client.set(self.prefix + key, payload, ex=self.ttl)
+        return True
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def size(self):
+        return {'entries': None, 'bytes': None}
+
+
+class ResultCache:
+    """Content-addressed cache for extraction and analysis results.
+
+    Entries are keyed by the sha256 of the input file, the operation name,
+    the producing component's version and the operation parameters, so the
+    same bytes uploaded again resolve to the previous result.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or MemoryCacheBackend()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(content_hash, operation, version, parameters=None):
+        params = json.dumps(parameters or {}, sort_keys=True, separators=(',', ':'))
+        params_hash = hashlib.sha256(params.encode('utf-8')).hexdigest()[:16]
+        return f'{content_hash}:{operation}:{version}:{params_hash}'
+
+    def get(self, key):
+        try:
+            payload = self.backend.get(key)
+        except Exception:
+            payload = None
+        with self.lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(payload)
+
+    def set(self, key, value):
+        try:
+            stored = self.backend.set(key, json.dumps(value).encode('utf-8'))
+        except Exception:
+            stored = False
+        if stored:
+            with self.lock:
+                self.stores += 1
+        return stored
+
+    def get_or_compute(self, key, compute):
+        """Return the cached result for key, computing and storing it on a miss"""
+        result = self.get(key)
+        if result is not None:
+            return result, True
+        result = compute()
+        # Only successful results are worth remembering
+        if result.get('success', True):
+            self.set(key, result)
+        return result, False
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+        try:
+            stats.update(self.backend.size())
+        except Exception:
+            pass
+        return stats
+
+
+def create_result_cache(config):
+    """Build a ResultCache from RESULT_CACHE_* configuration values"""
+    backend_name = config.get('RESULT_CACHE_BACKEND', 'memory')
+    max_bytes = config.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+    if backend_name == 'redis':
+        backend = RedisCacheBackend(config['RESULT_CACHE_REDIS_URL'])
+    elif backend_name == 'disk':
+        backend = DiskCacheBackend(config['RESULT_CACHE_DIR'], max_bytes=max_bytes)
+    else:
+        backend = MemoryCacheBackend(max_bytes=max_bytes)
+    return ResultCache(backend)
@@ -0,0 +1,144 @@
+import json
+import hashlib
+import threading
+from collections import ChainMap, defaultdict
+from .result_cache import MemoryCacheBackend
+
+# Stands for "every key" when a step iterated over its whole context
+ALL_KEYS = '*'
+# Distinguishes a missing key from one holding None in input fingerprints
+MISSING = {'__missing__': True}
+
+
+class TrackingView(ChainMap):
+    """Context view that records which keys a step reads"""
+
+    def __init__(self, *maps):
+        super().__init__(*maps)
+        self.reads = set()
+
+    def __getitem__(self, key):
+        self.reads.add(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        self.reads.add(key)
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        self.reads.add(key)
+        return super().get(key, default)
+
+    def __iter__(self):
+        self.reads.add(ALL_KEYS)
+        return super().__iter__()
+
+    def __len__(self):
+        self.reads.add(ALL_KEYS)
+        return super().__len__()
+
+
+def _digest(value):
+    payload = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def definition_hash(step):
+    """Hash of everything about a step definition that can change its output"""
+    return _digest({'id': step.id, 'type': step.type.value, 'config': dict(step.config)})
+
+
+class StepMemo:
+    """Memoized outputs of steps declared ``deterministic`` in their config.
+
+    A result is keyed by the step definition hash, the executing user and
+    a fingerprint of the context keys the step read when it was computed.
+    Which keys a step reads is learned from its first runs (or given as
+    ``inputs`` in the step config); a deterministic step reading the same
+    values reads the same keys, so a lookup tries each key set seen so far.
+    Outputs are stored as JSON in a byte-bounded LRU.
+    """
+
+    max_key_sets = 8
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.backend = MemoryCacheBackend(max_bytes=max_bytes)
+        self.key_sets = defaultdict(list)
+        self.step_stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'stores': 0})
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def is_memoized(step):
+        return bool(step.config.get('deterministic'))
+
+    @staticmethod
+    def _fingerprint(keys, context_data):
+        # The first map of a view is the step's write layer; only the layers below are inputs.
+        # Reading through a plain ChainMap also keeps fingerprinting from counting as reads.
+        if isinstance(context_data, ChainMap):
+            context_data = ChainMap(*context_data.maps[1:])
+        if ALL_KEYS in keys:
+            return _digest(dict(context_data))
+        return _digest({key: context_data[key] if key in context_data else MISSING for key in keys})
+
+    def _key(self, definition, keys, context_data, user_id):
+        return f'{definition}:{user_id}:{_digest(sorted(keys))}:{self._fingerprint(keys, context_data)}'
+
+    def lookup(self, step, context_data, user_id, stats_key):
+        """Return (output_data, next_step_id) of an earlier run on the same inputs, or None"""
+        definition = definition_hash(step)
+        declared = step.config.get('inputs')
+        with self.lock:
+            key_sets = [tuple(declared)] if declared else list(self.key_sets.get(definition, ()))
+        for keys in key_sets:
+            payload = self.backend.get(self._key(definition, keys, context_data, user_id))
+            if payload is not None:
+                with self.lock:
+                    self.step_stats[stats_key]['hits'] += 1
+                result = json.loads(payload)
+                return result['output_data'], result['next_step_id']
+        with self.lock:
+            self.step_stats[stats_key]['misses'] += 1
+        return None
+
+    def track(self, step, context_data):
+        """View to run a memoized step on so its reads can be recorded"""
+        if step.config.get('inputs') or not isinstance(context_data, ChainMap):
+            return context_data
+        return TrackingView(*context_data.maps)
+
+    def store(self, step, context_data, user_id, stats_key, output_data, next_step_id):
+        definition = definition_hash(step)
+        declared = step.config.get('inputs')
+        if declared:
+            keys = tuple(declared)
+        elif isinstance(context_data, TrackingView):
+            # Keys the step wrote itself are outputs, not inputs
+            reads = context_data.reads - set(context_data.maps[0])
+            keys = (ALL_KEYS,) if ALL_KEYS in reads else tuple(sorted(reads))
+        else:
+            keys = (ALL_KEYS,)
+        try:
+            payload = json.dumps({'output_data': output_data, 'next_step_id': next_step_id}).encode('utf-8')
+        except (TypeError, ValueError):
+            return False
+        with self.lock:
+            key_sets = self.key_sets[definition]
+            if not declared and keys not in key_sets:
+                key_sets.append(keys)
+                del key_sets[:-self.max_key_sets]
+        stored = self.backend.set(self._key(definition, keys, context_data, user_id), payload)
+        if stored:
+            with self.lock:
+                self.step_stats[stats_key]['stores'] += 1
+        return stored
+
+    def stats(self):
+        with self.lock:
+            steps = {}
+            for stats_key, counts in self.step_stats.items():
+                lookups = counts['hits'] + counts['misses']
+                steps[stats_key] = dict(counts, hit_rate=round(counts['hits'] / lookups, 4) if lookups else 0.0)
+        stats = {'steps': steps}
+        stats.update(self.backend.size())
+        return stats
@@ -0,0 +1,146 @@
+import os
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class TaskQueue:
+    """Background execution of ProcessingTask rows.
+
+    Handlers are registered per ``task_type`` and run outside the request
+    thread. With ``CELERY_BROKER_URL`` configured (e.g. ``redis://...`` or
+    ``sqla+sqlite:///celery.db``) tasks are dispatched to Celery workers;
+    otherwise they run on a local thread pool, or inline when
+    ``TASK_QUEUE_EAGER`` is set (useful for tests).
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.app = None
+        self.db = None
+        self.task_model = None
+        self.celery = None
+        self.mode = None
+        self._celery_task = None
+        self._executor = None
+        self.events = None
+
+    def init_app(self, app, db, task_model, events=None):
+        self.app = app
+        self.db = db
+        self.task_model = task_model
+        # Optional EventBus; status changes and progress ticks go to task:<id> subscribers
+        self.events = events
+
+        broker_url = app.config.get('CELERY_BROKER_URL') or os.environ.get('CELERY_BROKER_URL')
+        if broker_url:
+            from celery import Celery
+
+            self.celery = Celery(
+                app.import_name,
+                broker=broker_url,
+                backend=app.config.get('CELERY_RESULT_BACKEND') or os.environ.get('CELERY_RESULT_BACKEND')
+            )
+            self.celery.conf.update(
+                task_acks_late=True,
+                worker_prefetch_multiplier=1,
+                task_ignore_result=True
+            )
+
+            @self.celery.task(name='nextwave.run_processing_task')
+            def run_processing_task(task_id):
+                self.run(task_id)
+
+            self._celery_task = run_processing_task
+            self.mode = 'celery'
+        elif app.config.get('TASK_QUEUE_EAGER'):
+            self.mode = 'eager'
+        else:
+            max_workers = app.config.get('TASK_QUEUE_WORKERS', 2)
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='task-worker')
+            self.mode = 'thread'
+
+        logger.info(f"Task queue initialized in {self.mode} mode")
+
+    def handler(self, task_type):
+        """Register a function as the handler for a task type"""
+        def decorator(func):
+            self.handlers[task_type] = func
+            return func
+        return decorator
+
+    def enqueue(self, task):
+        """Schedule a committed ProcessingTask for background execution"""
+        if task.task_type not in self.handlers:
+            raise ValueError(f"No handler registered for task type: {task.task_type}")
+
+        if self.mode == 'celery':
+            self._celery_task.delay(task.id)
+        elif self.mode == 'eager':
+            self.run(task.id)
+        else:
+            self._executor.submit(self.run, task.id)
+        return task.id
+
+    def _publish(self, task):
+        if self.events is None:
+            return
+        self.events.publish(f'task:{task.id}', 'task', {
+            'id': task.id,
+            'status': task.status,
+            'progress': task.progress,
+            'error_message': task.error_message
+        }, final=task.status in ('completed', 'failed'))
+
+    def run(self, task_id):
+        """Execute a task by id, recording status, progress and timings"""
+        with self.app.app_context():
+            session = self.db.session
+            try:
+                task = session.get(self.task_model, task_id)
+                if task is None:
+                    logger.error(f"Processing task {task_id} not found")
+                    return
+                if task.status in ('completed', 'failed'):
+                    return
+
+                task.status = 'processing'
+                task.progress = 0
+                task.started_at = datetime.utcnow()
+                session.commit()
+                self._publish(task)
+
+                def report_progress(percent):
+                    task.progress = max(0, min(100, int(percent)))
+                    session.commit()
+                    self._publish(task)
+
+                try:
+                    result = self.handlers[task.task_type](task, report_progress) or {}
+                    success = result.get('success', True)
+                    task.set_output_data(result)
+                    task.status = 'completed' if success else 'failed'
+                    if success:
+                        task.progress = 100
+                    else:
+                        task.error_message = result.get('error')
+                except Exception as e:
+                    session.rollback()
+                    logger.error(f"Processing task {task_id} failed: {str(e)}")
+                    task.status = 'failed'
+                    task.error_message = str(e)
+
+                task.completed_at = datetime.utcnow()
+                session.commit()
+                self._publish(task)
+            finally:
+                session.remove()
+
+    def shutdown(self, wait=True):
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+
+
+task_queue = TaskQueue()
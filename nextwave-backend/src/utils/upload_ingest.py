@@ -0,0 +1,162 @@
+import os
+import codecs
+import hashlib
+import tempfile
+from flask import Request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+# Leading-byte signatures used to sniff the real type of an upload
+MAGIC_SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+    (b'BM', 'image/bmp'),
+    (b'II*\x00', 'image/tiff'),
+    (b'MM\x00*', 'image/tiff'),
+    (b'PK\x03\x04', 'application/zip'),  # docx, pptx, vsdx
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage'),  # doc, vsd
+]
+SNIFF_BYTES = 16
+
+
+def sniff_mime_type(head):
+    """Guess a MIME type from the first bytes of a file"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    for signature, mime_type in MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    try:
+        # head is a prefix, so a multibyte character may be cut off at its end
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+        return 'text/plain'
+    except UnicodeDecodeError:
+        return 'application/octet-stream'
+
+
+class UploadRejected(RequestEntityTooLarge):
+    pass
+
+
+class UnsupportedUpload(UnsupportedMediaType):
+    pass
+
+
+class UploadPolicy:
+    """Per-endpoint limits applied while an upload is being received"""
+
+    def __init__(self, max_bytes=None, allowed_types=None):
+        self.max_bytes = max_bytes
+        self.allowed_types = set(allowed_types) if allowed_types else None
+
+
+class IngestFile:
+    """Writable upload sink that spools straight to the upload folder.
+
+    The multipart parser writes each chunk here as it arrives; size and
+    sha256 are accumulated on the fly, the MIME type is sniffed from the
+    first bytes, and policy violations abort the request immediately.
+    """
+
+    def __init__(self, directory, policy):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix='upload-', suffix='.part', dir=directory)
+        self.file = os.fdopen(fd, 'w+b')
+        self.policy = policy
+        self.size = 0
+        self.mime_type = None
+        self.committed = False
+        self._digest = hashlib.sha256()
+        self._head = b''
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def write(self, data):
+        self.size += len(data)
+        if self.policy.max_bytes is not None and self.size > self.policy.max_bytes:
+            self.close()
+            raise UploadRejected(f'File exceeds the {self.policy.max_bytes} byte upload limit')
+
+        if self.mime_type is None:
+            self._head += data[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check_type()
+
+        self._digest.update(data)
+        return self.file.write(data)
+
+    def _check_type(self):
+        self.mime_type = sniff_mime_type(self._head[:SNIFF_BYTES])
+        if self.policy.allowed_types is not None and self.mime_type not in self.policy.allowed_types:
+            self.close()
+            raise UnsupportedUpload(f'File content type {self.mime_type} is not allowed')
+
+    def seek(self, offset, whence=0):
+        # Called by the parser once the part is complete; short files are sniffed here
+        if self.mime_type is None:
+            self._check_type()
+        return self.file.seek(offset, whence)
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def readline(self, *args):
+        return self.file.readline(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def flush(self):
+        return self.file.flush()
+
+    def commit(self, destination):
+        """Move the received file into place without copying it"""
+        self.file.close()
+        os.replace(self.temp_path, destination)
+        self.committed = True
+        return destination
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+        if not self.committed and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class IngestRequest(Request):
+    """Request class whose file uploads are received through IngestFile"""
+
+    upload_policy = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        policy = self.upload_policy or UploadPolicy()
+        directory = os.path.join(current_app.config['UPLOAD_FOLDER'], 'incoming')
+        return IngestFile(directory, policy)
+
+
+def receive_upload(request, field='file', policy=None):
+    """Parse the request body under policy and return the uploaded FileStorage (or None)"""
+    request.upload_policy = policy
+    return request.files.get(field)
+
+
+def save_upload(file, destination):
+    """Store an upload at destination; returns (size, sha256, sniffed MIME type)"""
+    stream = file.stream
+    if isinstance(stream, IngestFile):
+        stream.commit(destination)
+        return stream.size, stream.sha256, stream.mime_type
+
+    # Fallback for streams not created by IngestRequest
+    file.save(destination)
+    digest = hashlib.sha256()
+    with open(destination, 'rb') as f:
+        head = f.read(SNIFF_BYTES)
+        digest.update(head)
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return os.path.getsize(destination), digest.hexdigest(), sniff_mime_type(head)
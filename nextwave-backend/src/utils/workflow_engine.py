@@ -1,12 +1,25 @@
+import copy
 import json
+import logging
+import operator
+import os
+import socket
 import time
 import uuid
 from datetime import datetime
 from enum import Enum
+from types import MappingProxyType
 from typing import Dict, List, Any, Optional
 import asyncio
 import threading
-from queue import Queue
+from collections import ChainMap, OrderedDict, deque
+from queue import Empty, Full
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from .workflow_store import MemoryStateStore
+from .step_memo import StepMemo
+from .execution_trace import ExecutionTrace, trace_from_record
+
+logger = logging.getLogger(__name__)
 
 class StepType(Enum):
     INPUT = "input"
@@ -20,17 +33,74 @@ class StepType(Enum):
 
 class StepStatus(Enum):
     PENDING = "pending"
+    QUEUED = "queued"
     RUNNING = "running"
     COMPLETED = "completed"
     FAILED = "failed"
     SKIPPED = "skipped"
 
 class WorkflowStep:
-    def __init__(self, step_id: str, name: str, step_type: StepType, config: Dict[str, Any] = None):
-        self.id = step_id
-        self.name = name
-        self.type = step_type
-        self.config = config or {}
+    """Immutable step definition shared by every execution of a workflow.
+    
+    Run-time status and data live in a per-execution StepState; use
+    ``replace()`` to derive a modified definition. ``config`` is a read-only
+    view of a private deep copy, so neither the caller's dict nor the step
+    can be changed afterwards.
+    """
+    __slots__ = ('id', 'name', 'type', 'config', 'next_steps', 'previous_steps')
+    
+    def __init__(self, step_id: str, name: str, step_type: StepType, config: Dict[str, Any] = None,
+                 next_steps: tuple = (), previous_steps: tuple = ()):
+        object.__setattr__(self, 'id', step_id)
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'type', step_type)
+        object.__setattr__(self, 'config', MappingProxyType(copy.deepcopy(dict(config)) if config else {}))
+        object.__setattr__(self, 'next_steps', tuple(next_steps))
+        object.__setattr__(self, 'previous_steps', tuple(previous_steps))
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"WorkflowStep is immutable; use replace() to change '{name}'")
+    
+    def replace(self, **changes) -> 'WorkflowStep':
+        fields = {
+            'step_id': self.id,
+            'name': self.name,
+            'step_type': self.type,
+            'config': self.config,
+            'next_steps': self.next_steps,
+            'previous_steps': self.previous_steps
+        }
+        fields.update(changes)
+        return WorkflowStep(**fields)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'type': self.type.value,
+            'config': dict(self.config),
+            'next_steps': list(self.next_steps),
+            'previous_steps': list(self.previous_steps)
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'WorkflowStep':
+        return cls(
+            data['id'],
+            data['name'],
+            StepType(data['type']),
+            data.get('config'),
+            data.get('next_steps', ()),
+            data.get('previous_steps', ())
+        )
+
+class StepState:
+    """Status and data of one step within one execution"""
+    __slots__ = ('step', 'status', 'input_data', 'output_data', 'error_message', 'start_time', 'end_time', 'duration',
+                 'version', 'cached', 'next_step_id')
+    
+    def __init__(self, step: WorkflowStep):
+        self.step = step
         self.status = StepStatus.PENDING
         self.input_data = None
         self.output_data = None
@@ -38,54 +108,274 @@ class WorkflowStep:
         self.start_time = None
         self.end_time = None
         self.duration = None
-        self.next_steps = []
-        self.previous_steps = []
+        # Execution version at which this state was last persisted
+        self.version = 0
+        # Output reused from an earlier run of a deterministic step
+        self.cached = False
+        # Branch chosen by a completed condition step; None means every outgoing edge
+        self.next_step_id = None
+    
+    @property
+    def id(self):
+        return self.step.id
+    
+    @property
+    def name(self):
+        return self.step.name
+    
+    @property
+    def type(self):
+        return self.step.type
+    
+    @property
+    def config(self):
+        return self.step.config
     
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'type': self.type.value,
+        data = self.step.to_dict()
+        data.update({
             'status': self.status.value,
-            'config': self.config,
-            'input_data': self.input_data,
+            'input_data': dict(self.input_data) if self.input_data is not None else None,
             'output_data': self.output_data,
             'error_message': self.error_message,
-            'start_time': self.start_time.isoformat() if self.start_time else None,
-            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'start_time': datetime.fromtimestamp(self.start_time).isoformat() if self.start_time else None,
+            'end_time': datetime.fromtimestamp(self.end_time).isoformat() if self.end_time else None,
             'duration': self.duration,
-            'next_steps': self.next_steps,
-            'previous_steps': self.previous_steps
-        }
+            'cached': self.cached,
+            'next_step_id': self.next_step_id
+        })
+        return data
+    
+    def to_record(self):
+        """Serializable form for the state store; the input snapshot is not persisted"""
+        record = self.to_dict()
+        del record['input_data']
+        record['version'] = self.version
+        return record
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> 'StepState':
+        state = cls(WorkflowStep.from_dict(record))
+        state.status = StepStatus(record['status'])
+        state.output_data = record.get('output_data')
+        state.error_message = record.get('error_message')
+        state.start_time = datetime.fromisoformat(record['start_time']).timestamp() if record.get('start_time') else None
+        state.end_time = datetime.fromisoformat(record['end_time']).timestamp() if record.get('end_time') else None
+        state.duration = record.get('duration')
+        state.version = record.get('version', 0)
+        state.cached = record.get('cached', False)
+        state.next_step_id = record.get('next_step_id')
+        return state
+
+class ExecutionContext:
+    """Copy-on-write execution context built from per-step layers.
+    
+    The execution input is the base layer and every completed step pushes
+    its output on top. Steps get a ChainMap view over the current layers,
+    so handing out a snapshot costs O(layers) instead of O(keys). Layers are
+    never modified once pushed; long chains are flattened periodically to
+    keep lookups short.
+    """
+    compact_after = 32
+    
+    def __init__(self, base: Dict[str, Any] = None):
+        self.layers = [base if base is not None else {}]
+    
+    def push(self, delta: Dict[str, Any]):
+        if not delta:
+            return
+        self.layers.append(delta)
+        if len(self.layers) > self.compact_after:
+            self.layers = [self.flatten()]
+    
+    def view(self, *extra_layers):
+        """Read view over the current layers with extra_layers (later wins) on top and an empty write layer"""
+        return ChainMap({}, *reversed(extra_layers), *reversed(self.layers))
+    
+    def flatten(self) -> Dict[str, Any]:
+        return dict(ChainMap(*reversed(self.layers)))
 
 class WorkflowExecution:
-    def __init__(self, workflow_id: str, execution_id: str = None):
+    # Only the most recent log lines are kept in memory; the store has the full history
+    max_log_entries = 1000
+    
+    def __init__(self, workflow_id: str, execution_id: str = None, user_id: str = None, max_log_entries: int = None):
         self.workflow_id = workflow_id
         self.execution_id = execution_id or str(uuid.uuid4())
+        self.user_id = user_id
         self.status = StepStatus.PENDING
         self.start_time = None
         self.end_time = None
         self.duration = None
+        self.plan = None
+        self.animation_delay = 0
+        self.step_states = {}
         self.steps_executed = []
         self.current_step = None
         self.error_message = None
         self.input_data = {}
         self.output_data = {}
-        self.execution_log = []
+        self.execution_log = deque(maxlen=max_log_entries or self.max_log_entries)
+        # Log lines are numbered so the unsaved tail is known even after the ring buffer wraps
+        self.log_count = 0
+        self.logs_persisted = 0
+        self.dirty_steps = set()
+        # Bumped on every store update; step states carry the version they last changed in
+        self.version = 0
+        # Engine instance running this execution; it refreshes the heartbeat while the run is alive
+        self.owner = None
+        self.last_persist = 0
+        self.pending_fields = set()
+        # ExecutionTrace of the part of the run handled by this process (None when tracing is off)
+        self.trace = None
     
-    def log(self, message: str, level: str = "info"):
+    def log(self, message: str, level: str = "info", step_id: str = None):
+        if step_id is None and self.current_step:
+            step_id = self.current_step.id
         log_entry = {
-            'timestamp': datetime.now().isoformat(),
+            'seq': self.log_count,
+            'timestamp': time.time(),
             'level': level,
             'message': message,
-            'step_id': self.current_step.id if self.current_step else None
+            'step_id': step_id
         }
         self.execution_log.append(log_entry)
+        self.log_count += 1
+    
+    def unpersisted_logs(self) -> List[Dict[str, Any]]:
+        """Log lines added since the last store update that are still in the buffer"""
+        return [entry for entry in list(self.execution_log) if entry['seq'] >= self.logs_persisted]
+    
+    def has_unsaved_changes(self) -> bool:
+        return bool(self.pending_fields or self.dirty_steps) or self.log_count > self.logs_persisted
+    
+    @property
+    def finished_at(self) -> Optional[float]:
+        if self.status in (StepStatus.COMPLETED, StepStatus.FAILED) and self.end_time:
+            return self.end_time.timestamp()
+        return None
+    
+    def compact(self):
+        """Reduce a finished execution to the form kept in the store.
+        
+        Step input views pin every context layer of the run, so they are
+        dropped along with the plan, as StepState.to_record does.
+        """
+        self.plan = None
+        self.dirty_steps = set()
+        for state in self.step_states.values():
+            state.input_data = None
+    
+    def state_for(self, step: WorkflowStep) -> StepState:
+        state = self.step_states.get(step.id)
+        if state is None:
+            state = self.step_states[step.id] = StepState(step)
+        self.dirty_steps.add(step.id)
+        return state
+    
+    def record_fields(self, *fields) -> Dict[str, Any]:
+        """Serializable values of the named top-level fields for a partial store update"""
+        getters = {
+            'status': lambda: self.status.value,
+            'current_step_id': lambda: self.current_step.id if self.current_step else None,
+            'error_message': lambda: self.error_message,
+            'start_time': lambda: self.start_time.isoformat() if self.start_time else None,
+            'end_time': lambda: self.end_time.isoformat() if self.end_time else None,
+            'duration': lambda: self.duration,
+            'input_data': lambda: self.input_data,
+            'output_data': lambda: self.output_data,
+            'steps_executed': lambda: [state.id for state in self.steps_executed],
+            'version': lambda: self.version,
+            'log_count': lambda: self.log_count,
+            'owner': lambda: self.owner,
+            'heartbeat': time.time
+        }
+        return {field: getters[field]() for field in fields}
+    
+    def to_record(self) -> Dict[str, Any]:
+        record = self.record_fields(
+            'status', 'current_step_id', 'error_message', 'start_time', 'end_time',
+            'duration', 'input_data', 'output_data', 'steps_executed', 'version', 'log_count', 'owner', 'heartbeat'
+        )
+        record.update({
+            'execution_id': self.execution_id,
+            'workflow_id': self.workflow_id,
+            'user_id': self.user_id,
+            'steps': {step_id: state.to_record() for step_id, state in self.step_states.items()}
+        })
+        return record
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], max_log_entries: int = None) -> 'WorkflowExecution':
+        execution = cls(record['workflow_id'], record['execution_id'], record.get('user_id'), max_log_entries)
+        execution.status = StepStatus(record['status'])
+        execution.start_time = datetime.fromisoformat(record['start_time']) if record.get('start_time') else None
+        execution.end_time = datetime.fromisoformat(record['end_time']) if record.get('end_time') else None
+        execution.duration = record.get('duration')
+        execution.error_message = record.get('error_message')
+        execution.input_data = record.get('input_data') or {}
+        execution.output_data = record.get('output_data') or {}
+        execution.step_states = {
+            step_id: StepState.from_record(state) for step_id, state in (record.get('steps') or {}).items()
+        }
+        execution.steps_executed = [
+            execution.step_states[step_id] for step_id in record.get('steps_executed') or [] if step_id in execution.step_states
+        ]
+        execution.current_step = execution.step_states.get(record.get('current_step_id'))
+        execution.execution_log.extend(record.get('execution_log') or [])
+        if execution.execution_log:
+            execution.log_count = execution.execution_log[-1].get('seq', len(execution.execution_log) - 1) + 1
+        # The record may carry only the tail of the log; its count covers every line
+        execution.log_count = max(execution.log_count, record.get('log_count') or 0)
+        execution.logs_persisted = execution.log_count
+        execution.version = record.get('version') or 0
+        execution.owner = record.get('owner')
+        return execution
+    
+    def changes(self, since_version: int = 0, log_cursor: int = 0) -> Dict[str, Any]:
+        """What a poller that has seen since_version and the log lines before log_cursor is missing.
+        
+        Step states are reported without their input snapshots; output_data
+        is only included once the execution has finished.
+        """
+        # Read the counters first so anything changing meanwhile is reported again next time
+        changes = self.summary()
+        version, log_count = changes['version'], changes['log_cursor']
+        entries = list(self.execution_log)
+        oldest = entries[0]['seq'] if entries else log_count
+        changes.update({
+            'steps': [state.to_record() for state in list(self.step_states.values()) if state.version > since_version],
+            'log': [entry for entry in entries if log_cursor <= entry['seq'] < log_count],
+            # Lines between log_cursor and the oldest buffered line were dropped from memory
+            'log_truncated': log_cursor < oldest and log_cursor < log_count
+        })
+        if since_version >= version:
+            changes['output_data'] = None
+        return changes
+    
+    def summary(self) -> Dict[str, Any]:
+        """Execution-level status without step states or log lines"""
+        finished = self.finished_at is not None
+        return {
+            'execution_id': self.execution_id,
+            'workflow_id': self.workflow_id,
+            'status': self.status.value,
+            'version': self.version,
+            'log_cursor': self.log_count,
+            'current_step_id': self.current_step.id if self.current_step else None,
+            'error_message': self.error_message,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'duration': self.duration,
+            'steps_executed': [state.id for state in list(self.steps_executed)],
+            'output_data': self.output_data if finished else None
+        }
     
     def to_dict(self):
         return {
             'workflow_id': self.workflow_id,
             'execution_id': self.execution_id,
+            'user_id': self.user_id,
             'status': self.status.value,
             'start_time': self.start_time.isoformat() if self.start_time else None,
             'end_time': self.end_time.isoformat() if self.end_time else None,
@@ -95,7 +385,7 @@ class WorkflowExecution:
             'error_message': self.error_message,
             'input_data': self.input_data,
             'output_data': self.output_data,
-            'execution_log': self.execution_log
+            'execution_log': list(self.execution_log)
         }
 
 class Workflow:
@@ -108,23 +398,35 @@ class Workflow:
         self.created_at = datetime.now()
         self.updated_at = datetime.now()
         self.version = "1.0.0"
+        self.revision = 0
         self.is_active = True
         self.execution_count = 0
     
+    def _touch(self):
+        self.updated_at = datetime.now()
+        self.revision += 1
+    
+    @property
+    def plan_key(self):
+        """Identifies this definition for the compiled plan cache"""
+        return (self.updated_at, self.version, self.revision)
+    
     def add_step(self, step: WorkflowStep):
         self.steps[step.id] = step
-        self.updated_at = datetime.now()
+        self._touch()
     
     def connect_steps(self, from_step_id: str, to_step_id: str):
         if from_step_id in self.steps and to_step_id in self.steps:
-            self.steps[from_step_id].next_steps.append(to_step_id)
-            self.steps[to_step_id].previous_steps.append(from_step_id)
-            self.updated_at = datetime.now()
+            from_step = self.steps[from_step_id]
+            self.steps[from_step_id] = from_step.replace(next_steps=from_step.next_steps + (to_step_id,))
+            to_step = self.steps[to_step_id]
+            self.steps[to_step_id] = to_step.replace(previous_steps=to_step.previous_steps + (from_step_id,))
+            self._touch()
     
     def set_start_step(self, step_id: str):
         if step_id in self.steps:
             self.start_step_id = step_id
-            self.updated_at = datetime.now()
+            self._touch()
     
     def to_dict(self):
         return {
@@ -136,14 +438,380 @@ class Workflow:
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'version': self.version,
+            'revision': self.revision,
             'is_active': self.is_active,
             'execution_count': self.execution_count
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Workflow':
+        workflow = cls(data['id'], data['name'], data.get('description', ''))
+        workflow.steps = {step_id: WorkflowStep.from_dict(step) for step_id, step in data.get('steps', {}).items()}
+        workflow.start_step_id = data.get('start_step_id')
+        workflow.created_at = datetime.fromisoformat(data['created_at'])
+        workflow.updated_at = datetime.fromisoformat(data['updated_at'])
+        workflow.version = data.get('version', workflow.version)
+        workflow.revision = data.get('revision', 0)
+        workflow.is_active = data.get('is_active', True)
+        workflow.execution_count = data.get('execution_count', 0)
+        return workflow
+
+CONDITION_OPERATORS = {
+    'equals': operator.eq,
+    'not_equals': operator.ne,
+    'greater_than': operator.gt,
+    'less_than': operator.lt
+}
+
+def _compile_condition(condition: Dict[str, Any]):
+    """Turn a condition dict into predicate(field_value) -> bool"""
+    compare = CONDITION_OPERATORS.get(condition.get('operator', 'equals'))
+    value = condition.get('value')
+    if compare is None:
+        return lambda field_value: False
+    return lambda field_value: compare(field_value, value)
+
+def _compile_rule(rule: Dict[str, Any]):
+    """Turn a validation rule into check(context_data) -> result dict"""
+    field = rule.get('field')
+    condition = rule.get('condition')
+    value = rule.get('value')
+    
+    if condition == 'equals':
+        test = lambda field_value: field_value == value
+    elif condition == 'not_empty':
+        test = bool
+    else:
+        test = lambda field_value: False
+    
+    def check(context_data):
+        if field not in context_data:
+            return {'rule': rule, 'passed': False, 'error': 'Field not found'}
+        return {'rule': rule, 'passed': test(context_data[field])}
+    return check
+
+def _compile_transform(transform: Dict[str, Any]):
+    """Turn a transformation dict into apply(data), or None when it can never change anything"""
+    operation = transform.get('operation')
+    source_field = transform.get('source_field')
+    target_field = transform.get('target_field')
+    
+    if operation == 'uppercase':
+        convert = lambda value: str(value).upper()
+    elif operation == 'lowercase':
+        convert = lambda value: str(value).lower()
+    elif operation == 'multiply':
+        factor = transform.get('factor', 1)
+        convert = lambda value: value * factor
+    elif operation == 'format_date':
+        # Simplified date formatting
+        convert = lambda value: datetime.now().strftime('%Y-%m-%d')
+    else:
+        return None
+    
+    def apply(data):
+        if source_field in data:
+            data[target_field] = convert(data[source_field])
+    return apply
+
+def _reduce_values(values, operation):
+    if operation == 'count':
+        return len(values)
+    values = [value for value in values if value is not None]
+    if operation == 'sum':
+        return sum(values)
+    if operation == 'mean':
+        return sum(values) / len(values) if values else None
+    if operation == 'min':
+        return min(values) if values else None
+    if operation == 'max':
+        return max(values) if values else None
+    if operation == 'concat':
+        combined = []
+        for value in values:
+            combined.extend(value if isinstance(value, (list, tuple)) else [value])
+        return combined
+    if operation == 'merge':
+        merged = {}
+        for value in values:
+            merged.update(value)
+        return merged
+    raise ValueError(f"Unknown reduce operation: {operation}")
+
+def _compile_reducer(spec: Dict[str, Any]):
+    """Turn a reduce spec into reduce(results) -> (target_key, value)"""
+    operation = spec.get('operation', 'count')
+    field = spec.get('field')
+    target = spec.get('target', f"{operation}_{field}" if field else operation)
+    
+    def reduce(results):
+        if field:
+            values = [result.get(field) if isinstance(result, dict) else None for result in results]
+        else:
+            values = list(results)
+        return target, _reduce_values(values, operation)
+    return reduce
+
+class CompiledStep:
+    """A step definition with its rule dicts resolved into closures"""
+    __slots__ = ('step', 'index', 'condition', 'rules', 'transforms', 'transform_count', 'body', 'reducers')
+    
+    def __init__(self, step: WorkflowStep, index: int):
+        self.step = step
+        self.index = index
+        self.condition = None
+        self.rules = ()
+        self.transforms = ()
+        self.transform_count = 0
+        self.body = ()
+        self.reducers = ()
+        
+        if step.type == StepType.CONDITION:
+            self.condition = _compile_condition(step.config.get('condition', {}))
+        elif step.type == StepType.VALIDATION:
+            self.rules = tuple(_compile_rule(rule) for rule in step.config.get('rules', []))
+        elif step.type == StepType.TRANSFORM:
+            transformations = step.config.get('transformations', [])
+            self.transform_count = len(transformations)
+            self.transforms = tuple(
+                apply for apply in (_compile_transform(transform) for transform in transformations) if apply
+            )
+        elif step.type == StepType.LOOP:
+            # Body steps are namespaced under the loop so plan lookups stay unique
+            self.body = tuple(
+                CompiledStep(WorkflowStep(
+                    f"{step.id}.{body_step['id']}",
+                    body_step.get('name', body_step['id']),
+                    StepType(body_step['type']),
+                    body_step.get('config')
+                ), -1)
+                for body_step in step.config.get('body', [])
+            )
+            reduce_specs = step.config.get('reduce') or []
+            if isinstance(reduce_specs, dict):
+                reduce_specs = [reduce_specs]
+            self.reducers = tuple(_compile_reducer(spec) for spec in reduce_specs)
+    
+    def walk(self):
+        """This step followed by any loop body steps, recursively"""
+        yield self
+        for body_step in self.body:
+            yield from body_step.walk()
+
+class ExecutionPlan:
+    """Immutable, precompiled form of a workflow: reachable steps in topological order plus their edges"""
+    __slots__ = ('workflow_id', 'key', 'start_step_id', 'order', 'steps', 'successors', 'predecessors')
+    
+    def __init__(self, workflow: Workflow):
+        if not workflow.start_step_id:
+            raise ValueError(f"Workflow {workflow.id} has no start step defined")
+        
+        self.workflow_id = workflow.id
+        self.key = workflow.plan_key
+        self.start_step_id = workflow.start_step_id
+        
+        successors = self._reachable_edges(workflow)
+        predecessors = {step_id: [] for step_id in successors}
+        for step_id, targets in successors.items():
+            for target in targets:
+                predecessors[target].append(step_id)
+        
+        # Kahn's algorithm; anything left over sits on a cycle
+        in_degree = {step_id: len(preds) for step_id, preds in predecessors.items()}
+        frontier = deque(step_id for step_id, degree in in_degree.items() if degree == 0)
+        order = []
+        while frontier:
+            step_id = frontier.popleft()
+            order.append(step_id)
+            for target in successors[step_id]:
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    frontier.append(target)
+        if len(order) != len(successors):
+            raise ValueError(f"Workflow {workflow.id} contains a cycle")
+        
+        self.order = tuple(order)
+        self.steps = {}
+        for index, step_id in enumerate(order):
+            for compiled in CompiledStep(workflow.steps[step_id], index).walk():
+                self.steps[compiled.step.id] = compiled
+        self.successors = {step_id: tuple(targets) for step_id, targets in successors.items()}
+        self.predecessors = {step_id: tuple(preds) for step_id, preds in predecessors.items()}
+    
+    @staticmethod
+    def _reachable_edges(workflow: Workflow):
+        """Successor lists for the steps reachable from the start step.
+        
+        Condition targets (``true_step``/``false_step``) count as edges even when
+        they were not connected explicitly.
+        """
+        successors = {}
+        pending = [workflow.start_step_id]
+        while pending:
+            step_id = pending.pop()
+            if step_id in successors:
+                continue
+            step = workflow.steps.get(step_id)
+            if not step:
+                raise ValueError(f"Step {step_id} not found")
+            
+            targets = list(step.next_steps)
+            if step.type == StepType.CONDITION:
+                for key in ('true_step', 'false_step'):
+                    target = step.config.get(key)
+                    if target and target not in targets:
+                        targets.append(target)
+            successors[step_id] = targets
+            pending.extend(targets)
+        return successors
+
+class ExecutionRejected(Exception):
+    """Raised when the execution queue is at its depth limit"""
+    pass
+
+class FairShareQueue:
+    """Execution queue that round-robins between owners so one user's burst cannot starve the others"""
+    
+    def __init__(self, max_depth: int = None):
+        self.max_depth = max_depth
+        self.queues = OrderedDict()
+        self.size = 0
+        self.condition = threading.Condition()
+    
+    def put(self, owner, item):
+        with self.condition:
+            if self.max_depth is not None and self.size >= self.max_depth:
+                raise Full()
+            self.queues.setdefault(owner, deque()).append(item)
+            self.size += 1
+            self.condition.notify()
+    
+    def get(self, timeout: float = None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.size > 0, timeout):
+                raise Empty()
+            # Take from the owner at the front, then move that owner to the back
+            owner, items = self.queues.popitem(last=False)
+            item = items.popleft()
+            if items:
+                self.queues[owner] = items
+            self.size -= 1
+            return item
+    
+    def qsize(self) -> int:
+        return self.size
+    
+    def depth_by_owner(self) -> Dict[Any, int]:
+        with self.condition:
+            return {str(owner): len(items) for owner, items in self.queues.items()}
+
+class ExecutionCache:
+    """Bounded LRU of the executions this process holds in memory.
+    
+    Queued and running executions are pinned. Finished ones are compacted
+    and evicted once more than max_entries are held or ttl seconds after
+    they end; their state stays readable from the store.
+    """
+    # Expired entries are looked for at most this often; over-capacity eviction is immediate
+    sweep_interval = 60
+    
+    def __init__(self, max_entries: int = 500, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.last_sweep = time.time()
+        self.lock = threading.Lock()
+    
+    def get(self, execution_id: str) -> Optional[WorkflowExecution]:
+        with self.lock:
+            execution = self.entries.get(execution_id)
+            if execution is not None:
+                self.entries.move_to_end(execution_id)
+            return execution
+    
+    def put(self, execution: WorkflowExecution):
+        with self.lock:
+            self.entries[execution.execution_id] = execution
+            self.entries.move_to_end(execution.execution_id)
+            self._evict()
+    
+    def pop(self, execution_id: str) -> Optional[WorkflowExecution]:
+        with self.lock:
+            return self.entries.pop(execution_id, None)
+    
+    def finish(self, execution: WorkflowExecution):
+        """Compact a finished execution and apply the limits"""
+        execution.compact()
+        with self.lock:
+            self._evict()
+    
+    def _evict(self):
+        now = time.time()
+        excess = len(self.entries) - self.max_entries
+        # Scanning on every put made submitting a burst of executions quadratic
+        sweep = now - self.last_sweep >= min(self.sweep_interval, self.ttl)
+        if excess <= 0 and not sweep:
+            return
+        if sweep:
+            self.last_sweep = now
+        # Least recently used first; running executions are never evicted
+        for execution_id, execution in list(self.entries.items()):
+            if excess <= 0 and not sweep:
+                break
+            finished_at = execution.finished_at
+            if finished_at is None:
+                continue
+            if excess > 0 or now - finished_at > self.ttl:
+                del self.entries[execution_id]
+                self.evictions += 1
+                excess -= 1
+    
+    def active(self) -> List[WorkflowExecution]:
+        """Executions that are still queued or running"""
+        with self.lock:
+            return [execution for execution in self.entries.values() if execution.finished_at is None]
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cached': len(self.entries),
+            'max_cached': self.max_entries,
+            'ttl': self.ttl,
+            'evictions': self.evictions
+        }
 
 class WorkflowEngine:
-    def __init__(self):
+    def __init__(self, step_workers: int = 4, execution_workers: int = 4, max_queued_executions: int = 100,
+                 loop_workers: int = None, store=None, max_cached_executions: int = 500,
+                 execution_cache_ttl: float = 3600, history_retention: float = None, max_log_entries: int = 1000,
+                 events=None, step_cache_bytes: int = 32 * 1024 * 1024, checkpoint_interval: float = 0.2,
+                 lease_timeout: float = 60, trace_max_spans: int = 5000):
+        # Definitions and execution state live in the store so every worker sees them;
+        # workflows caches definitions and executions holds the runs of this process
+        self.store = store or MemoryStateStore()
         self.workflows = {}
-        self.executions = {}
+        self.workflow_revisions = {}
+        self.executions = ExecutionCache(max_cached_executions, execution_cache_ttl)
+        self.max_log_entries = max_log_entries
+        # Finished executions older than this many seconds are purged from the store (None keeps them)
+        self.history_retention = history_retention
+        self.history_prune_interval = 300
+        self.last_history_prune = 0
+        # Optional EventBus; every store update is also published to execution:<id> subscribers
+        self.events = events
+        # Outputs of steps configured as deterministic, reused when their inputs repeat
+        self.step_memo = StepMemo(step_cache_bytes) if step_cache_bytes else None
+        # Progress is checkpointed at most every checkpoint_interval seconds (start and end always).
+        # Runs whose heartbeat is older than lease_timeout are resumed by recover_executions.
+        self.checkpoint_interval = checkpoint_interval
+        self.lease_timeout = lease_timeout
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.maintenance_wakeup = threading.Event()
+        # Spans recorded per execution for timeline export; 0 turns tracing off
+        self.trace_max_spans = trace_max_spans
         self.step_processors = {
             StepType.INPUT: self._process_input_step,
             StepType.PROCESSING: self._process_processing_step,
@@ -151,99 +819,454 @@ class WorkflowEngine:
             StepType.OUTPUT: self._process_output_step,
             StepType.CONDITION: self._process_condition_step,
             StepType.TRANSFORM: self._process_transform_step,
-            StepType.API_CALL: self._process_api_call_step
+            StepType.API_CALL: self._process_api_call_step,
+            StepType.LOOP: self._process_loop_step
         }
-        self.execution_queue = Queue()
+        # PROCESSING steps dispatch on config['operation']; see register_operation
+        self.operation_handlers = {}
+        # Executions wait here for one of a fixed number of worker threads
+        self.execution_queue = FairShareQueue(max_depth=max_queued_executions)
+        self.execution_workers = execution_workers
+        self.active_executions = 0
+        self.worker_threads = []
         self.is_running = False
+        self.lock = threading.Lock()
+        # Compiled plans keyed by workflow id; replaced when the definition changes
+        self.plans = {}
+        self.plan_cache_hits = 0
+        self.plan_cache_misses = 0
+        # Independent branches of a workflow run concurrently on this pool
+        self.step_executor = ThreadPoolExecutor(max_workers=step_workers, thread_name_prefix='workflow-step')
+        # LOOP items get their own pool so a loop waiting on its items never starves the step pool
+        self.loop_executor = ThreadPoolExecutor(max_workers=loop_workers or step_workers, thread_name_prefix='workflow-loop')
+        self._loop_local = threading.local()
+    
+    def register_step_handler(self, step_type: StepType, handler):
+        """Replace the handler for a step type; handler(step, context_data, execution) -> (success, output, next_step_id)"""
+        self.step_processors[step_type] = handler
     
-    def create_workflow(self, name: str, description: str = "") -> Workflow:
-        workflow_id = str(uuid.uuid4())
-        workflow = Workflow(workflow_id, name, description)
-        self.workflows[workflow_id] = workflow
+    def register_operation(self, operation: str, handler):
+        """Register a PROCESSING operation; handler(step, context_data, execution) -> output dict, raising on failure"""
+        self.operation_handlers[operation] = handler
+    
+    def create_workflow(self, name: str, description: str = "", user_id: str = None, workflow_id: str = None) -> Workflow:
+        workflow = Workflow(workflow_id or str(uuid.uuid4()), name, description)
+        self.save_workflow(workflow, user_id)
         return workflow
     
+    def save_workflow(self, workflow: Workflow, user_id: str = None):
+        """Publish a workflow definition (after edits) to the shared store"""
+        self.store.save_workflow(workflow.to_dict(), user_id)
+        self.workflows[workflow.id] = workflow
+        self.workflow_revisions[workflow.id] = self.store.workflow_revision(workflow.id)
+    
     def get_workflow(self, workflow_id: str) -> Optional[Workflow]:
-        return self.workflows.get(workflow_id)
+        """Current definition from the store; the local copy is reused while its revision is unchanged"""
+        # Other workers may have edited or deleted the workflow, so the revision is checked on every lookup
+        revision = self.store.workflow_revision(workflow_id)
+        if revision is None:
+            self._forget_workflow(workflow_id)
+            return None
+        workflow = self.workflows.get(workflow_id)
+        if workflow is not None and self.workflow_revisions.get(workflow_id) == revision:
+            return workflow
+        definition = self.store.load_workflow(workflow_id)
+        if not definition:
+            self._forget_workflow(workflow_id)
+            return None
+        workflow = self.workflows[workflow_id] = Workflow.from_dict(definition)
+        self.workflow_revisions[workflow_id] = revision
+        return workflow
+    
+    def _forget_workflow(self, workflow_id: str) -> bool:
+        self.workflow_revisions.pop(workflow_id, None)
+        self.plans.pop(workflow_id, None)
+        return self.workflows.pop(workflow_id, None) is not None
     
     def delete_workflow(self, workflow_id: str) -> bool:
-        if workflow_id in self.workflows:
-            del self.workflows[workflow_id]
-            return True
-        return False
+        deleted = self.store.delete_workflow(workflow_id)
+        if self._forget_workflow(workflow_id):
+            deleted = True
+        return deleted
+    
+    def get_plan(self, workflow: Workflow) -> ExecutionPlan:
+        """Return the compiled plan for the workflow's current definition, compiling on first use"""
+        key = workflow.plan_key
+        with self.lock:
+            plan = self.plans.get(workflow.id)
+            if plan is not None and plan.key == key:
+                self.plan_cache_hits += 1
+                return plan
+            self.plan_cache_misses += 1
+        
+        plan = ExecutionPlan(workflow)
+        with self.lock:
+            self.plans[workflow.id] = plan
+        return plan
     
     def list_workflows(self) -> List[Dict[str, Any]]:
-        return [workflow.to_dict() for workflow in self.workflows.values()]
+        return self.store.list_workflows()
     
-    def execute_workflow(self, workflow_id: str, input_data: Dict[str, Any] = None) -> WorkflowExecution:
+    def execute_workflow(self, workflow_id: str, input_data: Dict[str, Any] = None, user_id: str = None,
+                         animation_delay: float = 0) -> WorkflowExecution:
         workflow = self.get_workflow(workflow_id)
         if not workflow:
             raise ValueError(f"Workflow {workflow_id} not found")
         
-        if not workflow.start_step_id:
-            raise ValueError(f"Workflow {workflow_id} has no start step defined")
+        plan = self.get_plan(workflow)
+        self._start_workers()
         
-        execution = WorkflowExecution(workflow_id)
+        execution = WorkflowExecution(workflow_id, user_id=user_id, max_log_entries=self.max_log_entries)
+        execution.owner = self.worker_id
+        execution.plan = plan
+        execution.animation_delay = animation_delay
         execution.input_data = input_data or {}
-        self.executions[execution.execution_id] = execution
+        execution.status = StepStatus.QUEUED
+        execution.trace = self._new_trace()
         
-        # Start execution in a separate thread
-        execution_thread = threading.Thread(
-            target=self._execute_workflow_sync,
-            args=(workflow, execution)
-        )
-        execution_thread.start()
+        # Record the run before a worker can start updating it
+        save_start = ExecutionTrace.now()
+        self.store.save_execution(execution.to_record())
+        if execution.trace is not None:
+            execution.trace.add('save execution', 'persist', save_start)
+        self.executions.put(execution)
+        try:
+            self.execution_queue.put(user_id, (workflow, execution))
+        except Full:
+            self.executions.pop(execution.execution_id)
+            self.store.delete_execution(execution.execution_id)
+            raise ExecutionRejected(
+                f"Execution queue is full ({self.execution_queue.max_depth} waiting); retry later"
+            )
         
-        workflow.execution_count += 1
+        with self.lock:
+            workflow.execution_count += 1
         return execution
     
+    def _start_workers(self):
+        with self.lock:
+            if self.is_running:
+                return
+            self.is_running = True
+            for index in range(self.execution_workers):
+                worker = threading.Thread(
+                    target=self._execution_worker,
+                    name=f'workflow-execution-{index}',
+                    daemon=True
+                )
+                worker.start()
+                self.worker_threads.append(worker)
+            threading.Thread(target=self._maintenance_loop, name='workflow-maintenance', daemon=True).start()
+    
+    def start(self, recover: bool = True) -> int:
+        """Start the execution workers and, with recover, resume runs interrupted by a crash or restart"""
+        self._start_workers()
+        return self.recover_executions() if recover else 0
+    
+    def _maintenance_loop(self):
+        last_recovery = time.monotonic()
+        while True:
+            self.maintenance_wakeup.wait(self.lease_timeout / 4)
+            if not self.is_running:
+                break
+            try:
+                active = [execution.execution_id for execution in self.executions.active() if execution.owner == self.worker_id]
+                if active:
+                    self.store.touch_executions(active, self.worker_id, time.time())
+                # Also pick up runs of workers that died while this one kept running
+                if time.monotonic() - last_recovery >= self.lease_timeout:
+                    last_recovery = time.monotonic()
+                    self.recover_executions()
+            except Exception as e:
+                logger.error(f"Workflow maintenance failed: {str(e)}")
+    
+    def recover_executions(self) -> int:
+        """Queue interrupted executions again; completed steps are not repeated"""
+        stale_before = time.time() - self.lease_timeout
+        recovered = 0
+        for execution_id in self.store.list_interrupted(stale_before):
+            if self.executions.get(execution_id) is not None:
+                continue
+            # Several workers may start at once; only the one that claims the run resumes it
+            if not self.store.claim_execution(execution_id, self.worker_id, stale_before, self.lease_timeout):
+                continue
+            record = self.store.load_execution(execution_id)
+            if record is None:
+                continue
+            execution = WorkflowExecution.from_record(record, self.max_log_entries)
+            execution.owner = self.worker_id
+            workflow = self.get_workflow(execution.workflow_id)
+            if workflow is None:
+                execution.status = StepStatus.FAILED
+                execution.error_message = f"Workflow {execution.workflow_id} no longer exists"
+                execution.end_time = datetime.now()
+                self._persist(execution, 'status', 'error_message', 'end_time', force=True)
+                continue
+            execution.plan = self.get_plan(workflow)
+            execution.trace = self._new_trace()
+            self.executions.put(execution)
+            try:
+                self.execution_queue.put(execution.user_id, (workflow, execution))
+            except Full:
+                # Left to a later pass once the claim's lease runs out
+                self.executions.pop(execution_id)
+                logger.warning(f"Execution queue full; workflow execution {execution_id} not resumed yet")
+                continue
+            recovered += 1
+        if recovered:
+            logger.info(f"Resuming {recovered} interrupted workflow executions")
+        return recovered
+    
+    def _execution_worker(self):
+        while True:
+            try:
+                workflow, execution = self.execution_queue.get(timeout=0.5)
+            except Empty:
+                if not self.is_running:
+                    break
+                continue
+            with self.lock:
+                self.active_executions += 1
+            if execution.trace is not None:
+                # The trace starts when the execution is queued
+                execution.trace.add('queue wait', 'queue', execution.trace.origin_ns)
+            try:
+                self._execute_workflow_sync(workflow, execution)
+            finally:
+                with self.lock:
+                    self.active_executions -= 1
+                self.executions.finish(execution)
+                self.prune_history()
+    
+    def _new_trace(self) -> Optional[ExecutionTrace]:
+        return ExecutionTrace(self.trace_max_spans) if self.trace_max_spans else None
+    
+    def prune_history(self, force: bool = False) -> int:
+        """Purge finished executions older than history_retention from the store, at most once per interval"""
+        if self.history_retention is None:
+            return 0
+        now = time.time()
+        with self.lock:
+            if not force and now - self.last_history_prune < self.history_prune_interval:
+                return 0
+            self.last_history_prune = now
+        try:
+            purged = self.store.purge_executions(datetime.fromtimestamp(now - self.history_retention))
+        except Exception as e:
+            logger.error(f"Purging workflow execution history failed: {str(e)}")
+            return 0
+        if purged:
+            logger.info(f"Purged {purged} workflow executions from history")
+        return purged
+    
+    def get_queue_stats(self) -> Dict[str, Any]:
+        return {
+            'workers': self.execution_workers,
+            'active': self.active_executions,
+            'queued': self.execution_queue.qsize(),
+            'max_queued': self.execution_queue.max_depth,
+            'queued_by_user': self.execution_queue.depth_by_owner(),
+            'executions': self.executions.stats(),
+            'plan_cache': {'plans': len(self.plans), 'hits': self.plan_cache_hits, 'misses': self.plan_cache_misses},
+            'step_cache': self.step_memo.stats() if self.step_memo is not None else None
+        }
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the execution workers once the queued executions have drained"""
+        with self.lock:
+            workers, self.worker_threads = self.worker_threads, []
+            self.is_running = False
+        self.maintenance_wakeup.set()
+        if wait:
+            for worker in workers:
+                worker.join()
+        self.step_executor.shutdown(wait=wait)
+        self.loop_executor.shutdown(wait=wait)
+    
+    def _persist(self, execution: WorkflowExecution, *fields, force: bool = False):
+        """Checkpoint the named fields, changed step states and new log lines to the store in one update.
+        
+        Unless forced, updates closer together than checkpoint_interval are
+        batched: changes accumulate on the execution until the next write.
+        """
+        fields = execution.pending_fields.union(fields)
+        now = time.monotonic()
+        if not force and now - execution.last_persist < self.checkpoint_interval:
+            execution.pending_fields = fields
+            return
+        execution.pending_fields = set()
+        execution.last_persist = now
+        trace = execution.trace
+        serialize_start = ExecutionTrace.now()
+        # Steps take the new version before the execution does, so pollers never miss a change
+        version = execution.version + 1
+        for step_id in execution.dirty_steps:
+            execution.step_states[step_id].version = version
+        execution.version = version
+        steps = {step_id: execution.step_states[step_id].to_record() for step_id in execution.dirty_steps}
+        execution.dirty_steps = set()
+        logs = execution.unpersisted_logs()
+        execution.logs_persisted = execution.log_count
+        record = execution.record_fields(*fields, 'version', 'log_count', 'heartbeat')
+        persist_start = ExecutionTrace.now()
+        try:
+            self.store.update_execution(execution.execution_id, record, steps, logs)
+        except Exception as e:
+            logger.error(f"Persisting workflow execution {execution.execution_id} failed: {str(e)}")
+        if trace is not None:
+            trace.add('serialize', 'serialize', serialize_start, persist_start, steps=len(steps), logs=len(logs))
+            trace.add('update execution', 'persist', persist_start, version=version)
+        if self.events is not None:
+            self._publish(execution, steps)
+    
+    def _publish(self, execution: WorkflowExecution, steps: Dict[str, Any]):
+        topic = f'execution:{execution.execution_id}'
+        for step_id, record in steps.items():
+            self.events.publish(topic, 'step', record, key=f'step:{step_id}')
+        # Published last so it follows the step updates even when a subscriber's backlog is coalesced
+        self.events.publish(topic, 'execution', execution.summary(), final=execution.finished_at is not None)
+    
     def _execute_workflow_sync(self, workflow: Workflow, execution: WorkflowExecution):
+        run_start = ExecutionTrace.now()
         try:
             execution.status = StepStatus.RUNNING
-            execution.start_time = datetime.now()
-            execution.log(f"Starting workflow execution: {workflow.name}")
+            if execution.steps_executed:
+                execution.log(
+                    f"Resuming workflow execution: {workflow.name} ({len(execution.steps_executed)} steps already completed)"
+                )
+            else:
+                execution.start_time = execution.start_time or datetime.now()
+                execution.log(f"Starting workflow execution: {workflow.name}")
+            self._persist(execution, 'status', 'start_time', 'owner', force=True)
             
-            current_step_id = workflow.start_step_id
-            context_data = execution.input_data.copy()
+            context = ExecutionContext(execution.input_data)
+            plan = execution.plan or self.get_plan(workflow)
+            execution.plan = plan
+            successors, predecessors = plan.successors, plan.predecessors
             
-            while current_step_id:
-                step = workflow.steps.get(current_step_id)
-                if not step:
-                    execution.log(f"Step {current_step_id} not found", "error")
-                    break
+            remaining = {step_id: len(preds) for step_id, preds in predecessors.items()}
+            active_inputs = {step_id: [] for step_id in predecessors}
+            step_outputs = {}
+            scheduled = set()
+            ready = [plan.start_step_id]
+            running = {}
+            failed_step = None
+            replaying = False
+            
+            def resolve_edge(from_step_id, to_step_id, active):
+                """Record that an incoming edge of to_step_id is settled, activating or skipping it"""
+                remaining[to_step_id] -= 1
+                if active:
+                    active_inputs[to_step_id].append(from_step_id)
+                if to_step_id in scheduled:
+                    return
                 
-                execution.current_step = step
-                execution.log(f"Executing step: {step.name}")
+                join = plan.steps[to_step_id].step.config.get('join', 'all')
+                if active and join == 'any':
+                    scheduled.add(to_step_id)
+                    ready.append(to_step_id)
+                elif remaining[to_step_id] == 0:
+                    scheduled.add(to_step_id)
+                    if active_inputs[to_step_id]:
+                        ready.append(to_step_id)
+                    else:
+                        # No branch leads here on this run; skip it and everything only it feeds
+                        skipped = execution.state_for(plan.steps[to_step_id].step)
+                        skipped.status = StepStatus.SKIPPED
+                        if not replaying:
+                            execution.log(f"Step {skipped.name} skipped", step_id=to_step_id)
+                        for next_step_id in successors[to_step_id]:
+                            resolve_edge(to_step_id, next_step_id, False)
+            
+            scheduled.add(plan.start_step_id)
+            if execution.steps_executed:
+                # Resuming from a checkpoint: replay completed steps in completion order to
+                # rebuild the context and edge state, then continue with whatever was not finished
+                replaying = True
+                completed = set()
+                for state in execution.steps_executed:
+                    if state.id not in plan.steps:
+                        raise ValueError(f"Step {state.id} is no longer part of workflow {workflow.id}")
+                    completed.add(state.id)
+                    step_outputs[state.id] = state.output_data or {}
+                    context.push(state.output_data)
+                    for to_step_id in successors[state.id]:
+                        resolve_edge(state.id, to_step_id, self._edge_taken(state.step, to_step_id, state.next_step_id))
+                replaying = False
+                ready = [step_id for step_id in ready if step_id not in completed]
+                failed_step = next(
+                    (state for state in execution.step_states.values() if state.status == StepStatus.FAILED), None
+                )
+            
+            while ready or running:
+                # Dispatch every step whose dependencies are satisfied
+                dispatched = bool(ready) and failed_step is None
+                while ready and failed_step is None:
+                    step = plan.steps[ready.pop(0)].step
+                    inputs = [step_id for step_id in predecessors[step.id] if step_id in active_inputs[step.id]]
+                    step_context = self._join_context(step, context, inputs, step_outputs)
+                    state = execution.state_for(step)
+                    execution.current_step = state
+                    execution.log(f"Executing step: {step.name}", step_id=step.id)
+                    future = self.step_executor.submit(
+                        self._execute_step, state, step_context, execution, ExecutionTrace.now()
+                    )
+                    running[future] = state
                 
-                # Process the step
-                success, output_data, next_step_id = self._execute_step(step, context_data, execution)
+                if not running:
+                    break
+                if dispatched:
+                    self._persist(execution, 'current_step_id')
                 
-                if success:
-                    step.status = StepStatus.COMPLETED
-                    step.output_data = output_data
-                    context_data.update(output_data or {})
-                    execution.steps_executed.append(step)
-                    execution.log(f"Step {step.name} completed successfully")
+                # Checkpoints held back by batching are flushed once the interval has passed
+                timeout = self.checkpoint_interval if execution.has_unsaved_changes() else None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    self._persist(execution)
+                    continue
+                done_states = [running[future] for future in done]
+                for future in done:
+                    state = running.pop(future)
+                    success, output_data, next_step_id = future.result()
                     
-                    # Determine next step
-                    if next_step_id:
-                        current_step_id = next_step_id
-                    elif step.next_steps:
-                        current_step_id = step.next_steps[0]  # Take first next step
-                    else:
-                        current_step_id = None  # End of workflow
-                else:
-                    step.status = StepStatus.FAILED
-                    execution.log(f"Step {step.name} failed: {step.error_message}", "error")
-                    execution.status = StepStatus.FAILED
-                    execution.error_message = step.error_message
-                    break
+                    if not success:
+                        state.status = StepStatus.FAILED
+                        execution.log(f"Step {state.name} failed: {state.error_message}", "error", step_id=state.id)
+                        if failed_step is None:
+                            failed_step = state
+                        continue
+                    
+                    state.status = StepStatus.COMPLETED
+                    state.output_data = output_data
+                    state.next_step_id = next_step_id
+                    step_outputs[state.id] = output_data or {}
+                    context.push(output_data)
+                    execution.steps_executed.append(state)
+                    execution.log(
+                        f"Step {state.name} completed successfully{' (cached)' if state.cached else ''}", step_id=state.id
+                    )
+                    
+                    if failed_step is not None:
+                        continue
+                    
+                    # A condition selects one outgoing edge; other steps fan out to all of them
+                    for to_step_id in successors[state.id]:
+                        resolve_edge(state.id, to_step_id, self._edge_taken(state.step, to_step_id, next_step_id))
+                
+                for state in done_states:
+                    execution.dirty_steps.add(state.id)
+                self._persist(execution, 'steps_executed')
                 
-                # Add delay for animation effect
-                time.sleep(0.5)
+                # Presentation-only pacing so UIs can animate step transitions
+                if execution.animation_delay:
+                    time.sleep(execution.animation_delay)
             
-            if execution.status != StepStatus.FAILED:
+            if failed_step is not None:
+                execution.status = StepStatus.FAILED
+                execution.error_message = failed_step.error_message
+            else:
                 execution.status = StepStatus.COMPLETED
-                execution.output_data = context_data
+                execution.output_data = context.flatten()
                 execution.log("Workflow execution completed successfully")
             
             execution.end_time = datetime.now()
@@ -257,38 +1280,90 @@ class WorkflowEngine:
             execution.end_time = datetime.now()
             if execution.start_time:
                 execution.duration = (execution.end_time - execution.start_time).total_seconds()
+        
+        self._persist(
+            execution, 'status', 'current_step_id', 'error_message', 'end_time', 'duration', 'output_data', 'steps_executed',
+            force=True
+        )
+        if execution.trace is not None:
+            execution.trace.add(workflow.name, 'execution', run_start, status=execution.status.value)
+    
+    @staticmethod
+    def _edge_taken(step: WorkflowStep, to_step_id: str, next_step_id: Optional[str]) -> bool:
+        """Whether a completed step activates its edge to to_step_id.
+        
+        A condition takes only the edge to the branch it selected; with no branch
+        for its outcome (e.g. false without a false_step) only plain next_steps
+        that are not branch targets are taken.
+        """
+        if step.type != StepType.CONDITION:
+            return next_step_id is None or to_step_id == next_step_id
+        if next_step_id is not None:
+            return to_step_id == next_step_id
+        return to_step_id not in (step.config.get('true_step'), step.config.get('false_step'))
     
-    def _execute_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
+    def _join_context(self, step: WorkflowStep, context: ExecutionContext, inputs: List[str], step_outputs: Dict[str, Any]):
+        """View handed to a step; at a join, branch outputs are layered in edge order so merges are deterministic"""
+        if len(inputs) <= 1:
+            return context.view()
+        if step.config.get('merge') == 'namespace':
+            merge_key = step.config.get('merge_key', 'branch_outputs')
+            return context.view({merge_key: {step_id: step_outputs.get(step_id) for step_id in inputs}})
+        return context.view(*(step_outputs.get(step_id) or {} for step_id in inputs))
+    
+    def _execute_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution,
+                      submitted_ns: int = None):
+        trace = execution.trace
+        if trace is None:
+            return self._run_step(step, context_data, execution)
+        start_ns = ExecutionTrace.now()
+        if submitted_ns is not None:
+            trace.add('step queue wait', 'queue', submitted_ns, start_ns, step_id=step.id)
+        result = self._run_step(step, context_data, execution)
+        trace.add(step.name, 'step', start_ns, step_id=step.id, type=step.type.value, success=result[0], cached=step.cached)
+        return result
+    
+    def _run_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
         try:
             step.status = StepStatus.RUNNING
-            step.start_time = datetime.now()
-            step.input_data = context_data.copy()
+            step.start_time = time.time()
+            step.input_data = context_data
             
             # Get the appropriate processor for this step type
             processor = self.step_processors.get(step.type)
             if not processor:
                 raise ValueError(f"No processor found for step type: {step.type}")
             
+            memo = self.step_memo if self.step_memo is not None and StepMemo.is_memoized(step.step) else None
+            if memo is not None:
+                stats_key = f'{execution.workflow_id}:{step.id}'
+                cached = memo.lookup(step.step, context_data, execution.user_id, stats_key)
+                if cached is not None:
+                    step.cached = True
+                    step.end_time = time.time()
+                    step.duration = step.end_time - step.start_time
+                    return True, cached[0], cached[1]
+                context_data = memo.track(step.step, context_data)
+            
             # Execute the step
             success, output_data, next_step_id = processor(step, context_data, execution)
+            if success and memo is not None:
+                memo.store(step.step, context_data, execution.user_id, stats_key, output_data, next_step_id)
             
-            step.end_time = datetime.now()
-            step.duration = (step.end_time - step.start_time).total_seconds()
+            step.end_time = time.time()
+            step.duration = step.end_time - step.start_time
             
             return success, output_data, next_step_id
             
         except Exception as e:
             step.status = StepStatus.FAILED
             step.error_message = str(e)
-            step.end_time = datetime.now()
+            step.end_time = time.time()
             if step.start_time:
-                step.duration = (step.end_time - step.start_time).total_seconds()
+                step.duration = step.end_time - step.start_time
             return False, None, None
     
-    def _process_input_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
-        # Simulate input processing
-        time.sleep(1)
-        
+    def _process_input_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
         input_config = step.config.get('input', {})
         required_fields = input_config.get('required_fields', [])
         
@@ -307,62 +1382,19 @@ class WorkflowEngine:
         
         return True, output_data, None
     
-    def _process_processing_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
-        # Simulate processing
-        processing_time = step.config.get('processing_time', 2)
-        time.sleep(processing_time)
-        
+    def _process_processing_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
         operation = step.config.get('operation', 'default')
+        handler = self.operation_handlers.get(operation)
+        if not handler:
+            step.error_message = f"No handler registered for processing operation '{operation}'"
+            return False, None, None
         
-        if operation == 'document_processing':
-            output_data = {
-                'processed_document': True,
-                'document_type': context_data.get('document_type', 'unknown'),
-                'pages_processed': context_data.get('page_count', 1),
-                'processing_result': 'success'
-            }
-        elif operation == 'image_analysis':
-            output_data = {
-                'analyzed_image': True,
-                'image_format': context_data.get('image_format', 'unknown'),
-                'analysis_result': {
-                    'brightness': 142,
-                    'dominant_color': '#3b82f6',
-                    'objects_detected': 3
-                }
-            }
-        else:
-            output_data = {
-                'processed': True,
-                'operation': operation,
-                'result': 'completed'
-            }
-        
+        output_data = handler(step, context_data, execution)
         return True, output_data, None
     
-    def _process_validation_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
-        # Simulate validation
-        time.sleep(0.5)
-        
-        validation_rules = step.config.get('rules', [])
-        validation_results = []
-        
-        for rule in validation_rules:
-            field = rule.get('field')
-            condition = rule.get('condition')
-            value = rule.get('value')
-            
-            if field in context_data:
-                field_value = context_data[field]
-                
-                if condition == 'equals' and field_value == value:
-                    validation_results.append({'rule': rule, 'passed': True})
-                elif condition == 'not_empty' and field_value:
-                    validation_results.append({'rule': rule, 'passed': True})
-                else:
-                    validation_results.append({'rule': rule, 'passed': False})
-            else:
-                validation_results.append({'rule': rule, 'passed': False, 'error': 'Field not found'})
+    def _process_validation_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
+        compiled = execution.plan.steps[step.id]
+        validation_results = [check(context_data) for check in compiled.rules]
         
         all_passed = all(result['passed'] for result in validation_results)
         
@@ -377,10 +1409,7 @@ class WorkflowEngine:
         
         return True, output_data, None
     
-    def _process_output_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
-        # Simulate output generation
-        time.sleep(1)
-        
+    def _process_output_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
         output_format = step.config.get('format', 'json')
         output_fields = step.config.get('fields', list(context_data.keys()))
         
@@ -392,13 +1421,9 @@ class WorkflowEngine:
         
         return True, output_data, None
     
-    def _process_condition_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
-        # Simulate condition evaluation
-        time.sleep(0.2)
-        
+    def _process_condition_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
         condition = step.config.get('condition', {})
         field = condition.get('field')
-        operator = condition.get('operator', 'equals')
         value = condition.get('value')
         
         if field not in context_data:
@@ -406,16 +1431,7 @@ class WorkflowEngine:
             return False, None, None
         
         field_value = context_data[field]
-        condition_result = False
-        
-        if operator == 'equals':
-            condition_result = field_value == value
-        elif operator == 'not_equals':
-            condition_result = field_value != value
-        elif operator == 'greater_than':
-            condition_result = field_value > value
-        elif operator == 'less_than':
-            condition_result = field_value < value
+        condition_result = execution.plan.steps[step.id].condition(field_value)
         
         # Determine next step based on condition
         next_step_id = None
@@ -432,44 +1448,24 @@ class WorkflowEngine:
         
         return True, output_data, next_step_id
     
-    def _process_transform_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
-        # Simulate data transformation
-        time.sleep(0.5)
+    def _process_transform_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
+        compiled = execution.plan.steps[step.id]
+        # Writes land in a fresh layer, so only the keys actually changed become output
+        transformed_data = ChainMap({}, context_data)
         
-        transformations = step.config.get('transformations', [])
-        transformed_data = context_data.copy()
-        
-        for transform in transformations:
-            operation = transform.get('operation')
-            source_field = transform.get('source_field')
-            target_field = transform.get('target_field')
-            
-            if source_field in transformed_data:
-                source_value = transformed_data[source_field]
-                
-                if operation == 'uppercase':
-                    transformed_data[target_field] = str(source_value).upper()
-                elif operation == 'lowercase':
-                    transformed_data[target_field] = str(source_value).lower()
-                elif operation == 'multiply':
-                    factor = transform.get('factor', 1)
-                    transformed_data[target_field] = source_value * factor
-                elif operation == 'format_date':
-                    # Simplified date formatting
-                    transformed_data[target_field] = datetime.now().strftime('%Y-%m-%d')
+        for apply in compiled.transforms:
+            apply(transformed_data)
         
         output_data = {
             'transformed': True,
-            'transformations_applied': len(transformations)
+            'transformations_applied': compiled.transform_count
         }
-        output_data.update(transformed_data)
+        output_data.update(transformed_data.maps[0])
         
         return True, output_data, None
     
-    def _process_api_call_step(self, step: WorkflowStep, context_data: Dict[str, Any], execution: WorkflowExecution):
-        # Simulate API call
-        time.sleep(1.5)
-        
+    def _process_api_call_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
+        # Outbound calls are not wired up yet; report the configured request
         api_config = step.config.get('api', {})
         url = api_config.get('url')
         method = api_config.get('method', 'GET')
@@ -488,20 +1484,179 @@ class WorkflowEngine:
         
         return True, output_data, None
     
+    def _process_loop_step(self, step: StepState, context_data: Dict[str, Any], execution: WorkflowExecution):
+        config = step.config
+        items_key = config.get('items')
+        if items_key not in context_data:
+            step.error_message = f"Loop items field '{items_key}' not found"
+            return False, None, None
+        
+        items = list(context_data[items_key] or [])
+        compiled = execution.plan.steps[step.id]
+        parallelism = max(1, int(config.get('parallelism', 1)))
+        chunk_size = max(1, int(config.get('chunk_size', 1)))
+        fail_fast = config.get('fail_fast', True)
+        cancelled = threading.Event()
+        
+        def run_chunk(start, chunk):
+            # Restored afterwards: an inline nested loop must not clear the flag of the loop running it
+            was_active = getattr(self._loop_local, 'active', False)
+            self._loop_local.active = True
+            chunk_start = ExecutionTrace.now()
+            try:
+                outcomes = []
+                for offset, item in enumerate(chunk):
+                    if cancelled.is_set():
+                        break
+                    outcome = self._run_loop_item(compiled, start + offset, item, context_data, execution)
+                    outcomes.append(outcome)
+                    if not outcome[0] and fail_fast:
+                        cancelled.set()
+                return start, outcomes
+            finally:
+                self._loop_local.active = was_active
+                if execution.trace is not None:
+                    execution.trace.add(
+                        f'{step.name} items {start}-{start + len(chunk) - 1}', 'loop', chunk_start, optional=True,
+                        step_id=step.id
+                    )
+        
+        chunks = [(start, items[start:start + chunk_size]) for start in range(0, len(items), chunk_size)]
+        chunk_outcomes = {}
+        
+        # Nested loops run inline; they are already on a loop worker
+        if parallelism == 1 or getattr(self._loop_local, 'active', False):
+            for start, chunk in chunks:
+                if cancelled.is_set():
+                    break
+                chunk_outcomes[start] = run_chunk(start, chunk)[1]
+        else:
+            pending = deque(chunks)
+            in_flight = set()
+            while pending or in_flight:
+                while pending and len(in_flight) < parallelism and not cancelled.is_set():
+                    in_flight.add(self.loop_executor.submit(run_chunk, *pending.popleft()))
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, outcomes = future.result()
+                    chunk_outcomes[start] = outcomes
+        
+        # Collect per-item results in input order
+        results = []
+        errors = []
+        for start in sorted(chunk_outcomes):
+            for offset, (success, result, error) in enumerate(chunk_outcomes[start]):
+                if success:
+                    results.append(result)
+                else:
+                    results.append(None)
+                    errors.append({'index': start + offset, 'error': error})
+        
+        if errors and (fail_fast or len(errors) > config.get('max_failures', len(items))):
+            first = errors[0]
+            step.error_message = f"Loop item {first['index']} failed: {first['error']}"
+            return False, None, None
+        
+        output_data = {
+            config.get('results_key', f'{step.id}_results'): results,
+            'loop_items': len(items),
+            'loop_failures': len(errors)
+        }
+        if errors:
+            output_data['loop_errors'] = errors
+        
+        successful = [result for result in results if result is not None]
+        for reduce in compiled.reducers:
+            target, value = reduce(successful)
+            output_data[target] = value
+        
+        return True, output_data, None
+    
+    def _run_loop_item(self, compiled: CompiledStep, index: int, item: Any, context_data: Dict[str, Any], execution: WorkflowExecution):
+        """Run a loop body for one item; returns (success, result, error)"""
+        config = compiled.step.config
+        context = ExecutionContext(context_data)
+        context.push({config.get('item_key', 'item'): item, config.get('index_key', 'item_index'): index})
+        
+        item_output = {}
+        for body_step in compiled.body:
+            state = StepState(body_step.step)
+            success, output_data, next_step_id = self._run_step(state, context.view(), execution)
+            if not success:
+                return False, None, state.error_message
+            context.push(output_data)
+            item_output.update(output_data or {})
+            # A false condition filters the item: the rest of the body is skipped
+            if body_step.step.type == StepType.CONDITION and not output_data.get('condition_result'):
+                break
+        
+        collect = config.get('collect')
+        if not compiled.body:
+            return True, item, None
+        if collect:
+            return True, item_output.get(collect), None
+        return True, item_output, None
+    
     def get_execution(self, execution_id: str) -> Optional[WorkflowExecution]:
-        return self.executions.get(execution_id)
+        execution = self.executions.get(execution_id)
+        if execution is None:
+            # Started by another worker, evicted or from before a restart; read its shared state
+            record = self.store.load_execution(execution_id)
+            if record:
+                execution = WorkflowExecution.from_record(record, self.max_log_entries)
+                if execution.finished_at is not None:
+                    # Finished state no longer changes, so it is safe to keep around
+                    self.executions.put(execution)
+        return execution
+    
+    def get_execution_trace(self, execution_id: str) -> Optional[Dict[str, Any]]:
+        """Timeline of an execution as Chrome trace-event JSON, or None if unknown.
+        
+        Runs handled by this process export their recorded spans; others are
+        rebuilt from the step times in the store.
+        """
+        execution = self.executions.get(execution_id)
+        if execution is not None and execution.trace is not None:
+            return execution.trace.to_chrome(
+                execution_id=execution.execution_id, workflow_id=execution.workflow_id, status=execution.status.value
+            )
+        record = self.store.load_execution(execution_id)
+        return trace_from_record(record) if record else None
+    
+    def get_execution_version(self, execution_id: str):
+        """(version, log_count) of an execution without loading it, or None if unknown"""
+        execution = self.executions.get(execution_id)
+        if execution is not None:
+            return execution.version, execution.log_count
+        return self.store.load_execution_version(execution_id)
+    
+    def get_execution_changes(self, execution_id: str, since_version: int = 0, log_cursor: int = 0) -> Optional[Dict[str, Any]]:
+        """Incremental status for pollers; see WorkflowExecution.changes"""
+        execution = self.executions.get(execution_id)
+        if execution is None:
+            # Only the unseen tail of the log is read back from the store
+            record = self.store.load_execution(execution_id, log_cursor)
+            if record is None:
+                return None
+            execution = WorkflowExecution.from_record(record, self.max_log_entries)
+        return execution.changes(since_version, log_cursor)
     
     def list_executions(self, workflow_id: str = None) -> List[Dict[str, Any]]:
-        executions = list(self.executions.values())
-        if workflow_id:
-            executions = [ex for ex in executions if ex.workflow_id == workflow_id]
-        return [execution.to_dict() for execution in executions]
+        return [WorkflowExecution.from_record(record).to_dict() for record in self.store.list_executions(workflow_id)]
     
-    def create_sample_workflows(self):
-        """Create sample workflows for demonstration"""
+    def create_sample_workflows(self, owner_id: str = None):
+        """Create sample workflows for demonstration.
+        
+        Sample ids are fixed so that every worker sharing a store seeds them only once.
+        """
         
         # Document Processing Workflow
-        doc_workflow = self.create_workflow(
+        if self.get_workflow("sample-document-processing") is not None:
+            return
+        doc_workflow = Workflow(
+            "sample-document-processing",
             "Document Processing Pipeline",
             "Automated document upload, validation, and processing workflow"
         )
@@ -519,8 +1674,7 @@ class WorkflowEngine:
         })
         
         process_step = WorkflowStep("process", "Process Document", StepType.PROCESSING, {
-            'operation': 'document_processing',
-            'processing_time': 3
+            'operation': 'document_processing'
         })
         
         output_step = WorkflowStep("output", "Generate Output", StepType.OUTPUT, {
@@ -539,9 +1693,11 @@ class WorkflowEngine:
         doc_workflow.connect_steps("validate", "process")
         doc_workflow.connect_steps("process", "output")
         doc_workflow.set_start_step("upload")
+        self.save_workflow(doc_workflow, owner_id)
         
         # Image Analysis Workflow
-        img_workflow = self.create_workflow(
+        img_workflow = Workflow(
+            "sample-image-analysis",
             "Image Analysis Pipeline",
             "AI-powered image analysis and report generation workflow"
         )
@@ -551,8 +1707,7 @@ class WorkflowEngine:
         })
         
         img_process_step = WorkflowStep("img_analyze", "Analyze Image", StepType.PROCESSING, {
-            'operation': 'image_analysis',
-            'processing_time': 2
+            'operation': 'image_analysis'
         })
         
         img_output_step = WorkflowStep("img_output", "Generate Report", StepType.OUTPUT, {
@@ -567,4 +1722,4 @@ class WorkflowEngine:
         img_workflow.connect_steps("img_upload", "img_analyze")
         img_workflow.connect_steps("img_analyze", "img_output")
         img_workflow.set_start_step("img_upload")
-
+        self.save_workflow(img_workflow, owner_id)
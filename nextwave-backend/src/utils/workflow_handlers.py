@@ -0,0 +1,177 @@
+import os
+
+
+class WorkflowProcessingHandlers:
+    """PROCESSING step operations backed by PDFProcessor and ImageAnalyzer.
+
+    Steps reference stored records through the execution context:
+    ``document_id`` / ``document_ids`` for documents and ``image_id`` for
+    images. ``document_file`` / ``image_file`` are accepted as a fallback
+    and matched against the executing user's uploads by filename.
+    """
+
+    def __init__(self, app, pdf_processor, image_analyzer, document_model, image_model):
+        self.app = app
+        self.pdf_processor = pdf_processor
+        self.image_analyzer = image_analyzer
+        self.document_model = document_model
+        self.image_model = image_model
+
+    def register(self, engine):
+        engine.register_operation('extract_text', self.extract_text)
+        engine.register_operation('document_processing', self.extract_text)
+        engine.register_operation('render_pages', self.render_pages)
+        engine.register_operation('merge_pdfs', self.merge_pdfs)
+        engine.register_operation('split_pdf', self.split_pdf)
+        engine.register_operation('watermark', self.watermark)
+        engine.register_operation('image_analysis', self.analyze_image)
+        return self
+
+    def _output_dir(self, step, execution):
+        output_dir = os.path.join(self.app.config['UPLOAD_FOLDER'], 'workflows', execution.execution_id, step.id)
+        os.makedirs(output_dir, exist_ok=True)
+        return output_dir
+
+    def _owned(self, record, execution):
+        return record is not None and (execution.user_id is None or str(record.user_id) == str(execution.user_id))
+
+    def _document(self, document_id, execution):
+        document = self.document_model.query.get(document_id)
+        if not self._owned(document, execution):
+            raise ValueError(f"Document {document_id} not found")
+        return document
+
+    def _documents(self, step, context_data, execution):
+        """Resolve the documents a step operates on from its config or the context"""
+        document_ids = step.config.get('document_ids') or context_data.get('document_ids')
+        if document_ids:
+            return [self._document(document_id, execution) for document_id in document_ids]
+
+        document_id = step.config.get('document_id') or context_data.get('document_id')
+        if document_id:
+            return [self._document(document_id, execution)]
+
+        filename = context_data.get('document_file')
+        if filename:
+            query = self.document_model.query.filter(
+                (self.document_model.filename == filename) | (self.document_model.original_filename == filename)
+            )
+            if execution.user_id is not None:
+                query = query.filter_by(user_id=int(execution.user_id))
+            document = query.order_by(self.document_model.uploaded_at.desc()).first()
+            if document:
+                return [document]
+            raise ValueError(f"Document '{filename}' not found")
+
+        raise ValueError("Step requires 'document_id' or 'document_ids' in the workflow input")
+
+    def _image(self, step, context_data, execution):
+        image_id = step.config.get('image_id') or context_data.get('image_id')
+        if image_id:
+            image = self.image_model.query.get(image_id)
+            if not self._owned(image, execution):
+                raise ValueError(f"Image {image_id} not found")
+            return image
+
+        filename = context_data.get('image_file')
+        if filename:
+            query = self.image_model.query.filter(
+                (self.image_model.filename == filename) | (self.image_model.original_filename == filename)
+            )
+            if execution.user_id is not None:
+                query = query.filter_by(user_id=int(execution.user_id))
+            image = query.order_by(self.image_model.created_at.desc()).first()
+            if image:
+                return image
+            raise ValueError(f"Image '{filename}' not found")
+
+        raise ValueError("Step requires 'image_id' in the workflow input")
+
+    @staticmethod
+    def _check(result):
+        if not result.get('success'):
+            raise ValueError(result.get('error', 'Processing failed'))
+        return result
+
+    def extract_text(self, step, context_data, execution):
+        with self.app.app_context():
+            document = self._documents(step, context_data, execution)[0]
+            result = self._check(self.pdf_processor.extract_text_from_pdf(document.file_path))
+            return {
+                'processed_document': True,
+                'document_id': document.id,
+                'document_type': context_data.get('document_type', document.document_type),
+                'pages_processed': result['total_pages'],
+                'text_content': result['content']
+            }
+
+    def render_pages(self, step, context_data, execution):
+        with self.app.app_context():
+            document = self._documents(step, context_data, execution)[0]
+            result = self._check(self.pdf_processor.pdf_to_images(
+                document.file_path,
+                self._output_dir(step, execution),
+                dpi=step.config.get('dpi', 150)
+            ))
+            return {
+                'document_id': document.id,
+                'page_images': result['images'],
+                'pages_rendered': result['total_pages']
+            }
+
+    def merge_pdfs(self, step, context_data, execution):
+        with self.app.app_context():
+            documents = self._documents(step, context_data, execution)
+            output_path = os.path.join(self._output_dir(step, execution), 'merged.pdf')
+            result = self._check(self.pdf_processor.merge_pdfs([document.file_path for document in documents], output_path))
+            return {
+                'merged_pdf_path': result['output_path'],
+                'files_merged': result['total_files_merged']
+            }
+
+    def split_pdf(self, step, context_data, execution):
+        with self.app.app_context():
+            document = self._documents(step, context_data, execution)[0]
+            result = self._check(self.pdf_processor.split_pdf(
+                document.file_path,
+                self._output_dir(step, execution),
+                pages_per_split=step.config.get('pages_per_split', 1)
+            ))
+            return {
+                'document_id': document.id,
+                'split_files': result['split_files'],
+                'total_splits': result['total_splits']
+            }
+
+    def watermark(self, step, context_data, execution):
+        with self.app.app_context():
+            document = self._documents(step, context_data, execution)[0]
+            watermark_text = step.config.get('watermark_text') or context_data.get('watermark_text', 'CONFIDENTIAL')
+            output_path = os.path.join(self._output_dir(step, execution), f'watermarked_{document.filename}')
+            result = self._check(self.pdf_processor.add_watermark(
+                document.file_path,
+                watermark_text,
+                output_path,
+                opacity=step.config.get('opacity', 0.3)
+            ))
+            return {
+                'document_id': document.id,
+                'watermarked_pdf_path': result['output_path'],
+                'watermark_text': watermark_text
+            }
+
+    def analyze_image(self, step, context_data, execution):
+        with self.app.app_context():
+            image = self._image(step, context_data, execution)
+            result = self._check(self.image_analyzer.analyze_image(image.file_path))
+            return {
+                'analyzed_image': True,
+                'image_id': image.id,
+                'image_format': image.format or context_data.get('image_format', 'unknown'),
+                'analysis_result': result
+            }
+
+
+def register_processing_handlers(engine, app, pdf_processor, image_analyzer, document_model, image_model):
+    """Bind the PROCESSING operations of a WorkflowEngine to real document and image processing"""
+    return WorkflowProcessingHandlers(app, pdf_processor, image_analyzer, document_model, image_model).register(engine)
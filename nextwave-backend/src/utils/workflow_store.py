@@ -0,0 +1,625 @@
+import json
+import time
+import threading
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import and_, bindparam
+from sqlalchemy.exc import IntegrityError
+
+# Execution record fields stored as JSON text in the SQL backend
+JSON_FIELDS = ('input_data', 'output_data', 'steps_executed')
+# Only executions in these states are purged from history
+FINISHED_STATUSES = ('completed', 'failed')
+# Executions in these states with a stale heartbeat were interrupted and can be resumed
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def _stale(record, stale_before):
+    return record.get('status') in ACTIVE_STATUSES and (record.get('heartbeat') or 0) < stale_before
+
+
+def _revision(definition):
+    """Token that changes whenever a saved definition does"""
+    return f"{definition.get('updated_at')}#{definition.get('revision', 0)}"
+
+
+def _finished_before(record, cutoff):
+    return record.get('status') in FINISHED_STATUSES and bool(record.get('end_time')) and \
+        datetime.fromisoformat(record['end_time']) < cutoff
+
+
+class MemoryStateStore:
+    """Process-local store; only suitable for a single worker"""
+
+    def __init__(self):
+        self.workflows = {}
+        self.executions = {}
+        self.logs = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def save_workflow(self, definition, user_id=None):
+        with self.lock:
+            self.workflows[definition['id']] = definition
+
+    def load_workflow(self, workflow_id):
+        return self.workflows.get(workflow_id)
+
+    def workflow_revision(self, workflow_id):
+        definition = self.workflows.get(workflow_id)
+        return _revision(definition) if definition else None
+
+    def list_workflows(self):
+        return list(self.workflows.values())
+
+    def delete_workflow(self, workflow_id):
+        with self.lock:
+            return self.workflows.pop(workflow_id, None) is not None
+
+    def save_execution(self, record):
+        with self.lock:
+            self.executions[record['execution_id']] = dict(record, steps=dict(record.get('steps') or {}))
+
+    def update_execution(self, execution_id, fields=None, steps=None, logs=None):
+        with self.lock:
+            record = self.executions.get(execution_id)
+            if record is None:
+                return
+            record.update(fields or {})
+            record['steps'].update(steps or {})
+            self.logs[execution_id].extend(logs or [])
+
+    def delete_execution(self, execution_id):
+        with self.lock:
+            self.executions.pop(execution_id, None)
+            self.logs.pop(execution_id, None)
+
+    def load_execution(self, execution_id, log_cursor=0):
+        record = self.executions.get(execution_id)
+        if record is None:
+            return None
+        logs = [entry for entry in self.logs.get(execution_id, []) if entry.get('seq', 0) >= log_cursor]
+        return dict(record, execution_log=logs)
+
+    def load_execution_version(self, execution_id):
+        record = self.executions.get(execution_id)
+        return (record.get('version', 0), record.get('log_count', 0)) if record else None
+
+    def list_executions(self, workflow_id=None):
+        records = [self.load_execution(execution_id) for execution_id in list(self.executions)]
+        return [record for record in records if record and (not workflow_id or record['workflow_id'] == workflow_id)]
+
+    def touch_executions(self, execution_ids, owner, heartbeat):
+        with self.lock:
+            for execution_id in execution_ids:
+                record = self.executions.get(execution_id)
+                if record is not None:
+                    record.update(owner=owner, heartbeat=heartbeat)
+
+    def list_interrupted(self, stale_before):
+        with self.lock:
+            return [execution_id for execution_id, record in self.executions.items() if _stale(record, stale_before)]
+
+    def claim_execution(self, execution_id, owner, stale_before, lease=None):
+        with self.lock:
+            record = self.executions.get(execution_id)
+            if record is None or not _stale(record, stale_before):
+                return False
+            record.update(owner=owner, heartbeat=time.time())
+            return True
+
+    def purge_executions(self, finished_before):
+        with self.lock:
+            expired = [
+                execution_id for execution_id, record in self.executions.items()
+                if _finished_before(record, finished_before)
+            ]
+            for execution_id in expired:
+                del self.executions[execution_id]
+                self.logs.pop(execution_id, None)
+        return len(expired)
+
+
+class SQLStateStore:
+    """Definitions in WorkflowModel, executions in WorkflowRunState with a WorkflowRunStep row per step
+    and WorkflowRunLog rows.
+
+    Checkpoints never read-modify-write: top-level fields are a single
+    UPDATE, each changed step is an UPDATE of its own row (INSERT the first
+    time) and log lines are INSERTs, so nothing relies on row locks that
+    some dialects (SQLite) ignore.
+    """
+
+    def __init__(self, app, db, workflow_model, run_state_model, run_log_model, run_step_model):
+        self.app = app
+        self.db = db
+        self.workflow_model = workflow_model
+        self.run_state_model = run_state_model
+        self.run_log_model = run_log_model
+        self.run_step_model = run_step_model
+
+    def save_workflow(self, definition, user_id=None):
+        with self.app.app_context():
+            row = self.workflow_model.query.filter_by(workflow_id=definition['id']).first()
+            if row is None:
+                row = self.workflow_model(workflow_id=definition['id'], user_id=user_id)
+                self.db.session.add(row)
+            row.name = definition['name']
+            row.description = definition.get('description')
+            row.set_definition(definition)
+            row.revision = _revision(definition)
+            row.status = 'active' if definition.get('is_active', True) else 'paused'
+            self.db.session.commit()
+
+    def load_workflow(self, workflow_id):
+        with self.app.app_context():
+            row = self.workflow_model.query.filter_by(workflow_id=workflow_id).first()
+            return row.get_definition() if row else None
+
+    def workflow_revision(self, workflow_id):
+        with self.app.app_context():
+            model = self.workflow_model
+            row = model.query.with_entities(model.revision, model.updated_at).filter_by(workflow_id=workflow_id).first()
+            if row is None:
+                return None
+            # Rows saved before revisions were recorded fall back to the row timestamp
+            return row.revision or f'{row.updated_at}'
+
+    def list_workflows(self):
+        with self.app.app_context():
+            return [row.get_definition() for row in self.workflow_model.query.order_by(self.workflow_model.id).all()]
+
+    def delete_workflow(self, workflow_id):
+        with self.app.app_context():
+            deleted = self.workflow_model.query.filter_by(workflow_id=workflow_id).delete()
+            self.db.session.commit()
+            return deleted > 0
+
+    @staticmethod
+    def _column_value(field, value):
+        if field in JSON_FIELDS:
+            return json.dumps(value)
+        if field in ('start_time', 'end_time') and value:
+            return datetime.fromisoformat(value)
+        return value
+
+    def save_execution(self, record):
+        with self.app.app_context():
+            row = self.run_state_model(execution_id=record['execution_id'])
+            for field, value in record.items():
+                if field != 'execution_id' and hasattr(self.run_state_model, field):
+                    setattr(row, field, self._column_value(field, value))
+            self.db.session.add(row)
+            self._insert_steps(record['execution_id'], record.get('steps') or {})
+
+            workflow = self.workflow_model.query.filter_by(workflow_id=record['workflow_id']).first()
+            if workflow:
+                workflow.run_count = (workflow.run_count or 0) + 1
+                workflow.last_run = datetime.utcnow()
+            self.db.session.commit()
+
+    def _insert_steps(self, execution_id, steps):
+        if steps:
+            self.db.session.execute(self.run_step_model.__table__.insert(), [
+                {'execution_id': execution_id, 'step_id': step_id, 'state': json.dumps(state)}
+                for step_id, state in steps.items()
+            ])
+
+    def _write_steps(self, execution_id, steps):
+        """Overwrite the rows of the given steps, creating the ones that do not exist yet"""
+        table = self.run_step_model.__table__
+        payloads = {step_id: json.dumps(state) for step_id, state in steps.items()}
+        result = self.db.session.execute(
+            table.update().where(and_(
+                table.c.execution_id == bindparam('b_execution_id'), table.c.step_id == bindparam('b_step_id')
+            )).values(state=bindparam('b_state')),
+            [
+                {'b_execution_id': execution_id, 'b_step_id': step_id, 'b_state': payload}
+                for step_id, payload in payloads.items()
+            ]
+        )
+        if result.rowcount == len(payloads):
+            return
+        # Some steps are new (rowcount is summed over the batch); insert the ones still missing
+        existing = {
+            row.step_id for row in self.db.session.execute(
+                table.select().with_only_columns(table.c.step_id).where(and_(
+                    table.c.execution_id == execution_id, table.c.step_id.in_(list(payloads))
+                ))
+            )
+        }
+        self._insert_steps(execution_id, {step_id: steps[step_id] for step_id in payloads if step_id not in existing})
+
+    def update_execution(self, execution_id, fields=None, steps=None, logs=None):
+        with self.app.app_context():
+            # A concurrent writer can insert the same new step first; the retry then updates its row
+            for attempt in range(2):
+                try:
+                    values = {field: self._column_value(field, value) for field, value in (fields or {}).items()}
+                    if values:
+                        values['updated_at'] = datetime.utcnow()
+                        self.run_state_model.query.filter_by(execution_id=execution_id).update(values)
+                    if steps:
+                        self._write_steps(execution_id, steps)
+                    for entry in logs or []:
+                        self.db.session.add(self.run_log_model(execution_id=execution_id, **entry))
+                    self.db.session.commit()
+                    return
+                except IntegrityError:
+                    self.db.session.rollback()
+                    if attempt:
+                        raise
+
+    def delete_execution(self, execution_id):
+        with self.app.app_context():
+            self.run_state_model.query.filter_by(execution_id=execution_id).delete()
+            self.run_step_model.query.filter_by(execution_id=execution_id).delete()
+            self.run_log_model.query.filter_by(execution_id=execution_id).delete()
+            self.db.session.commit()
+
+    def _steps(self, execution_ids):
+        """Step states of the given executions, execution id -> step id -> state"""
+        steps = defaultdict(dict)
+        rows = self.run_step_model.query.filter(self.run_step_model.execution_id.in_(list(execution_ids))).all()
+        for row in rows:
+            steps[row.execution_id][row.step_id] = json.loads(row.state)
+        return steps
+
+    def _record(self, row):
+        record = {
+            'execution_id': row.execution_id,
+            'workflow_id': row.workflow_id,
+            'user_id': row.user_id,
+            'status': row.status,
+            'current_step_id': row.current_step_id,
+            'error_message': row.error_message,
+            'start_time': row.start_time.isoformat() if row.start_time else None,
+            'end_time': row.end_time.isoformat() if row.end_time else None,
+            'duration': row.duration,
+            'version': row.version,
+            'log_count': row.log_count,
+            'owner': row.owner,
+            'heartbeat': row.heartbeat
+        }
+        for field in JSON_FIELDS:
+            value = getattr(row, field)
+            record[field] = json.loads(value) if value else None
+        return record
+
+    def _logs(self, execution_id, log_cursor=0):
+        query = self.run_log_model.query.filter_by(execution_id=execution_id)
+        if log_cursor:
+            query = query.filter(self.run_log_model.seq >= log_cursor)
+        rows = query.order_by(self.run_log_model.id).all()
+        return [
+            {'seq': row.seq, 'timestamp': row.timestamp, 'level': row.level, 'message': row.message, 'step_id': row.step_id}
+            for row in rows
+        ]
+
+    def load_execution(self, execution_id, log_cursor=0):
+        with self.app.app_context():
+            row = self.run_state_model.query.filter_by(execution_id=execution_id).first()
+            if row is None:
+                return None
+            record = self._record(row)
+            record['steps'] = self._steps([execution_id])[execution_id]
+            record['execution_log'] = self._logs(execution_id, log_cursor)
+            return record
+
+    def load_execution_version(self, execution_id):
+        with self.app.app_context():
+            model = self.run_state_model
+            row = model.query.with_entities(model.version, model.log_count).filter_by(execution_id=execution_id).first()
+            return (row.version or 0, row.log_count or 0) if row else None
+
+    def list_executions(self, workflow_id=None):
+        with self.app.app_context():
+            query = self.run_state_model.query
+            if workflow_id:
+                query = query.filter_by(workflow_id=workflow_id)
+            rows = query.order_by(self.run_state_model.id).all()
+            steps = self._steps(row.execution_id for row in rows)
+            records = []
+            for row in rows:
+                record = self._record(row)
+                record['steps'] = steps[row.execution_id]
+                record['execution_log'] = self._logs(row.execution_id)
+                records.append(record)
+            return records
+
+    def touch_executions(self, execution_ids, owner, heartbeat):
+        with self.app.app_context():
+            self.run_state_model.query.filter(
+                self.run_state_model.execution_id.in_(list(execution_ids))
+            ).update({'owner': owner, 'heartbeat': heartbeat}, synchronize_session=False)
+            self.db.session.commit()
+
+    def _stale_query(self, stale_before):
+        model = self.run_state_model
+        return model.query.filter(
+            model.status.in_(ACTIVE_STATUSES),
+            (model.heartbeat < stale_before) | (model.heartbeat.is_(None))
+        )
+
+    def list_interrupted(self, stale_before):
+        with self.app.app_context():
+            rows = self._stale_query(stale_before).with_entities(self.run_state_model.execution_id).all()
+            return [row.execution_id for row in rows]
+
+    def claim_execution(self, execution_id, owner, stale_before, lease=None):
+        # Conditional update: only one worker sees its row count come back as 1
+        with self.app.app_context():
+            claimed = self._stale_query(stale_before).filter(self.run_state_model.execution_id == execution_id).update(
+                {'owner': owner, 'heartbeat': time.time()}, synchronize_session=False
+            )
+            self.db.session.commit()
+            return claimed == 1
+
+    def purge_executions(self, finished_before, batch_size=500):
+        model = self.run_state_model
+        purged = 0
+        with self.app.app_context():
+            while True:
+                rows = model.query.with_entities(model.execution_id).filter(
+                    model.status.in_(FINISHED_STATUSES),
+                    model.end_time < finished_before
+                ).limit(batch_size).all()
+                execution_ids = [row.execution_id for row in rows]
+                if not execution_ids:
+                    return purged
+                self.run_log_model.query.filter(self.run_log_model.execution_id.in_(execution_ids)).delete(synchronize_session=False)
+                self.run_step_model.query.filter(self.run_step_model.execution_id.in_(execution_ids)).delete(synchronize_session=False)
+                model.query.filter(model.execution_id.in_(execution_ids)).delete(synchronize_session=False)
+                self.db.session.commit()
+                purged += len(execution_ids)
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of the redis client used by RedisStateStore"""
+
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+        self.lock = threading.Lock()
+
+    def hset(self, name, key=None, value=None, mapping=None):
+        with self.lock:
+            values = self.data.setdefault(name, {})
+            if key is not None:
+                values[key] = value
+            values.update(mapping or {})
+
+    def set(self, name, value, ex=None, nx=False):
+        with self.lock:
+            expires = self.expiry.get(name)
+            if expires is not None and expires <= time.time():
+                self.data.pop(name, None)
+                self.expiry.pop(name, None)
+            if nx and name in self.data:
+                return None
+            self.data[name] = value
+            if ex:
+                self.expiry[name] = time.time() + ex
+            return True
+
+    def hget(self, name, key):
+        return self.data.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        return dict(self.data.get(name, {}))
+
+    def hmget(self, name, *keys):
+        values = self.data.get(name, {})
+        return [values.get(key) for key in keys]
+
+    def hexists(self, name, key):
+        return key in self.data.get(name, {})
+
+    def hdel(self, name, *keys):
+        with self.lock:
+            values = self.data.get(name, {})
+            return sum(1 for key in keys if values.pop(key, None) is not None)
+
+    def rpush(self, name, *values):
+        with self.lock:
+            items = self.data.setdefault(name, [])
+            items.extend(values)
+            return len(items)
+
+    def lrange(self, name, start, end):
+        items = self.data.get(name, [])
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def sadd(self, name, *values):
+        with self.lock:
+            self.data.setdefault(name, set()).update(values)
+
+    def smembers(self, name):
+        return set(self.data.get(name, set()))
+
+    def srem(self, name, *values):
+        with self.lock:
+            self.data.get(name, set()).difference_update(values)
+
+    def delete(self, *names):
+        with self.lock:
+            return sum(1 for name in names if self.data.pop(name, None) is not None)
+
+    def pipeline(self):
+        return _LocalPipeline(self)
+
+
+class _LocalPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class RedisStateStore:
+    """Shared store on redis: one hash per execution, one field per step, logs in a list"""
+
+    def __init__(self, client, prefix='nextwave:workflow:'):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return self.prefix + ':'.join(parts)
+
+    @staticmethod
+    def _text(value):
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def save_workflow(self, definition, user_id=None):
+        pipe = self.client.pipeline()
+        pipe.hset(self._key('definitions'), definition['id'], json.dumps(definition))
+        pipe.hset(self._key('revisions'), definition['id'], _revision(definition))
+        pipe.execute()
+
+    def load_workflow(self, workflow_id):
+        value = self.client.hget(self._key('definitions'), workflow_id)
+        return json.loads(value) if value else None
+
+    def workflow_revision(self, workflow_id):
+        value = self.client.hget(self._key('revisions'), workflow_id)
+        return self._text(value) if value else None
+
+    def list_workflows(self):
+        return [json.loads(value) for value in self.client.hgetall(self._key('definitions')).values()]
+
+    def delete_workflow(self, workflow_id):
+        self.client.hdel(self._key('revisions'), workflow_id)
+        return self.client.hdel(self._key('definitions'), workflow_id) > 0
+
+    def save_execution(self, record):
+        mapping = {field: json.dumps(value) for field, value in record.items() if field != 'steps'}
+        for step_id, state in (record.get('steps') or {}).items():
+            mapping[f'step:{step_id}'] = json.dumps(state)
+        pipe = self.client.pipeline()
+        pipe.hset(self._key('execution', record['execution_id']), mapping=mapping)
+        pipe.sadd(self._key('executions', record['workflow_id']), record['execution_id'])
+        pipe.execute()
+
+    def update_execution(self, execution_id, fields=None, steps=None, logs=None):
+        # Only the changed fields and steps are written
+        mapping = {field: json.dumps(value) for field, value in (fields or {}).items()}
+        for step_id, state in (steps or {}).items():
+            mapping[f'step:{step_id}'] = json.dumps(state)
+        pipe = self.client.pipeline()
+        if mapping:
+            pipe.hset(self._key('execution', execution_id), mapping=mapping)
+        if logs:
+            pipe.rpush(self._key('log', execution_id), *(json.dumps(entry) for entry in logs))
+        pipe.execute()
+
+    def delete_execution(self, execution_id):
+        workflow_id = self.client.hget(self._key('execution', execution_id), 'workflow_id')
+        pipe = self.client.pipeline()
+        pipe.delete(self._key('execution', execution_id), self._key('log', execution_id))
+        if workflow_id:
+            pipe.srem(self._key('executions', json.loads(workflow_id)), execution_id)
+        pipe.execute()
+
+    def load_execution(self, execution_id, log_cursor=0):
+        values = self.client.hgetall(self._key('execution', execution_id))
+        if not values:
+            return None
+        record = {'steps': {}}
+        for field, value in values.items():
+            field = self._text(field)
+            if field.startswith('step:'):
+                record['steps'][field[len('step:'):]] = json.loads(value)
+            else:
+                record[field] = json.loads(value)
+        logs = (json.loads(entry) for entry in self.client.lrange(self._key('log', execution_id), 0, -1))
+        record['execution_log'] = [entry for entry in logs if entry.get('seq', 0) >= log_cursor]
+        return record
+
+    def load_execution_version(self, execution_id):
+        version, log_count = self.client.hmget(self._key('execution', execution_id), 'version', 'log_count')
+        if version is None:
+            return None
+        return json.loads(version), json.loads(log_count) if log_count else 0
+
+    def list_executions(self, workflow_id=None):
+        if workflow_id:
+            execution_ids = self.client.smembers(self._key('executions', workflow_id))
+        else:
+            execution_ids = set()
+            for definition in self.list_workflows():
+                execution_ids |= self.client.smembers(self._key('executions', definition['id']))
+        records = [self.load_execution(self._text(execution_id)) for execution_id in execution_ids]
+        return [record for record in records if record]
+
+    def touch_executions(self, execution_ids, owner, heartbeat):
+        pipe = self.client.pipeline()
+        for execution_id in execution_ids:
+            pipe.hset(
+                self._key('execution', execution_id),
+                mapping={'owner': json.dumps(owner), 'heartbeat': json.dumps(heartbeat)}
+            )
+        pipe.execute()
+
+    def _active_execution_ids(self):
+        for definition in self.list_workflows():
+            for execution_id in self.client.smembers(self._key('executions', definition['id'])):
+                yield self._text(execution_id)
+
+    def _is_stale(self, execution_id, stale_before):
+        status, heartbeat = self.client.hmget(self._key('execution', execution_id), 'status', 'heartbeat')
+        if status is None:
+            return False
+        return _stale({'status': json.loads(status), 'heartbeat': json.loads(heartbeat) if heartbeat else None}, stale_before)
+
+    def list_interrupted(self, stale_before):
+        return [execution_id for execution_id in self._active_execution_ids() if self._is_stale(execution_id, stale_before)]
+
+    def claim_execution(self, execution_id, owner, stale_before, lease=60):
+        if not self._is_stale(execution_id, stale_before):
+            return False
+        # The claim key expires with the lease, so a claimer that dies in turn is recovered too
+        if not self.client.set(self._key('claim', execution_id), owner, ex=int(lease), nx=True):
+            return False
+        self.touch_executions([execution_id], owner, time.time())
+        return True
+
+    def purge_executions(self, finished_before):
+        purged = 0
+        for definition in self.list_workflows():
+            executions_key = self._key('executions', definition['id'])
+            for execution_id in self.client.smembers(executions_key):
+                execution_id = self._text(execution_id)
+                values = self.client.hmget(self._key('execution', execution_id), 'status', 'end_time')
+                if values[0] is None:
+                    # Hash already gone; drop the dangling set member
+                    self.client.srem(executions_key, execution_id)
+                    continue
+                record = {'status': json.loads(values[0]), 'end_time': json.loads(values[1]) if values[1] else None}
+                if _finished_before(record, finished_before):
+                    pipe = self.client.pipeline()
+                    pipe.delete(self._key('execution', execution_id), self._key('log', execution_id))
+                    pipe.srem(executions_key, execution_id)
+                    pipe.execute()
+                    purged += 1
+        return purged
+
+
+def create_workflow_store(config, app=None, db=None, models=None):
+    """Build a workflow state store from WORKFLOW_STATE_* configuration values"""
+    backend = config.get('WORKFLOW_STATE_BACKEND', 'memory')
+    if backend == 'sql':
+        return SQLStateStore(app, db, *models)
+    if backend == 'redis':
+        import redis
+
+        return RedisStateStore(redis.Redis.from_url(config['WORKFLOW_STATE_REDIS_URL']))
+    if backend == 'redis-local':
+        return RedisStateStore(LocalRedis())
+    return MemoryStateStore()
@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# src.main configures itself from the environment at import time, and creates
+# its upload folders relative to the working directory
+WORK_DIR = tempfile.mkdtemp(prefix='nextwave-tests-')
+os.chdir(WORK_DIR)
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'nextwave.db')}"
+os.environ['TASK_QUEUE_EAGER'] = '1'
+os.environ['WORKFLOW_STATE_BACKEND'] = 'sql'
+os.environ.pop('CELERY_BROKER_URL', None)
+
+
+@pytest.fixture(scope='session')
+def backend():
+    from src import main
+
+    client = main.app.test_client()
+    # The first request creates the tables and the seed users
+    client.get('/api/health')
+    yield main
+    main.workflow_engine.shutdown()
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def auth_headers(backend):
+    from flask_jwt_extended import create_access_token
+
+    with backend.app.app_context():
+        demo = backend.User.query.filter_by(username='demo').first()
+        token = create_access_token(identity=str(demo.id))
+    return {'Authorization': f'Bearer {token}'}
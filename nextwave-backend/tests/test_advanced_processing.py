@@ -0,0 +1,93 @@
+import fitz
+
+from src.utils.image_analyzer import ImageAnalyzer
+
+
+def _upload_pdf(client, auth_headers, tmp_path, name, pages):
+    path = tmp_path / name
+    pdf = fitz.open()
+    for index in range(pages):
+        pdf.new_page().insert_text((72, 72), f'{name} page {index + 1}')
+    pdf.save(str(path))
+    pdf.close()
+    with open(path, 'rb') as f:
+        response = client.post('/api/documents/upload', headers=auth_headers, data={'file': (f, name)})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['document']['id']
+
+
+def test_pdf_merge_runs_on_the_app_task_queue(backend, client, auth_headers, tmp_path):
+    first = _upload_pdf(client, auth_headers, tmp_path, 'first.pdf', 2)
+    second = _upload_pdf(client, auth_headers, tmp_path, 'second.pdf', 3)
+
+    response = client.post('/api/pdf/merge', headers=auth_headers, json={'document_ids': [first, second]})
+    assert response.status_code == 202, response.get_json()
+
+    # The blueprint's handlers are registered on the queue main.py initialised
+    assert 'pdf_merge' in backend.task_queue.handlers
+    status = client.get(response.get_json()['status_url'], headers=auth_headers).get_json()['task']
+    assert status['status'] == 'completed', status
+    merged_id = status['output_data']['merged_document_id']
+
+    with backend.app.app_context():
+        merged = backend.db.session.get(backend.Document, merged_id)
+        with fitz.open(merged.file_path) as pdf:
+            assert pdf.page_count == 5
+
+
+def test_pdf_merge_rejects_a_single_document(client, auth_headers):
+    response = client.post('/api/pdf/merge', headers=auth_headers, json={'document_ids': [1]})
+    assert response.status_code == 400
+
+
+def _upload_images(client, auth_headers, tmp_path, colors):
+    from PIL import Image
+
+    image_ids = []
+    for name, color in colors:
+        path = tmp_path / name
+        Image.new('RGB', (64, 48), color).save(path)
+        with open(path, 'rb') as f:
+            response = client.post('/api/images/upload', headers=auth_headers, data={'file': (f, name)})
+        assert response.status_code == 201, response.get_json()
+        image_ids.append(response.get_json()['image']['id'])
+    return image_ids
+
+
+def test_image_comparison_creates_a_report(backend, client, auth_headers, tmp_path):
+    image_ids = _upload_images(client, auth_headers, tmp_path,
+                               (('red.png', (220, 20, 20)), ('blue.png', (20, 20, 220))))
+
+    response = client.post('/api/image/compare', headers=auth_headers,
+                           json={'image1_id': image_ids[0], 'image2_id': image_ids[1]})
+    assert response.status_code == 202, response.get_json()
+    status = client.get(response.get_json()['status_url'], headers=auth_headers).get_json()['task']
+    assert status['status'] == 'completed', status
+
+    with backend.app.app_context():
+        report = backend.db.session.get(backend.Report, status['output_data']['report_id'])
+        assert report.report_type == 'image_comparison'
+        assert report.get_source_data() == {'image_ids': image_ids}
+
+
+def test_batch_analysis_uses_the_app_image_analyzer(backend, client, auth_headers, tmp_path, monkeypatch):
+    image_ids = _upload_images(client, auth_headers, tmp_path,
+                               (('green.png', (20, 200, 20)), ('grey.png', (128, 128, 128))))
+    analyzer = backend.app.extensions['image_analyzer']
+    assert analyzer is backend.image_analyzer
+    # Two workers so the batch goes through the analyzer's shared process pool
+    monkeypatch.setattr(analyzer, 'batch_workers', 2)
+    monkeypatch.setattr(analyzer, 'max_in_flight', 2)
+    calls = []
+    batch_analyze = ImageAnalyzer.batch_analyze
+    monkeypatch.setattr(ImageAnalyzer, 'batch_analyze',
+                        lambda self, *args, **kwargs: calls.append(self) or batch_analyze(self, *args, **kwargs))
+
+    response = client.post('/api/image/batch-analyze', headers=auth_headers, json={'image_ids': image_ids})
+    assert response.status_code == 202, response.get_json()
+    status = client.get(response.get_json()['status_url'], headers=auth_headers).get_json()['task']
+    assert status['status'] == 'completed', status
+    assert calls == [analyzer]
+    assert status['output_data']['successful_analyses'] == 2
+    assert [result['index'] for result in status['output_data']['results']] == [0, 1]
+    assert analyzer._pool is not None
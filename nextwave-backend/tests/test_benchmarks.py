@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+from .conftest import BACKEND_DIR
+
+BENCH = os.path.join(BACKEND_DIR, 'benchmarks', 'workflow_engine_bench.py')
+
+
+def _bench(*args):
+    # Run as documented, from nextwave-backend in a fresh interpreter
+    return subprocess.run(
+        [sys.executable, BENCH, '--executions', '20', '--users', '3', '--size', '4', '--checkpoint-interval', '0.05', *args],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120
+    )
+
+
+def test_engine_benchmark_runs_every_shape_and_compares_with_a_baseline(tmp_path):
+    results_path = tmp_path / 'results.json'
+    run = _bench('--json', str(results_path), '--trace-spans', '100')
+    assert run.returncode == 0, run.stderr
+
+    results = json.loads(results_path.read_text())['results']
+    assert [result['shape'] for result in results] == ['chain', 'fanout', 'conditions', 'loop']
+    for result in results:
+        assert result['executions'] == 20 and result['failed'] == 0
+        assert result['steps'] > 0 and result['executions_per_s'] > 0
+        assert result['shape'] in run.stdout
+
+    # A baseline that was much faster makes the comparison fail
+    for result in results:
+        result['executions_per_s'] *= 100
+    baseline_path = tmp_path / 'baseline.json'
+    baseline_path.write_text(json.dumps({'results': results}))
+    regressed = _bench('--shape', 'chain', '--baseline', str(baseline_path))
+    assert regressed.returncode == 1, regressed.stderr
+    assert 'REGRESSION chain: throughput' in regressed.stdout
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+
+from src.utils.event_bus import EventBus, format_sse, stream_events
+from src.utils.workflow_engine import StepType, WorkflowStep
+
+from .test_workflow_engine import wait_until
+
+
+def test_subscribers_get_the_latest_event_per_key():
+    bus = EventBus()
+    assert bus.publish('execution:1', 'step', {'status': 'running'}) == 0
+
+    with bus.subscribe('execution:1', 'task:2') as subscription:
+        assert bus.publish('execution:1', 'step', {'id': 'a', 'status': 'running'}, key='step:a') == 1
+        bus.publish('execution:1', 'step', {'id': 'b', 'status': 'running'}, key='step:b')
+        bus.publish('execution:1', 'step', {'id': 'a', 'status': 'completed'}, key='step:a')
+        bus.publish('task:2', 'task', {'progress': 50})
+        bus.publish('execution:other', 'step', {'id': 'x'})
+
+        # a's newer state replaces the undelivered one; order follows the latest publish
+        events = subscription.next_batch(0)
+        assert [(event['topic'], event['data']) for event in events] == [
+            ('execution:1', {'id': 'b', 'status': 'running'}),
+            ('execution:1', {'id': 'a', 'status': 'completed'}),
+            ('task:2', {'progress': 50})
+        ]
+        assert subscription.coalesced == 1
+        assert subscription.next_batch(0.05) == []
+        assert bus.stats() == {'topics': 2, 'subscribers': 2, 'published': 4}
+
+    # Closing unsubscribes, so publishing is free again
+    assert bus.stats()['topics'] == 0
+    assert bus.publish('execution:1', 'step', {}) == 0
+
+
+def test_next_batch_wakes_on_publish():
+    bus = EventBus()
+    subscription = bus.subscribe('task:1')
+    timer = threading.Timer(0.1, bus.publish, ('task:1', 'task', {'progress': 10}))
+    timer.start()
+    started = time.monotonic()
+    events = subscription.next_batch(5)
+    assert [event['data'] for event in events] == [{'progress': 10}]
+    assert time.monotonic() - started < 4
+    subscription.close()
+
+
+def test_stream_sends_snapshot_heartbeats_and_stops_at_the_final_event():
+    bus = EventBus()
+    subscription = bus.subscribe('task:1')
+    refreshed = []
+
+    def refresh():
+        refreshed.append(True)
+        return None
+
+    stream = stream_events(subscription, {'event': 'task', 'data': {'progress': 0}}, heartbeat=0.05, refresh=refresh)
+    assert next(stream) == format_sse({'event': 'task', 'data': {'progress': 0}})
+    # Nothing published within the heartbeat: refresh is asked, then a comment keeps the connection open
+    assert next(stream) == ': heartbeat\n\n'
+    assert refreshed
+
+    bus.publish('task:1', 'task', {'progress': 100}, final=True)
+    assert next(stream) == 'event: task\ndata: {"progress": 100}\n\n'
+    assert list(stream) == []
+    assert subscription.closed and bus.stats()['subscribers'] == 0
+
+    # A finished snapshot ends the stream straight away
+    finished = stream_events(bus.subscribe('task:2'), {'event': 'task', 'data': {}, 'final': True})
+    assert len(list(finished)) == 1
+    assert bus.stats()['subscribers'] == 0
+
+
+def _blocked_execution(backend, client, auth_headers, name):
+    engine = backend.workflow_engine
+    release = threading.Event()
+
+    def op(step, context_data, execution):
+        if step.id == 'wait':
+            release.wait(10)
+        return {f'{step.id}_out': True}
+
+    engine.register_operation(f'{name}_op', op)
+    with backend.app.app_context():
+        owner_id = backend.User.query.filter_by(username='demo').first().id
+    workflow = engine.create_workflow(name, user_id=owner_id)
+    for step_id in ('wait', 'after'):
+        workflow.add_step(WorkflowStep(step_id, step_id, StepType.PROCESSING, {'operation': f'{name}_op'}))
+    workflow.connect_steps('wait', 'after')
+    workflow.set_start_step('wait')
+    engine.save_workflow(workflow, owner_id)
+
+    response = client.post(f'/api/workflows/{workflow.id}/execute', headers=auth_headers, json={'input_data': {}})
+    assert response.status_code == 202
+    execution_id = response.get_json()['execution_id']
+    url = f'/api/workflows/executions/{execution_id}'
+    wait_until(lambda: any(
+        step['id'] == 'wait' and step['status'] == 'running'
+        for step in client.get(f'{url}?since_version=0', headers=auth_headers).get_json()['changes']['steps']
+    ))
+    return url, release
+
+
+def _parse_sse(chunk):
+    lines = dict(line.split(': ', 1) for line in chunk.strip().splitlines())
+    return lines['event'], json.loads(lines['data'])
+
+
+def test_execution_event_stream_pushes_changes_until_the_run_finishes(backend, client, auth_headers):
+    url, release = _blocked_execution(backend, client, auth_headers, 'sse')
+    try:
+        token = auth_headers['Authorization'].split()[1]
+        # EventSource cannot send headers, so the token may come in the query string
+        response = client.get(f'{url}/events?jwt={token}', buffered=False)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        chunks = (chunk.decode() for chunk in response.response)
+
+        event, snapshot = _parse_sse(next(chunks))
+        assert event == 'snapshot' and snapshot['status'] == 'running'
+
+        release.set()
+        events = [_parse_sse(chunk) for chunk in chunks if not chunk.startswith(':')]
+        assert events[-1][0] == 'execution' and events[-1][1]['status'] == 'completed'
+        steps = {data['id']: data['status'] for event, data in events if event == 'step'}
+        assert steps.get('after') == 'completed'
+        response.close()
+    finally:
+        release.set()
+
+    assert client.get('/api/workflows/executions/missing/events', headers=auth_headers).status_code == 404
+
+
+def test_long_poll_returns_as_soon_as_the_execution_changes(backend, client, auth_headers):
+    url, release = _blocked_execution(backend, client, auth_headers, 'long_poll')
+    try:
+        current = client.get(url, headers=auth_headers)
+        etag = current.headers['ETag']
+        headers = dict(auth_headers, **{'If-None-Match': etag})
+
+        # Unchanged for the whole wait: 304 once it expires
+        started = time.monotonic()
+        assert client.get(f'{url}?wait=0.3', headers=headers).status_code == 304
+        assert time.monotonic() - started >= 0.3
+
+        timer = threading.Timer(0.2, release.set)
+        timer.start()
+        started = time.monotonic()
+        changed = client.get(f'{url}?wait=20', headers=headers)
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+        assert time.monotonic() - started < 10
+        timer.join()
+    finally:
+        release.set()
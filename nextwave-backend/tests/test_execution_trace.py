@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+from src.utils.execution_trace import ExecutionTrace, trace_from_record
+from src.utils.workflow_engine import StepType, WorkflowEngine, WorkflowStep
+from src.utils.workflow_store import MemoryStateStore
+
+from .test_workflow_engine import build, finished, processing, wait_until
+
+
+@pytest.fixture
+def engine():
+    engine = WorkflowEngine(store=MemoryStateStore(), step_cache_bytes=0, checkpoint_interval=0.05)
+    engine.start(recover=False)
+    yield engine
+    engine.shutdown()
+
+
+def _spans(trace):
+    return [event for event in trace['traceEvents'] if event['ph'] == 'X']
+
+
+def test_spans_export_as_chrome_trace_events():
+    trace = ExecutionTrace(max_spans=2)
+    start = trace.now()
+    trace.add('load', 'step', start, step_id='a')
+    worker = threading.Thread(target=lambda: trace.add('save', 'persist', trace.now()), name='persist-worker')
+    worker.start()
+    worker.join()
+    # Optional spans stop being recorded once the trace is full; required ones never are
+    trace.add('chunk', 'loop', trace.now(), optional=True)
+    trace.add('finish', 'execution', start)
+
+    exported = trace.to_chrome(execution_id='e1')
+    spans = _spans(exported)
+    assert [span['name'] for span in spans] == ['load', 'save', 'finish']
+    assert spans[0]['args'] == {'step_id': 'a'} and spans[0]['ts'] >= 0 and spans[0]['dur'] >= 0
+    assert spans[0]['tid'] == spans[2]['tid'] != spans[1]['tid']
+    threads = {event['tid']: event['args']['name'] for event in exported['traceEvents'] if event['name'] == 'thread_name'}
+    assert threads[spans[1]['tid']] == 'persist-worker'
+    assert exported['otherData']['execution_id'] == 'e1'
+    assert exported['otherData']['spans'] == 3 and exported['otherData']['dropped_spans'] == 1
+
+
+def test_stored_runs_rebuild_a_coarse_timeline():
+    record = {
+        'execution_id': 'e1', 'workflow_id': 'w1', 'status': 'completed',
+        'start_time': '2024-01-01T00:00:00', 'end_time': '2024-01-01T00:00:03',
+        'steps': {
+            'b': {'id': 'b', 'name': 'B', 'status': 'completed',
+                  'start_time': '2024-01-01T00:00:01', 'end_time': '2024-01-01T00:00:03'},
+            'a': {'id': 'a', 'name': 'A', 'status': 'completed',
+                  'start_time': '2024-01-01T00:00:00', 'end_time': '2024-01-01T00:00:01'},
+            'skipped': {'id': 'skipped', 'status': 'pending'}
+        }
+    }
+    trace = trace_from_record(record)
+    assert [(span['name'], span['ts'], span['dur']) for span in _spans(trace)] == [
+        ('w1', 0, 3e6), ('A', 0, 1e6), ('B', 1e6, 2e6)
+    ]
+    assert trace['otherData']['source'] == 'store'
+
+
+def test_engine_records_queue_step_and_persist_spans(engine):
+    engine.register_operation('op', lambda step, context_data, execution: {f'{step.id}_out': True})
+    workflow = build(engine, 'traced', [processing('a'), processing('b')], [('a', 'b')])
+    execution = finished(engine.execute_workflow(workflow.id, {}))
+    wait_until(lambda: engine.store.load_execution(execution.execution_id)['status'] == 'completed')
+
+    trace = engine.get_execution_trace(execution.execution_id)
+    assert trace['otherData']['source'] == 'trace'
+    assert trace['otherData']['status'] == 'completed'
+    spans = _spans(trace)
+    categories = {span['cat'] for span in spans}
+    assert {'queue', 'step', 'execution', 'persist', 'serialize'} <= categories
+    assert [span['args']['step_id'] for span in spans if span['cat'] == 'step'] == ['a', 'b']
+    assert next(span for span in spans if span['cat'] == 'execution')['name'] == 'traced'
+
+    # Once the run leaves this process's cache the trace is rebuilt from the store
+    engine.executions.pop(execution.execution_id)
+    stored = engine.get_execution_trace(execution.execution_id)
+    assert stored['otherData']['source'] == 'store'
+    assert [span['args']['step_id'] for span in _spans(stored) if span['cat'] == 'step'] == ['a', 'b']
+    assert engine.get_execution_trace('missing') is None
+
+
+def _token(backend, username, role='user'):
+    from flask_jwt_extended import create_access_token
+
+    with backend.app.app_context():
+        user = backend.User.query.filter_by(username=username).first()
+        if user is None:
+            user = backend.User(username=username, email=f'{username}@example.com', password_hash='-', role=role)
+            backend.db.session.add(user)
+            backend.db.session.commit()
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+
+
+def test_trace_endpoint_is_limited_to_the_owner_and_admins(backend, client, auth_headers):
+    engine = backend.workflow_engine
+    engine.register_operation('trace_api_op', lambda step, context_data, execution: {'done': True})
+    with backend.app.app_context():
+        owner_id = backend.User.query.filter_by(username='demo').first().id
+    workflow = engine.create_workflow('trace api', user_id=owner_id)
+    workflow.add_step(WorkflowStep('only', 'only', StepType.PROCESSING, {'operation': 'trace_api_op'}))
+    workflow.set_start_step('only')
+    engine.save_workflow(workflow, owner_id)
+
+    response = client.post(f'/api/workflows/{workflow.id}/execute', headers=auth_headers, json={'input_data': {}})
+    assert response.status_code == 202
+    execution_id = response.get_json()['execution_id']
+    url = f'/api/workflows/executions/{execution_id}/trace'
+    wait_until(lambda: engine.store.load_execution(execution_id)['status'] == 'completed')
+
+    own = client.get(url, headers=auth_headers)
+    assert own.status_code == 200
+    assert own.get_json()['otherData']['execution_id'] == execution_id
+    assert 'Content-Disposition' not in own.headers
+    download = client.get(f'{url}?download=1', headers=auth_headers)
+    assert download.headers['Content-Disposition'] == f'attachment; filename=execution-{execution_id}.trace.json'
+
+    # Other users cannot tell the run exists; admins can inspect any run
+    other = client.get(url, headers=_token(backend, 'trace-viewer'))
+    assert other.status_code == 404
+    assert client.get(url, headers=_token(backend, 'admin')).status_code == 200
+    assert client.get('/api/workflows/executions/missing/trace', headers=auth_headers).status_code == 404
+    assert client.get(url).status_code == 401
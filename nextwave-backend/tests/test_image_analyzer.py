@@ -0,0 +1,169 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.utils.image_analyzer import COLOR_PRESETS, ImageAnalyzer, ImageFrame, gray_histogram, histogram_stats
+
+
+def _make_images(tmp_path, count):
+    paths = []
+    for index in range(count):
+        path = tmp_path / f'image{index}.png'
+        Image.new('RGB', (40, 30), (index * 40, 100, 200 - index * 40)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_batches_share_one_spawned_pool(tmp_path):
+    paths = _make_images(tmp_path, 4)
+    analyzer = ImageAnalyzer(batch_workers=2, max_in_flight=2)
+    try:
+        first = analyzer.batch_analyze(paths)
+        pool = analyzer._pool
+        second = analyzer.batch_analyze(paths[:2] + [str(tmp_path / 'missing.png')])
+
+        assert first['successful_analyses'] == 4
+        assert [result['image_path'] for result in first['results']] == paths
+        assert second['successful_analyses'] == 2
+        assert 'not found' in second['results'][2]['error']
+        assert pool is not None and analyzer._pool is pool
+        assert pool._ctx.get_start_method() == 'spawn'
+    finally:
+        analyzer.shutdown()
+    assert analyzer._pool is None
+
+
+def test_a_recycled_pool_is_replaced_on_the_next_batch(tmp_path):
+    paths = _make_images(tmp_path, 2)
+    analyzer = ImageAnalyzer(batch_workers=2)
+    try:
+        pool = analyzer._batch_pool()
+        analyzer._recycle_pool(pool)
+        assert analyzer._pool is None
+
+        result = analyzer.batch_analyze(paths)
+        assert result['successful_analyses'] == 2
+        assert analyzer._pool is not None and analyzer._pool is not pool
+    finally:
+        analyzer.shutdown()
+
+
+def test_a_stuck_image_times_out_and_the_pool_is_recycled(tmp_path):
+    paths = _make_images(tmp_path, 2)
+    # Reading a FIFO with no writer blocks the worker forever
+    stuck = str(tmp_path / 'stuck.png')
+    os.mkfifo(stuck)
+    analyzer = ImageAnalyzer(batch_workers=2, batch_timeout=2)
+    try:
+        pool = analyzer._batch_pool()
+        result = analyzer.batch_analyze([paths[0], stuck, paths[1]])
+
+        assert [r['success'] for r in result['results']] == [True, False, True]
+        assert result['results'][1]['error'] == 'Analysis timed out after 2s'
+        assert analyzer._pool is not pool
+        assert analyzer.batch_analyze(paths)['successful_analyses'] == 2
+    finally:
+        analyzer.shutdown()
+
+
+def test_single_image_batches_skip_the_pool(tmp_path):
+    analyzer = ImageAnalyzer(batch_workers=4)
+    result = analyzer.batch_analyze(_make_images(tmp_path, 1))
+    assert result['successful_analyses'] == 1
+    assert analyzer._pool is None
+
+
+@pytest.mark.parametrize('preset', sorted(COLOR_PRESETS))
+def test_every_color_preset_finds_the_dominant_colors(tmp_path, preset):
+    path = tmp_path / 'split.png'
+    image = Image.new('RGB', (80, 40), (200, 30, 30))
+    image.paste((30, 30, 200), (60, 0, 80, 40))
+    image.save(path)
+
+    colors = ImageAnalyzer(batch_workers=1).analyze_colors(str(path), color_preset=preset)
+    assert colors['preset'] == preset
+    # k-means may split one flat color over several identical centers; sum them
+    shares = {}
+    for color in colors['dominant_colors']:
+        shares[color['hex']] = shares.get(color['hex'], 0) + color['percentage']
+    assert set(shares) == {'#c81e1e', '#1e1ec8'}
+    assert shares['#c81e1e'] == pytest.approx(75, abs=0.5)
+    assert shares['#1e1ec8'] == pytest.approx(25, abs=0.5)
+    assert colors['average_color']['rgb'] == [157, 30, 72]
+
+
+def test_unknown_color_presets_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ImageAnalyzer(color_preset='fastest')
+    with pytest.raises(ValueError):
+        ImageAnalyzer().analyze_colors(str(tmp_path / 'any.png'), color_preset='fastest')
+
+
+def test_frame_planes_are_computed_once_per_image(tmp_path, monkeypatch):
+    path = tmp_path / 'planes.png'
+    Image.fromarray(np.random.default_rng(3).integers(0, 255, size=(48, 64, 3), dtype=np.uint8)).save(path)
+    calls = []
+    for name in ('Canny', 'Sobel', 'calcHist', 'meanStdDev'):
+        original = getattr(cv2, name)
+        monkeypatch.setattr(cv2, name, lambda *args, original=original, name=name, **kwargs: calls.append(name) or original(*args, **kwargs))
+    cvt_color = cv2.cvtColor
+    monkeypatch.setattr(cv2, 'cvtColor', lambda image, code, *args: calls.append(('cvtColor', code)) or cvt_color(image, code, *args))
+
+    result = ImageAnalyzer(batch_workers=1).analyze_image(str(path))
+    assert result['success']
+    # Texture, brightness and object detection all read the same grayscale, edge and histogram planes
+    assert calls.count(('cvtColor', cv2.COLOR_BGR2GRAY)) == 1
+    assert calls.count('Canny') == 1
+    assert calls.count('Sobel') == 2
+    assert calls.count('calcHist') == 1
+    assert calls.count('meanStdDev') == 1
+    assert result['brightness_contrast']['contrast'] == result['texture_analysis']['texture_measure']
+
+
+def test_histogram_stats_match_direct_pixel_statistics():
+    gray = np.random.default_rng(7).integers(20, 230, size=(60, 80), dtype=np.uint8)
+    stats = histogram_stats(gray_histogram(gray))
+
+    assert stats['mean'] == pytest.approx(gray.mean())
+    assert stats['std'] == pytest.approx(gray.std())
+    assert (stats['min'], stats['max']) == (gray.min(), gray.max())
+    assert stats['dynamic_range'] == gray.max() - gray.min()
+
+    hist = np.zeros(256)
+    hist[[10, 11, 12, 100, 255]] = [5, 9, 5, 3, 7]
+    # 11 and 100 are higher than both neighbours; the edge bin 255 is never counted
+    assert histogram_stats(hist)['peaks'] == 2
+    assert histogram_stats(np.zeros(256)) == {'mean': 0.0, 'std': 0.0, 'min': 0, 'max': 0, 'dynamic_range': 0, 'peaks': 0}
+
+
+def test_frames_are_analyzed_on_a_bounded_working_copy(tmp_path):
+    path = tmp_path / 'wide.png'
+    Image.new('RGB', (400, 200), (90, 90, 90)).save(path)
+
+    frame = ImageFrame.load(str(path), max_edge=100)
+    assert (frame.width, frame.height) == (100, 50)
+    assert (frame.original_width, frame.original_height) == (400, 200)
+    assert frame.to_original(10) == 40 and frame.to_original(10, power=2) == 160
+    assert ImageFrame.load(str(path)).width == 400
+    assert ImageFrame.load(str(tmp_path / 'missing.png'), max_edge=100) is None
+
+    # A small source is never upscaled
+    assert ImageFrame.load(str(path), max_edge=1000).width == 400
+
+    result = ImageAnalyzer(batch_workers=1, analysis_max_edge=100).analyze_image(str(path))
+    assert result['file_info']['dimensions'] == {'width': 400, 'height': 200, 'channels': 3}
+    assert result['analysis_resolution'] == {'width': 100, 'height': 50, 'scale': 0.25}
+
+
+def test_frames_honour_exif_orientation(tmp_path):
+    path = tmp_path / 'rotated.jpg'
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Stored landscape, displayed rotated a quarter turn
+    Image.new('RGB', (300, 100), (10, 200, 10)).save(path, exif=exif)
+
+    frame = ImageFrame.load(str(path), max_edge=150)
+    assert (frame.original_width, frame.original_height) == (100, 300)
+    assert (frame.width, frame.height) == (50, 150)
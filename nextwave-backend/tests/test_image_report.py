@@ -0,0 +1,33 @@
+import fitz
+from PIL import Image
+
+
+def test_report_redoes_colors_at_the_report_preset(backend, client, auth_headers, tmp_path, monkeypatch):
+    path = tmp_path / 'stripes.png'
+    image = Image.new('RGB', (120, 80), (200, 30, 30))
+    image.paste((30, 30, 200), (60, 0, 120, 80))
+    image.save(path)
+    with open(path, 'rb') as f:
+        response = client.post('/api/images/upload', headers=auth_headers, data={'file': (f, 'stripes.png')})
+    assert response.status_code == 201, response.get_json()
+    uploaded = response.get_json()['image']
+    assert uploaded['analysis']['color_analysis']['preset'] == backend.app.config['IMAGE_COLOR_PRESET']
+
+    presets = []
+    analyze_colors = backend.image_analyzer.analyze_colors
+
+    def spy(image_path, color_preset=None):
+        presets.append(color_preset)
+        return analyze_colors(image_path, color_preset=color_preset)
+
+    monkeypatch.setattr(backend.image_analyzer, 'analyze_colors', spy)
+    monkeypatch.setitem(backend.app.config, 'IMAGE_REPORT_COLOR_PRESET', 'accurate')
+    response = client.post(f"/api/images/{uploaded['id']}/report", headers=auth_headers)
+    assert response.status_code == 200, response.get_json()
+    assert presets == ['accurate']
+
+    with backend.app.app_context():
+        report = backend.db.session.get(backend.Report, response.get_json()['report_id'])
+        with fitz.open(report.file_path) as pdf:
+            text = ''.join(page.get_text() for page in pdf)
+    assert '#c81e1e' in text and '#1e1ec8' in text
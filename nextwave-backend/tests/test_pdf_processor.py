@@ -0,0 +1,41 @@
+import fitz
+
+from src.utils.pdf_processor import PDFProcessor
+
+
+def _make_pdf(path, pages):
+    pdf = fitz.open()
+    for index in range(pages):
+        pdf.new_page().insert_text((72, 72), f'page {index + 1}')
+    pdf.save(str(path))
+    pdf.close()
+
+
+def test_extraction_reuses_one_spawned_pool(tmp_path):
+    path = tmp_path / 'doc.pdf'
+    _make_pdf(path, 5)
+    processor = PDFProcessor(extraction_workers=2, pages_per_chunk=2)
+    try:
+        progress = []
+        first = processor.extract_text_from_pdf(str(path), progress_callback=progress.append)
+        pool = processor._pool
+        second = processor.extract_text_from_pdf(str(path))
+
+        assert first['success'] and second['success']
+        assert [page['page'] for page in first['content']] == [1, 2, 3, 4, 5]
+        assert first['content'][3]['text'].strip() == 'page 4'
+        assert progress[-1] == 100
+        assert pool is not None and processor._pool is pool
+        assert pool._mp_context.get_start_method() == 'spawn'
+    finally:
+        processor.shutdown()
+    assert processor._pool is None
+
+
+def test_single_chunk_documents_skip_the_pool(tmp_path):
+    path = tmp_path / 'short.pdf'
+    _make_pdf(path, 2)
+    processor = PDFProcessor(extraction_workers=4, pages_per_chunk=8)
+    result = processor.extract_text_from_pdf(str(path))
+    assert result['total_pages'] == 2
+    assert processor._pool is None
@@ -0,0 +1,171 @@
+import os
+
+import pytest
+
+from src.utils.result_cache import (
+    DiskCacheBackend, MemoryCacheBackend, RedisCacheBackend, ResultCache, create_result_cache, sha256_file
+)
+
+
+class FakeRedis:
+    """Just the get/set/delete calls RedisCacheBackend makes"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = value
+        self.ttls[name] = ex
+
+    def delete(self, name):
+        self.data.pop(name, None)
+
+
+def _redis_backend():
+    backend = RedisCacheBackend('redis://localhost:6379/0', ttl=60, max_entry_bytes=1024)
+    backend.client = FakeRedis()
+    return backend
+
+
+@pytest.fixture(params=['memory', 'disk', 'redis'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return ResultCache(MemoryCacheBackend(max_bytes=1024))
+    if request.param == 'disk':
+        return ResultCache(DiskCacheBackend(str(tmp_path / 'cache'), max_bytes=1024))
+    return ResultCache(_redis_backend())
+
+
+def test_hit_miss_and_invalidation(cache):
+    key = ResultCache.make_key('abc', 'analyze_image', '1.0', {'max_edge': 1024, 'color_preset': 'fast'})
+    calls = []
+
+    def compute():
+        calls.append(True)
+        return {'success': True, 'colors': [1, 2, 3]}
+
+    assert cache.get(key) is None
+    assert cache.get_or_compute(key, compute) == ({'success': True, 'colors': [1, 2, 3]}, False)
+    assert cache.get_or_compute(key, compute) == ({'success': True, 'colors': [1, 2, 3]}, True)
+    assert len(calls) == 1
+
+    # Parameter order does not matter; a new version, parameter or content hash is a different entry
+    assert ResultCache.make_key('abc', 'analyze_image', '1.0', {'color_preset': 'fast', 'max_edge': 1024}) == key
+    for changed in (
+        ResultCache.make_key('abc', 'analyze_image', '1.1', {'max_edge': 1024, 'color_preset': 'fast'}),
+        ResultCache.make_key('abc', 'analyze_image', '1.0', {'max_edge': 0, 'color_preset': 'fast'}),
+        ResultCache.make_key('abd', 'analyze_image', '1.0', {'max_edge': 1024, 'color_preset': 'fast'}),
+        ResultCache.make_key('abc', 'analyze_colors', '1.0', {'max_edge': 1024, 'color_preset': 'fast'})
+    ):
+        assert changed != key
+        assert cache.get(changed) is None
+
+    cache.backend.delete(key)
+    assert cache.get_or_compute(key, compute)[1] is False
+    assert len(calls) == 2
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['stores']) == (1, 7, 2)
+    assert stats['hit_rate'] == round(1 / 8, 4)
+
+
+def test_failures_and_oversized_results_are_not_stored(cache):
+    failed = cache.get_or_compute('failed', lambda: {'success': False, 'error': 'boom'})
+    assert failed == ({'success': False, 'error': 'boom'}, False)
+    assert cache.get('failed') is None
+
+    assert cache.set('large', {'data': 'x' * 2048}) is False
+    assert cache.get('large') is None
+    assert cache.stats()['stores'] == 0
+
+
+def test_backend_errors_read_as_misses():
+    class Broken:
+        def get(self, key):
+            raise ConnectionError('down')
+
+        def set(self, key, payload):
+            raise ConnectionError('down')
+
+    cache = ResultCache(Broken())
+    assert cache.get_or_compute('key', lambda: {'success': True}) == ({'success': True}, False)
+    assert cache.stats()['misses'] == 1 and cache.stats()['stores'] == 0
+
+
+def test_memory_backend_evicts_least_recently_used_within_its_byte_bound():
+    backend = MemoryCacheBackend(max_bytes=30)
+    backend.set('a', b'a' * 10)
+    backend.set('b', b'b' * 10)
+    backend.set('c', b'c' * 10)
+    backend.get('a')
+    backend.set('d', b'd' * 10)
+
+    assert backend.get('b') is None
+    assert [backend.get(key) is not None for key in 'acd'] == [True, True, True]
+    assert backend.size() == {'entries': 3, 'bytes': 30}
+    backend.set('a', b'a' * 5)
+    assert backend.size() == {'entries': 3, 'bytes': 25}
+
+
+def test_disk_backend_evicts_least_recently_read_files(tmp_path):
+    backend = DiskCacheBackend(str(tmp_path), max_bytes=30)
+    for age, key in enumerate('abc'):
+        backend.set(key, key.encode() * 10)
+        # Spread the access times so eviction order does not depend on filesystem timestamp resolution
+        os.utime(backend._path(key), (1000 + age, 1000 + age))
+    backend.get('a')
+    backend.set('d', b'd' * 10)
+
+    assert backend.get('b') is None
+    assert backend.get('a') == b'a' * 10
+    assert backend.size() == {'entries': 3, 'bytes': 30}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_redis_backend_prefixes_keys_and_sets_a_ttl():
+    backend = _redis_backend()
+    backend.set('key', b'payload')
+    assert backend.client.data == {'nextwave:result:key': b'payload'}
+    assert backend.client.ttls == {'nextwave:result:key': 60}
+    assert backend.get('key') == b'payload'
+
+
+def test_config_selects_the_backend(tmp_path):
+    assert isinstance(create_result_cache({}).backend, MemoryCacheBackend)
+    disk = create_result_cache({'RESULT_CACHE_BACKEND': 'disk', 'RESULT_CACHE_DIR': str(tmp_path / 'results'),
+                                'RESULT_CACHE_MAX_BYTES': 100})
+    assert isinstance(disk.backend, DiskCacheBackend) and disk.backend.max_bytes == 100
+    redis = create_result_cache({'RESULT_CACHE_BACKEND': 'redis', 'RESULT_CACHE_REDIS_URL': 'redis://localhost:6379/0'})
+    assert isinstance(redis.backend, RedisCacheBackend)
+
+
+def test_uploading_the_same_image_again_reuses_the_analysis(backend, client, auth_headers, tmp_path):
+    from PIL import Image
+
+    path = tmp_path / 'cached.png'
+    Image.new('RGB', (32, 32), (10, 160, 90)).save(path)
+    cache = backend.result_cache
+    key = cache.make_key(
+        sha256_file(str(path)), 'analyze_image', backend.image_analyzer.version,
+        {'color_preset': backend.image_analyzer.color_preset, 'max_edge': backend.image_analyzer.analysis_max_edge}
+    )
+
+    analyses = []
+    for name in ('cached.png', 'copy.png'):
+        with open(path, 'rb') as f:
+            response = client.post('/api/images/upload', headers=auth_headers, data={'file': (f, name)})
+        assert response.status_code == 201, response.get_json()
+        analyses.append(response.get_json()['image'])
+        if name == 'cached.png':
+            assert cache.get(key) is not None
+            hits = cache.hits
+
+    assert cache.hits == hits + 1
+    assert [image['cached'] for image in analyses] == [False, True]
+    assert analyses[0]['analysis']['color_analysis'] == analyses[1]['analysis']['color_analysis']
+    # The cached result is relabelled with the new upload's file name
+    assert analyses[1]['analysis']['file_info']['filename'] == 'copy.png'
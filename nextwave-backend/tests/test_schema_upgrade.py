@@ -0,0 +1,65 @@
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import textwrap
+
+from .conftest import BACKEND_DIR
+
+# Boots a fresh interpreter: src.main reads DATABASE_URL once, at import
+BOOT_SCRIPT = textwrap.dedent("""
+    import io
+    import json
+    from PIL import Image
+    from flask_jwt_extended import create_access_token
+    from src.main import app, User
+
+    client = app.test_client()
+    statuses = {'health': client.get('/api/health').status_code}
+    with app.app_context():
+        token = create_access_token(identity=str(User.query.filter_by(username='demo').first().id))
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.get('/api/workflows', headers=headers)
+    statuses['workflows'] = response.status_code
+    workflow_id = response.get_json()['workflows'][0]['id']
+    statuses['execute'] = client.post(
+        f'/api/workflows/{workflow_id}/execute', headers=headers, json={'input_data': {}}
+    ).status_code
+    image = io.BytesIO()
+    Image.new('RGB', (32, 32), (10, 120, 200)).save(image, 'PNG')
+    image.seek(0)
+    statuses['image'] = client.post(
+        '/api/images/upload', headers=headers, data={'file': (image, 'upgrade.png')}
+    ).status_code
+    print(json.dumps(statuses))
+""")
+
+
+def _boot(database_path, work_dir):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{database_path}', TASK_QUEUE_EAGER='1', PYTHONPATH=BACKEND_DIR)
+    result = subprocess.run(
+        [sys.executable, '-c', BOOT_SCRIPT], cwd=work_dir, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _columns(database_path, table):
+    with sqlite3.connect(database_path) as connection:
+        return {row[1] for row in connection.execute(f'PRAGMA table_info({table})')}
+
+
+def test_app_boots_against_a_database_created_before_the_new_columns(tmp_path):
+    database_path = str(tmp_path / 'nextwave.db')
+    shutil.copy(os.path.join(BACKEND_DIR, 'instance', 'nextwave.db'), database_path)
+    assert 'revision' not in _columns(database_path, 'workflow_model')
+    assert 'analysis_data' not in _columns(database_path, 'image_analysis')
+
+    expected = {'health': 200, 'workflows': 200, 'execute': 202, 'image': 201}
+    assert _boot(database_path, tmp_path) == expected
+    assert 'revision' in _columns(database_path, 'workflow_model')
+    assert 'analysis_data' in _columns(database_path, 'image_analysis')
+    # The upgrade is a no-op once applied
+    assert _boot(database_path, tmp_path) == expected
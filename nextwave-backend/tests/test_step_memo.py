@@ -0,0 +1,77 @@
+import pytest
+
+from src.utils.workflow_engine import StepStatus, StepType, WorkflowEngine, WorkflowStep
+from src.utils.workflow_store import MemoryStateStore
+
+from .test_workflow_engine import finished
+
+
+@pytest.fixture
+def engine():
+    engine = WorkflowEngine(store=MemoryStateStore(), checkpoint_interval=0.05)
+    calls = []
+
+    def square(step, context_data, execution):
+        calls.append(context_data['n'])
+        return {'square': context_data['n'] ** 2 + step.config.get('offset', 0)}
+
+    engine.register_operation('square', square)
+    engine.calls = calls
+    engine.start(recover=False)
+    yield engine
+    engine.shutdown()
+
+
+def _workflow(engine, **config):
+    workflow = engine.create_workflow('memo')
+    workflow.add_step(WorkflowStep('sq', 'sq', StepType.PROCESSING, {'operation': 'square', 'deterministic': True, **config}))
+    workflow.set_start_step('sq')
+    engine.save_workflow(workflow)
+    return workflow
+
+
+def _run(engine, workflow_id, input_data, user_id='u1'):
+    execution = finished(engine.execute_workflow(workflow_id, input_data, user_id=user_id))
+    assert execution.status == StepStatus.COMPLETED, execution.error_message
+    return execution.step_states['sq'].cached, execution.output_data['square']
+
+
+def test_repeated_inputs_hit_and_new_inputs_miss(engine):
+    workflow = _workflow(engine)
+    assert _run(engine, workflow.id, {'n': 3}) == (False, 9)
+    assert _run(engine, workflow.id, {'n': 3}) == (True, 9)
+    # Keys the step never read do not take part in the key
+    assert _run(engine, workflow.id, {'n': 3, 'unrelated': 'x'}) == (True, 9)
+    assert _run(engine, workflow.id, {'n': 4}) == (False, 16)
+    assert engine.calls == [3, 4]
+
+    stats = engine.step_memo.stats()['steps'][f'{workflow.id}:sq']
+    assert (stats['hits'], stats['misses'], stats['stores']) == (2, 2, 2)
+
+
+def test_results_are_not_shared_between_users(engine):
+    workflow = _workflow(engine)
+    assert _run(engine, workflow.id, {'n': 5}, user_id='u1') == (False, 25)
+    assert _run(engine, workflow.id, {'n': 5}, user_id='u2') == (False, 25)
+    assert _run(engine, workflow.id, {'n': 5}, user_id='u2') == (True, 25)
+    assert engine.calls == [5, 5]
+
+
+def test_changing_the_step_definition_invalidates(engine):
+    workflow = _workflow(engine)
+    assert _run(engine, workflow.id, {'n': 2}) == (False, 4)
+
+    workflow.add_step(workflow.steps['sq'].replace(config={**workflow.steps['sq'].config, 'offset': 100}))
+    engine.save_workflow(workflow)
+    assert _run(engine, workflow.id, {'n': 2}) == (False, 104)
+    assert _run(engine, workflow.id, {'n': 2}) == (True, 104)
+    assert engine.calls == [2, 2]
+
+
+def test_sample_steps_that_read_uploads_are_not_memoized():
+    engine = WorkflowEngine(store=MemoryStateStore())
+    engine.create_sample_workflows()
+    for workflow_id in ('sample-document-processing', 'sample-image-analysis'):
+        workflow = engine.get_workflow(workflow_id)
+        assert not any(step.config.get('deterministic') for step in workflow.steps.values())
+    engine.shutdown()
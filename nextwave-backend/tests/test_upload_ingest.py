@@ -0,0 +1,14 @@
+from src.utils.upload_ingest import SNIFF_BYTES, sniff_mime_type
+
+
+def test_text_cut_inside_a_multibyte_character_is_still_text():
+    text = 'Ärger über Öl — 東京'.encode('utf-8')
+    for cut in range(1, len(text)):
+        assert sniff_mime_type(text[:min(cut, SNIFF_BYTES)]) == 'text/plain'
+
+
+def test_binary_and_signatures():
+    assert sniff_mime_type(b'%PDF-1.7\n') == 'application/pdf'
+    assert sniff_mime_type(b'RIFF\x00\x00\x00\x00WEBPVP8 ') == 'image/webp'
+    assert sniff_mime_type(b'\x00\xff\xfe\x80binary') == 'application/octet-stream'
+    assert sniff_mime_type(b'abc\xc3(') == 'application/octet-stream'
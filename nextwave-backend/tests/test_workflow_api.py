@@ -0,0 +1,97 @@
+import threading
+
+from src.utils.workflow_engine import StepType, WorkflowStep
+
+from .test_workflow_engine import wait_until
+
+
+def test_execution_polling_etag_and_delta_contract(backend, client, auth_headers):
+    engine = backend.workflow_engine
+    release = threading.Event()
+
+    def op(step, context_data, execution):
+        if step.id == 'b':
+            release.wait(10)
+        return {f'{step.id}_out': True}
+
+    engine.register_operation('api_test_op', op)
+    with backend.app.app_context():
+        owner_id = backend.User.query.filter_by(username='demo').first().id
+    workflow = engine.create_workflow('polling', user_id=owner_id)
+    for step_id in ('a', 'b', 'c'):
+        workflow.add_step(WorkflowStep(step_id, step_id, StepType.PROCESSING, {'operation': 'api_test_op'}))
+    workflow.connect_steps('a', 'b')
+    workflow.connect_steps('b', 'c')
+    workflow.set_start_step('a')
+    engine.save_workflow(workflow, owner_id)
+
+    try:
+        response = client.post(f'/api/workflows/{workflow.id}/execute', headers=auth_headers, json={'input_data': {}})
+        assert response.status_code == 202
+        url = f"/api/workflows/executions/{response.get_json()['execution_id']}"
+
+        def delta(since_version, log_cursor, etag=None):
+            headers = dict(auth_headers, **({'If-None-Match': etag} if etag else {}))
+            return client.get(f'{url}?since_version={since_version}&log_cursor={log_cursor}', headers=headers)
+
+        # Wait until 'a' is done and 'b' is blocked
+        wait_until(lambda: any(
+            step['id'] == 'b' and step['status'] == 'running' for step in delta(0, 0).get_json()['changes']['steps']
+        ))
+        first = delta(0, 0)
+        changes = first.get_json()['changes']
+        assert {step['id']: step['status'] for step in changes['steps']} == {'a': 'completed', 'b': 'running'}
+        assert [entry['seq'] for entry in changes['log']] == list(range(changes['log_cursor']))
+        assert first.headers['ETag'] == f'W/"{changes["version"]}-{changes["log_cursor"]}"'
+
+        # Nothing changed: the ETag answers 304 without a body
+        unchanged = delta(changes['version'], changes['log_cursor'], first.headers['ETag'])
+        assert unchanged.status_code == 304 and unchanged.data == b''
+        assert unchanged.headers['ETag'] == first.headers['ETag']
+
+        release.set()
+        wait_until(lambda: client.get(url, headers=auth_headers).get_json()['execution']['status'] == 'completed')
+
+        # Only what changed after the poller's version, and only the unseen log lines
+        later = delta(changes['version'], changes['log_cursor'], first.headers['ETag'])
+        assert later.status_code == 200
+        tail = later.get_json()['changes']
+        assert {step['id']: step['status'] for step in tail['steps']} == {'b': 'completed', 'c': 'completed'}
+        assert tail['log'][0]['seq'] == changes['log_cursor']
+        assert tail['log'][-1]['seq'] == tail['log_cursor'] - 1
+        assert tail['output_data'] == {'a_out': True, 'b_out': True, 'c_out': True}
+
+        # Full responses share the same ETag space
+        full = client.get(url, headers=auth_headers)
+        assert full.headers['ETag'] == later.headers['ETag']
+        assert client.get(url, headers=dict(auth_headers, **{'If-None-Match': full.headers['ETag']})).status_code == 304
+
+        # Once evicted from memory the run is served from the store with the same contract
+        wait_until(lambda: engine.store.load_execution(tail['execution_id'])['status'] == 'completed')
+        engine.executions.pop(tail['execution_id'])
+        assert client.get(url, headers=dict(auth_headers, **{'If-None-Match': full.headers['ETag']})).status_code == 304
+        stored = delta(changes['version'], changes['log_cursor']).get_json()['changes']
+        assert {step['id'] for step in stored['steps']} == {'b', 'c'}
+        assert [entry['seq'] for entry in stored['log']] == [entry['seq'] for entry in tail['log']]
+    finally:
+        release.set()
+
+    assert client.get('/api/workflows/executions/missing?since_version=0', headers=auth_headers).status_code == 404
+
+
+def test_execute_answers_429_when_the_queue_is_full(backend, client, auth_headers, monkeypatch):
+    engine = backend.workflow_engine
+    with backend.app.app_context():
+        owner_id = backend.User.query.filter_by(username='demo').first().id
+    workflow = engine.create_workflow('rejected', user_id=owner_id)
+    workflow.add_step(WorkflowStep('only', 'only', StepType.PROCESSING, {'operation': 'noop'}))
+    workflow.set_start_step('only')
+    engine.save_workflow(workflow, owner_id)
+
+    monkeypatch.setattr(engine.execution_queue, 'max_depth', 0)
+    response = client.post(f'/api/workflows/{workflow.id}/execute', headers=auth_headers, json={'input_data': {}})
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '5'
+    assert 'queue is full' in response.get_json()['error']
+    # The rejected run is not left behind as a queued execution
+    assert engine.store.list_executions(workflow.id) == []
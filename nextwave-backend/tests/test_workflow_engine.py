@@ -0,0 +1,280 @@
+import json
+import threading
+import time
+from queue import Empty, Full
+
+import pytest
+
+from src.utils.step_memo import definition_hash
+from src.utils.workflow_engine import (
+    ExecutionRejected, FairShareQueue, StepStatus, StepType, WorkflowEngine, WorkflowStep
+)
+from src.utils.workflow_store import MemoryStateStore, SQLStateStore
+
+
+def processing(step_id, **config):
+    return WorkflowStep(step_id, step_id, StepType.PROCESSING, {'operation': 'op', **config})
+
+
+def build(engine, name, steps, edges, user_id=None):
+    workflow = engine.create_workflow(name, user_id=user_id)
+    for step in steps:
+        workflow.add_step(step)
+    for from_step_id, to_step_id in edges:
+        workflow.connect_steps(from_step_id, to_step_id)
+    workflow.set_start_step(steps[0].id)
+    engine.save_workflow(workflow, user_id)
+    return workflow
+
+
+def wait_until(predicate, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def finished(execution, timeout=10):
+    wait_until(lambda: execution.finished_at is not None, timeout)
+    return execution
+
+
+@pytest.fixture
+def engine():
+    engine = WorkflowEngine(step_workers=4, store=MemoryStateStore(), step_cache_bytes=0, checkpoint_interval=0.05)
+    engine.start(recover=False)
+    yield engine
+    engine.shutdown()
+
+
+def test_step_config_is_a_frozen_copy():
+    config = {'operation': 'noop', 'options': {'dpi': 150}}
+    step = WorkflowStep('s', 's', StepType.PROCESSING, config)
+    config['operation'] = 'changed'
+    config['options']['dpi'] = 300
+
+    assert step.config['operation'] == 'noop' and step.config['options']['dpi'] == 150
+    with pytest.raises(TypeError):
+        step.config['operation'] = 'changed'
+
+    changed = step.replace(config={**step.config, 'merge': 'namespace'})
+    assert 'merge' not in step.config and changed.config['merge'] == 'namespace'
+    assert definition_hash(changed) != definition_hash(step)
+    assert json.loads(json.dumps(step.to_dict()))['config'] == {'operation': 'noop', 'options': {'dpi': 150}}
+
+
+def test_dag_runs_dependencies_first_and_branches_concurrently(engine):
+    # a -> (b, c) -> d; b and c only get past the barrier if they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    spans = {}
+
+    def op(step, context_data, execution):
+        started = time.monotonic()
+        if step.id in ('b', 'c'):
+            barrier.wait()
+        spans[step.id] = (started, time.monotonic())
+        return {f'{step.id}_out': sorted(key for key in context_data if key.endswith('_out'))}
+
+    engine.register_operation('op', op)
+    workflow = build(
+        engine, 'diamond', [processing('a'), processing('b'), processing('c'), processing('d')],
+        [('a', 'b'), ('a', 'c'), ('b', 'd'), ('c', 'd')]
+    )
+    execution = finished(engine.execute_workflow(workflow.id, {}))
+
+    assert execution.status == StepStatus.COMPLETED, execution.error_message
+    assert spans['a'][1] <= min(spans['b'][0], spans['c'][0])
+    assert spans['d'][0] >= max(spans['b'][1], spans['c'][1])
+    # The join sees both branches
+    assert execution.output_data['d_out'] == ['a_out', 'b_out', 'c_out']
+    assert [state.id for state in execution.steps_executed][0] == 'a'
+    assert [state.id for state in execution.steps_executed][-1] == 'd'
+
+
+def test_untaken_branch_is_skipped_downstream(engine):
+    # cond picks t; f, and f2 which only f feeds, are skipped; j still runs off t
+    calls = []
+
+    def op(step, context_data, execution):
+        calls.append(step.id)
+        return {f'{step.id}_out': True}
+
+    engine.register_operation('op', op)
+    workflow = build(engine, 'branches', [
+        processing('a'),
+        WorkflowStep('cond', 'cond', StepType.CONDITION, {
+            'condition': {'field': 'x', 'operator': 'greater_than', 'value': 5},
+            'true_step': 't',
+            'false_step': 'f'
+        }),
+        processing('t'), processing('f'), processing('f2'), processing('j')
+    ], [('a', 'cond'), ('cond', 't'), ('cond', 'f'), ('f', 'f2'), ('t', 'j'), ('f2', 'j')])
+    execution = finished(engine.execute_workflow(workflow.id, {'x': 10}))
+
+    assert execution.status == StepStatus.COMPLETED, execution.error_message
+    statuses = {step_id: state.status for step_id, state in execution.step_states.items()}
+    assert statuses['f'] == statuses['f2'] == StepStatus.SKIPPED
+    assert statuses['t'] == statuses['j'] == StepStatus.COMPLETED
+    assert sorted(calls) == ['a', 'j', 't']
+
+    record = engine.store.load_execution(execution.execution_id)
+    assert record['steps']['f2']['status'] == 'skipped'
+
+
+def test_false_condition_without_false_step_takes_only_plain_edges(engine):
+    calls = []
+
+    def op(step, context_data, execution):
+        calls.append(step.id)
+        return {f'{step.id}_out': True}
+
+    engine.register_operation('op', op)
+    workflow = build(engine, 'true only', [
+        WorkflowStep('cond', 'cond', StepType.CONDITION, {
+            'condition': {'field': 'x', 'operator': 'greater_than', 'value': 5},
+            'true_step': 't'
+        }),
+        processing('t'), processing('after_t'), processing('always')
+    ], [('cond', 't'), ('t', 'after_t'), ('cond', 'always')])
+
+    execution = finished(engine.execute_workflow(workflow.id, {'x': 1}))
+    assert execution.status == StepStatus.COMPLETED, execution.error_message
+    assert calls == ['always']
+    assert execution.step_states['t'].status == execution.step_states['after_t'].status == StepStatus.SKIPPED
+
+    calls.clear()
+    execution = finished(engine.execute_workflow(workflow.id, {'x': 10}))
+    assert execution.status == StepStatus.COMPLETED, execution.error_message
+    assert sorted(calls) == ['after_t', 't']
+    assert execution.step_states['always'].status == StepStatus.SKIPPED
+
+
+def test_sql_store_resumes_a_crashed_run_without_repeating_steps(backend):
+    with backend.app.app_context():
+        owner_id = backend.User.query.filter_by(username='demo').first().id
+    store = SQLStateStore(
+        backend.app, backend.db, backend.WorkflowModel, backend.WorkflowRunState, backend.WorkflowRunLog,
+        backend.WorkflowRunStep
+    )
+    release = threading.Event()
+
+    def make_engine(calls, block=None):
+        engine = WorkflowEngine(store=store, lease_timeout=1, checkpoint_interval=0.05, step_cache_bytes=0)
+
+        def op(step, context_data, execution):
+            calls.append(step.id)
+            if step.id == 'slow' and block is not None:
+                block.wait(10)
+            return {f'{step.id}_out': context_data.get('x', 0) + 1}
+
+        engine.register_operation('op', op)
+        return engine
+
+    first_calls, second_calls = [], []
+    first = make_engine(first_calls, release)
+    workflow = build(
+        first, 'resume', [processing('a'), processing('slow'), processing('d')], [('a', 'slow'), ('slow', 'd')],
+        user_id=owner_id
+    )
+    first.start(recover=False)
+    execution = first.execute_workflow(workflow.id, {'x': 1}, user_id=str(owner_id))
+    wait_until(lambda: (store.load_execution(execution.execution_id)['steps'].get('a') or {}).get('status') == 'completed')
+    wait_until(lambda: first_calls == ['a', 'slow'])
+
+    # Crash the first worker: its heartbeats stop while 'slow' is still running
+    first.is_running = False
+    first.maintenance_wakeup.set()
+    second = make_engine(second_calls)
+    try:
+        # The lease has not run out yet; the second worker's maintenance loop claims the run once it has
+        assert second.start() == 0
+        wait_until(lambda: second.executions.get(execution.execution_id) is not None)
+        resumed = finished(second.executions.get(execution.execution_id))
+
+        assert resumed.status == StepStatus.COMPLETED, resumed.error_message
+        assert second_calls == ['slow', 'd']
+        # end_time is set just before the final checkpoint is written
+        wait_until(lambda: store.load_execution(execution.execution_id)['status'] == 'completed')
+        record = store.load_execution(execution.execution_id)
+        assert {step_id: state['status'] for step_id, state in record['steps'].items()} == {
+            'a': 'completed', 'slow': 'completed', 'd': 'completed'
+        }
+        assert any('Resuming workflow execution' in entry['message'] for entry in record['execution_log'])
+        # Nothing is left for another worker to pick up
+        assert make_engine([]).recover_executions() == 0
+    finally:
+        release.set()
+        second.shutdown()
+        first.shutdown()
+
+
+def test_nested_loop_with_chunks_runs_inline_on_the_outer_loop_worker():
+    engine = WorkflowEngine(loop_workers=2, store=MemoryStateStore(), step_cache_bytes=0)
+    engine.start(recover=False)
+    inner = {'id': 'inner', 'type': 'loop', 'config': {
+        'items': 'item', 'item_key': 'x', 'collect': 'v', 'results_key': 'row', 'parallelism': 2,
+        'body': [{'id': 'double', 'type': 'transform', 'config': {'transformations': [
+            {'operation': 'multiply', 'source_field': 'x', 'target_field': 'v', 'factor': 2}
+        ]}}]
+    }}
+    workflow = build(engine, 'nested', [WorkflowStep('outer', 'outer', StepType.LOOP, {
+        'items': 'grid', 'collect': 'row', 'parallelism': 2, 'chunk_size': 2, 'body': [inner]
+    })], [])
+    try:
+        # Every outer chunk holds a loop worker for two items; an inner loop that went
+        # back to the loop pool after the first would wait on itself
+        execution = finished(engine.execute_workflow(workflow.id, {'grid': [[1, 2], [3], [4, 5], [6, 7, 8]]}))
+        assert execution.status == StepStatus.COMPLETED, execution.error_message
+        assert execution.output_data['outer_results'] == [[2, 4], [6], [8, 10], [12, 14, 16]]
+    finally:
+        engine.shutdown(wait=False)
+
+
+def test_fair_share_queue_round_robins_between_owners():
+    queue = FairShareQueue(max_depth=5)
+    for item in ('a1', 'a2', 'a3'):
+        queue.put('alice', item)
+    queue.put('bob', 'b1')
+    queue.put('carol', 'c1')
+    assert queue.depth_by_owner() == {'alice': 3, 'bob': 1, 'carol': 1}
+    with pytest.raises(Full):
+        queue.put('dave', 'd1')
+
+    assert [queue.get(0) for _ in range(3)] == ['a1', 'b1', 'c1']
+    # An owner who comes back joins the back of the rotation
+    queue.put('bob', 'b2')
+    assert [queue.get(0) for _ in range(3)] == ['a2', 'b2', 'a3']
+    assert queue.qsize() == 0
+    with pytest.raises(Empty):
+        queue.get(0.01)
+
+
+def test_queued_burst_does_not_starve_other_users():
+    engine = WorkflowEngine(execution_workers=1, max_queued_executions=4, store=MemoryStateStore(), step_cache_bytes=0)
+    release = threading.Event()
+    order = []
+
+    def op(step, context_data, execution):
+        release.wait(10)
+        order.append(execution.user_id)
+        return {}
+
+    engine.register_operation('op', op)
+    engine.start(recover=False)
+    workflow = build(engine, 'fair', [processing('only')], [])
+    try:
+        # alice's first run holds the only execution worker while the rest queue up
+        running = engine.execute_workflow(workflow.id, {}, user_id='alice')
+        wait_until(lambda: running.status == StepStatus.RUNNING)
+        queued = [engine.execute_workflow(workflow.id, {}, user_id=user) for user in ('alice', 'alice', 'alice', 'bob')]
+        with pytest.raises(ExecutionRejected):
+            engine.execute_workflow(workflow.id, {}, user_id='bob')
+        assert engine.execution_queue.depth_by_owner() == {'alice': 3, 'bob': 1}
+
+        release.set()
+        for execution in queued:
+            finished(execution)
+        assert order == ['alice', 'alice', 'bob', 'alice', 'alice']
+    finally:
+        release.set()
+        engine.shutdown()
@@ -24,7 +24,7 @@ const WorkflowCanvas = ({ workflow, onWorkflowUpdate, onExecute }) => {
   const [executionStatus, setExecutionStatus] = useState({})
   const [animationQueue, setAnimationQueue] = useState([])
   const canvasRef = useRef(null)
-  const { apiCall } = useAuth()
+  const { apiCall, API_BASE_URL } = useAuth()
 
   // Node types with their configurations
   const nodeTypes = {
@@ -127,7 +127,8 @@ const WorkflowCanvas = ({ workflow, onWorkflowUpdate, onExecute }) => {
           input_data: {
             document_type: 'pdf',
             document_file: 'sample.pdf'
-          }
+          },
+          animation_delay: 0.5
         })
       })
 
@@ -135,42 +136,71 @@ const WorkflowCanvas = ({ workflow, onWorkflowUpdate, onExecute }) => {
         const data = await response.json()
         const executionId = data.execution_id
 
-        // Poll for execution status and animate
+        // Changes arrive as server-sent events, or from polling where those are unavailable
+        const steps = {}
+        let sinceVersion = 0
+        let logCursor = 0
+        let etag = null
+        let finished = false
+
+        const applyChanges = (changes) => {
+          sinceVersion = Math.max(sinceVersion, changes.version)
+          logCursor = Math.max(logCursor, changes.log_cursor)
+          changes.steps.forEach(step => { steps[step.id] = step })
+
+          const execution = {
+            ...changes,
+            current_step: steps[changes.current_step_id] || null,
+            steps_executed: changes.steps_executed.map(stepId => steps[stepId]).filter(Boolean)
+          }
+
+          // Update execution status
+          setExecutionStatus(execution)
+
+          // Animate current step
+          if (execution.current_step) {
+            updateNodeStatus(execution.current_step.id, 'running')
+          }
+
+          // Animate steps that changed since the last update
+          changes.steps.forEach(step => {
+            updateNodeStatus(step.id, step.status)
+            if (step.status !== 'completed') return
+
+            // Animate connections from completed steps
+            const outgoingConnections = connections.filter(conn => conn.from === step.id)
+            outgoingConnections.forEach(conn => {
+              setTimeout(() => animateConnection(conn.id), 500)
+            })
+          })
+
+          if (execution.status !== 'queued' && execution.status !== 'running' && !finished) {
+            finished = true
+            setIsExecuting(false)
+            // Reset all nodes to idle after completion
+            setTimeout(() => {
+              setNodes(prev => prev.map(node => ({ ...node, status: 'idle' })))
+            }, 3000)
+          }
+        }
+
         const pollExecution = async () => {
           try {
-            const statusResponse = await apiCall(`/workflows/executions/${executionId}`)
+            // The server holds the request for up to 25 seconds until something changes
+            const statusResponse = await apiCall(
+              `/workflows/executions/${executionId}?since_version=${sinceVersion}&log_cursor=${logCursor}&wait=25`,
+              etag ? { headers: { 'If-None-Match': etag } } : {}
+            )
+            if (statusResponse.status === 304) {
+              pollExecution()
+              return
+            }
             if (statusResponse.ok) {
               const statusData = await statusResponse.json()
-              const execution = statusData.execution
-
-              // Update execution status
-              setExecutionStatus(execution)
-
-              // Animate current step
-              if (execution.current_step) {
-                updateNodeStatus(execution.current_step.id, 'running')
-              }
-
-              // Animate completed steps
-              execution.steps_executed.forEach(step => {
-                updateNodeStatus(step.id, step.status)
-                
-                // Animate connections from completed steps
-                const outgoingConnections = connections.filter(conn => conn.from === step.id)
-                outgoingConnections.forEach(conn => {
-                  setTimeout(() => animateConnection(conn.id), 500)
-                })
-              })
-
-              // Continue polling if still running
-              if (execution.status === 'running') {
-                setTimeout(pollExecution, 1000)
-              } else {
-                setIsExecuting(false)
-                // Reset all nodes to idle after completion
-                setTimeout(() => {
-                  setNodes(prev => prev.map(node => ({ ...node, status: 'idle' })))
-                }, 3000)
+              etag = statusResponse.headers.get('ETag')
+              applyChanges(statusData.changes)
+              if (!finished) {
+                pollExecution()
               }
             }
           } catch (error) {
@@ -179,8 +209,39 @@ const WorkflowCanvas = ({ workflow, onWorkflowUpdate, onExecute }) => {
           }
         }
 
-        // Start polling
-        setTimeout(pollExecution, 500)
+        if (window.EventSource) {
+          const token = localStorage.getItem('token')
+          const events = new EventSource(
+            `${API_BASE_URL}/workflows/executions/${executionId}/events?jwt=${encodeURIComponent(token)}`
+          )
+          // Step updates are applied on top of the latest execution-level summary
+          let executionSummary = { version: 0, log_cursor: 0, steps_executed: [], status: 'queued' }
+          const onChanges = (event) => {
+            executionSummary = JSON.parse(event.data)
+            applyChanges(executionSummary)
+          }
+          events.addEventListener('snapshot', onChanges)
+          events.addEventListener('changes', onChanges)
+          events.addEventListener('step', (event) => {
+            applyChanges({ ...executionSummary, steps: [JSON.parse(event.data)] })
+          })
+          events.addEventListener('execution', (event) => {
+            executionSummary = JSON.parse(event.data)
+            applyChanges({ ...executionSummary, steps: [] })
+            if (finished) {
+              events.close()
+            }
+          })
+          events.onerror = () => {
+            events.close()
+            // Stream unavailable (e.g. a buffering proxy); continue by long-polling
+            if (!finished) {
+              pollExecution()
+            }
+          }
+        } else {
+          pollExecution()
+        }
       }
     } catch (error) {
       console.error('Error executing workflow:', error)